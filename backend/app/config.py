@@ -5,12 +5,184 @@ from dotenv import load_dotenv
 load_dotenv()
 
 SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+# Spill sessions idle this long (s) to SESSION_SPILL_DIR and fault them back in on
+# use (0 disables); expired/idle sessions are swept every SESSION_SWEEP_SECONDS
+SESSION_SPILL_IDLE_SECONDS = float(os.getenv("SESSION_SPILL_IDLE_SECONDS", "0"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "data/spill")
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
 MAX_FILE_MB = int(os.getenv("MAX_FILE_MB", "100"))
 EMBED_DIM = int(os.getenv("EMBED_DIM", "1024"))
 
+# Whisper fallback ASR
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "1"))
+WHISPER_QUEUE_SIZE = int(os.getenv("WHISPER_QUEUE_SIZE", "4"))
+WHISPER_QUEUE_WAIT = float(os.getenv("WHISPER_QUEUE_WAIT", "5"))
+WHISPER_TIMEOUT = float(os.getenv("WHISPER_TIMEOUT", "900"))
+WHISPER_FFMPEG_TIMEOUT = float(os.getenv("WHISPER_FFMPEG_TIMEOUT", "120"))
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# ASR provider health: circuit breaker and optional hedging (0 disables hedging)
+ASR_BREAKER_THRESHOLD = int(os.getenv("ASR_BREAKER_THRESHOLD", "3"))
+ASR_BREAKER_COOLDOWN = float(os.getenv("ASR_BREAKER_COOLDOWN", "60"))
+ASR_HEDGE_DELAY = float(os.getenv("ASR_HEDGE_DELAY", "0"))
+# Threads for hedged chains (two per upload; uploads beyond that run unhedged) and
+# the time budget (s) of one hedged chain, so a losing chain frees its thread
+ASR_HEDGE_WORKERS = int(os.getenv("ASR_HEDGE_WORKERS", "8"))
+ASR_HEDGE_TIMEOUT = float(os.getenv("ASR_HEDGE_TIMEOUT", "120"))
+
+# Upper bound on one Sarvam HTTP call (s), sync and batch; shorter if the request has a deadline
+ASR_HTTP_TIMEOUT = float(os.getenv("ASR_HTTP_TIMEOUT", "120"))
+ASR_BATCH_HTTP_TIMEOUT = float(os.getenv("ASR_BATCH_HTTP_TIMEOUT", "300"))
+
+# Transcript cache keyed by audio hash (0 MB disables it)
+ASR_CACHE_DIR = os.getenv("ASR_CACHE_DIR", "data/asr_cache")
+ASR_CACHE_MAX_MB = int(os.getenv("ASR_CACHE_MAX_MB", "256"))
+
+# Upstream API endpoints (override to point at local stand-ins, see loadtest/)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+SARVAM_BASE_URL = os.getenv("SARVAM_BASE_URL", "https://api.sarvam.ai")
+
+# Build the chat service in the background right after startup instead of on the first chat
+CHAT_WARMUP = os.getenv("CHAT_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Batch chat: max questions per request and default concurrent LLM calls
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "64"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Compact a session's chunk list once this fraction of it belongs to removed documents
+COMPACT_MIN_DEAD_FRACTION = float(os.getenv("COMPACT_MIN_DEAD_FRACTION", "0.2"))
+
+# Where imported session snapshots are staged before being memory-mapped
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshots")
+
+# Chat latency budget per request (ChatIn.deadline_ms overrides, up to the max)
+CHAT_DEADLINE_MS = int(os.getenv("CHAT_DEADLINE_MS", "30000"))
+CHAT_DEADLINE_MAX_MS = int(os.getenv("CHAT_DEADLINE_MAX_MS", "120000"))
+
+# LLM tiers: model, max output tokens and per-call timeout (s); a timed-out call is
+# retried once on the other tier
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gemini-2.5-flash-lite")
+LLM_FAST_MAX_TOKENS = int(os.getenv("LLM_FAST_MAX_TOKENS", "1024"))
+LLM_FAST_TIMEOUT = float(os.getenv("LLM_FAST_TIMEOUT", "15"))
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "gemini-2.5-flash")
+LLM_STRONG_MAX_TOKENS = int(os.getenv("LLM_STRONG_MAX_TOKENS", "4096"))
+LLM_STRONG_TIMEOUT = float(os.getenv("LLM_STRONG_TIMEOUT", "60"))
+
+# Routing to the fast tier: question length (chars), packed context (chars) and the
+# share of question words the best retrieved chunk must contain
+LLM_ROUTING = os.getenv("LLM_ROUTING", "false").lower() in ("1", "true", "yes")
+ROUTE_FAST_MAX_QUESTION = int(os.getenv("ROUTE_FAST_MAX_QUESTION", "120"))
+ROUTE_FAST_MAX_CONTEXT = int(os.getenv("ROUTE_FAST_MAX_CONTEXT", "8000"))
+ROUTE_FAST_MIN_COVERAGE = float(os.getenv("ROUTE_FAST_MIN_COVERAGE", "0.6"))
+
+# Provider-side caching of the conversational prompt prefix (rules + session documents):
+# the first MAX chars of documents form the prefix, registered for TTL seconds if at least MIN
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "false").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "8192"))
+CONTEXT_CACHE_MAX_CHARS = int(os.getenv("CONTEXT_CACHE_MAX_CHARS", "100000"))
+CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "900"))
+
+# LLM admission control: concurrent upstream calls, waiting callers and max wait in seconds
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_WAIT = float(os.getenv("LLM_QUEUE_WAIT", "10"))
+# Worker threads for sync routes; a waiting LLM caller blocks one, so at most a quarter
+# of them may wait for admission (the rest stay free for search, uploads, etc.)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# SSE chat streams: coalesce tokens into one frame per window (ms) or byte budget;
+# gzip the stream when the client accepts it
+SSE_FLUSH_MS = float(os.getenv("SSE_FLUSH_MS", "50"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "1024"))
+SSE_COMPRESS = os.getenv("SSE_COMPRESS", "false").lower() in ("1", "true", "yes")
+
+# How chunk embeddings are stored: float32, float16 or int8 (per-vector scale)
+EMBED_STORAGE = os.getenv("EMBED_STORAGE", "float32").lower()
+
+# Sharded retrieval: sessions with at least MIN_CHUNKS live chunks (0 = off) are scored
+# in shared-memory shards by a process pool (0 workers = one per core, 0 shards = two per worker)
+RETRIEVE_SHARD_MIN_CHUNKS = int(os.getenv("RETRIEVE_SHARD_MIN_CHUNKS", "0"))
+RETRIEVE_WORKERS = int(os.getenv("RETRIEVE_WORKERS", "0"))
+RETRIEVE_SHARDS = int(os.getenv("RETRIEVE_SHARDS", "0"))
+
+# Near-duplicate chunks at upload: fold chunks whose SimHash differs in at most this many bits
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "false").lower() in ("1", "true", "yes")
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+
+# Request profiling: fraction of upload/chat/summarize requests sampled (0 = off),
+# whether `X-Profile: 1` forces a profile, sampling interval and profiles kept
+PROFILE_RATE = float(os.getenv("PROFILE_RATE", "0"))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Shared secret for /admin endpoints and header-triggered profiling (empty = both disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 class Settings:
     session_ttl = SESSION_TTL_SECONDS
+    session_spill_idle = SESSION_SPILL_IDLE_SECONDS
+    session_spill_dir = SESSION_SPILL_DIR
+    session_sweep = SESSION_SWEEP_SECONDS
     max_file_mb = MAX_FILE_MB
     embed_dim = EMBED_DIM
+    whisper_model = WHISPER_MODEL
+    whisper_workers = WHISPER_WORKERS
+    whisper_queue_size = WHISPER_QUEUE_SIZE
+    whisper_queue_wait = WHISPER_QUEUE_WAIT
+    whisper_timeout = WHISPER_TIMEOUT
+    whisper_ffmpeg_timeout = WHISPER_FFMPEG_TIMEOUT
+    whisper_warmup = WHISPER_WARMUP
+    asr_breaker_threshold = ASR_BREAKER_THRESHOLD
+    asr_breaker_cooldown = ASR_BREAKER_COOLDOWN
+    asr_hedge_delay = ASR_HEDGE_DELAY
+    asr_hedge_workers = ASR_HEDGE_WORKERS
+    asr_hedge_timeout = ASR_HEDGE_TIMEOUT
+    asr_http_timeout = ASR_HTTP_TIMEOUT
+    asr_batch_http_timeout = ASR_BATCH_HTTP_TIMEOUT
+    asr_cache_dir = ASR_CACHE_DIR
+    asr_cache_max_mb = ASR_CACHE_MAX_MB
+    gemini_base_url = GEMINI_BASE_URL
+    sarvam_base_url = SARVAM_BASE_URL
+    chat_warmup = CHAT_WARMUP
+    batch_max_questions = BATCH_MAX_QUESTIONS
+    batch_concurrency = BATCH_CONCURRENCY
+    compact_min_dead_fraction = COMPACT_MIN_DEAD_FRACTION
+    snapshot_dir = SNAPSHOT_DIR
+    chat_deadline_ms = CHAT_DEADLINE_MS
+    chat_deadline_max_ms = CHAT_DEADLINE_MAX_MS
+    llm_fast_model = LLM_FAST_MODEL
+    llm_fast_max_tokens = LLM_FAST_MAX_TOKENS
+    llm_fast_timeout = LLM_FAST_TIMEOUT
+    llm_strong_model = LLM_STRONG_MODEL
+    llm_strong_max_tokens = LLM_STRONG_MAX_TOKENS
+    llm_strong_timeout = LLM_STRONG_TIMEOUT
+    llm_routing = LLM_ROUTING
+    route_fast_max_question = ROUTE_FAST_MAX_QUESTION
+    route_fast_max_context = ROUTE_FAST_MAX_CONTEXT
+    route_fast_min_coverage = ROUTE_FAST_MIN_COVERAGE
+    context_cache = CONTEXT_CACHE
+    context_cache_min_chars = CONTEXT_CACHE_MIN_CHARS
+    context_cache_max_chars = CONTEXT_CACHE_MAX_CHARS
+    context_cache_ttl = CONTEXT_CACHE_TTL
+    llm_concurrency = LLM_CONCURRENCY
+    llm_queue_size = LLM_QUEUE_SIZE
+    llm_queue_wait = LLM_QUEUE_WAIT
+    threadpool_size = THREADPOOL_SIZE
+    sse_flush_ms = SSE_FLUSH_MS
+    sse_flush_bytes = SSE_FLUSH_BYTES
+    sse_compress = SSE_COMPRESS
+    embed_storage = EMBED_STORAGE
+    retrieve_shard_min_chunks = RETRIEVE_SHARD_MIN_CHUNKS
+    retrieve_workers = RETRIEVE_WORKERS
+    retrieve_shards = RETRIEVE_SHARDS
+    dedup_enabled = DEDUP_ENABLED
+    dedup_max_distance = DEDUP_MAX_DISTANCE
+    profile_rate = PROFILE_RATE
+    profile_header = PROFILE_HEADER
+    profile_interval_ms = PROFILE_INTERVAL_MS
+    profile_keep = PROFILE_KEEP
+    admin_token = ADMIN_TOKEN
 
 settings = Settings()
@@ -0,0 +1,152 @@
+"""
+Per-request latency budget
+
+A chat request gets a Deadline (ChatIn.deadline_ms, or CHAT_DEADLINE_MS) that is
+made current with `active(dl)`, so stages can check it without it being passed
+around. Each stage degrades rather than overrunning:
+
+  retrieval   lexical-only scoring when little time is left; the scan stops early when it runs out
+  packing     the context budget shrinks with the time left
+  admission   LLM queue waits are capped at the time left
+  generation  the provider stream is cut at the deadline, even while blocked on the provider
+  ASR / HTTP  timeout(default) caps upstream call timeouts
+
+What was degraded is collected on the Deadline and sent as a final SSE
+`deadline` event.
+"""
+import contextvars
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .config import settings
+from .profiling import attach
+
+_END = object()
+# Source was still producing at the deadline
+_LATE = object()
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.start = time.perf_counter()
+        self.at = self.start + seconds
+        # stage -> what it did instead of the full work
+        self.degraded: Dict[str, Any] = {}
+        self.cut = False
+
+    @classmethod
+    def for_request(cls, deadline_ms: Optional[int]) -> "Deadline":
+        ms = deadline_ms or settings.chat_deadline_ms
+        return cls(max(1, min(ms, settings.chat_deadline_max_ms)) / 1000)
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.perf_counter())
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.at
+
+    def fraction_left(self) -> float:
+        return self.remaining() / self.budget if self.budget else 0.0
+
+    def note(self, stage: str, how: Any):
+        self.degraded[stage] = how
+
+    def scale(self, n: int, stage: str, floor: float = 0.25) -> int:
+        """Shrink a size budget once less than half of the time is left"""
+        f = self.fraction_left()
+        if f >= 0.5:
+            return n
+        scaled = max(int(n * floor), int(n * f * 2))
+        self.note(stage, {"from": n, "to": scaled})
+        return scaled
+
+    def report(self) -> Dict[str, Any]:
+        return {"budget_ms": round(self.budget * 1000), "elapsed_ms": round((time.perf_counter() - self.start) * 1000),
+                "cut": self.cut, "degraded": self.degraded,
+                **({"reason": "deadline exceeded; answer truncated"} if self.cut else {})}
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+@contextmanager
+def active(dl: Deadline):
+    token = _deadline.set(dl)
+    try:
+        yield dl
+    finally:
+        _deadline.reset(token)
+
+
+def timeout(default: float) -> float:
+    """`default`, or the time left on the current deadline if that is shorter"""
+    dl = _deadline.get()
+    if dl is None:
+        return default
+    return max(0.001, min(default, dl.remaining()))
+
+
+def cut(tokens: Iterable[str], dl: Deadline) -> Iterator[str]:
+    """
+    Pass through the tokens the source produces before the deadline. The source
+    is read on a helper thread so the cut happens on time even while it is
+    blocked waiting for the provider; the source is closed by that thread once
+    it yields again. Tokens that arrived in time are passed on however slowly
+    the caller reads them, so wrap only the provider side, not pacing.
+    """
+    q: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+
+    def pump():
+        it = iter(tokens)
+        try:
+            with attach():
+                for tok in it:
+                    if stop.is_set():
+                        break
+                    if dl.expired():
+                        q.put(_LATE)
+                        break
+                    q.put(tok)
+        except BaseException as e:
+            q.put(e)
+        finally:
+            close = getattr(it, "close", None)
+            if close:
+                close()
+            q.put(_END)
+
+    # Stage timings recorded by the source still belong to this request
+    ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(pump,), name="deadline-pump", daemon=True).start()
+    try:
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                try:
+                    if dl.expired():
+                        raise queue.Empty
+                    item = q.get(timeout=dl.remaining())
+                except queue.Empty:
+                    item = _LATE
+            if item is _LATE:
+                dl.cut = True
+                dl.note("generate", "cut")
+                return
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
@@ -1,15 +1,61 @@
+import threading
+import anyio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
-from .routers import session, upload, chat, summarize
+from .config import settings
+from .memory import SESSIONS
+from .routers import session, upload, documents, chat, summarize, search, asr, admin
+from .services.whisper_pool import WHISPER_POOL
+from .services.shards import SHARDS
+from .metrics import TimingMiddleware, render_metrics
+from .profiling import ProfilingMiddleware
 
-app = FastAPI(title="NotebookLM Pipeline Backend (Stateless MVP)", version="0.1.0")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_headers=["*"], allow_methods=["*"])
+def _sweep_sessions():
+    while True:
+        time.sleep(settings.session_sweep)
+        try:
+            SESSIONS.sweep()
+        except Exception as e:
+            print(f"[sessions] sweep failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync routes run here; LLM admission waits are capped to a share of it
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    if settings.whisper_warmup:
+        WHISPER_POOL.warm_up()
+    if settings.chat_warmup:
+        # Heavy LangChain imports happen off the startup path; /healthz answers meanwhile
+        threading.Thread(target=chat.get_chat_service, name="chat-warmup", daemon=True).start()
+    if settings.session_sweep > 0:
+        threading.Thread(target=_sweep_sessions, name="session-sweep", daemon=True).start()
+    yield
+    WHISPER_POOL.shutdown()
+    SESSIONS.close()
+    SHARDS.close()
+
+app = FastAPI(title="NotebookLM Pipeline Backend (Stateless MVP)", version="0.1.0", lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TimingMiddleware)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_headers=["*"], allow_methods=["*"], expose_headers=["Server-Timing", "X-Profile-Id"])
 
 app.include_router(session.router,  prefix="/session",  tags=["session"])
 app.include_router(upload.router,   prefix="/session",  tags=["upload"])   # /session/{id}/upload
+app.include_router(documents.router, prefix="/session", tags=["documents"])  # /session/{id}/documents/{source_id}
 app.include_router(chat.router,     prefix="/chat",     tags=["chat"])
 app.include_router(summarize.router, prefix="/summarize", tags=["summarize"])
+app.include_router(search.router,   prefix="/search",   tags=["search"])
+app.include_router(asr.router,      prefix="/asr",      tags=["asr"])
+app.include_router(admin.router,    prefix="/admin",    tags=["admin"])
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of stage and request latency histograms"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,35 +1,242 @@
-import time, uuid
-from typing import Dict, Any, List
+import os, shutil, time, uuid, threading, weakref
+from typing import Dict, Any, List, Optional, Tuple, FrozenSet
 from fastapi import HTTPException
 from .config import settings
+from .metrics import Gauge, observe
+
+class SessionIndex:
+    """
+    One immutable version of a session's documents and chunk index.
+
+    Never mutated after publication: writers build the next SessionIndex and
+    swap it in with Session.publish(), so readers that grabbed `s.index` keep a
+    consistent view (no half-ingested documents) without taking any lock.
+    """
+    __slots__ = ("version", "docs", "chunks", "embeddings", "source_chunks", "tombstones", "positions")
+
+    def __init__(self, version: int = 0, docs=None, chunks: Tuple[Dict[str, Any], ...] = (),
+                 embeddings=None, source_chunks=None, tombstones: FrozenSet[str] = frozenset(),
+                 positions: Optional[Dict[str, int]] = None):
+        self.version = version
+        self.docs: Dict[str, Dict[str, Any]] = docs if docs is not None else {}
+        self.chunks = chunks
+        self.embeddings: Dict[str, Any] = embeddings if embeddings is not None else {}
+        # source_id -> chunk ids, so one document can be removed without a scan
+        self.source_chunks: Dict[str, List[str]] = source_chunks if source_chunks is not None else {}
+        # chunk ids of removed documents; skipped by retrieval until compaction drops them
+        self.tombstones = tombstones
+        # chunk id -> index in chunks; carried into the next version when the layout allows
+        self.positions = positions
+
+    def live_chunk_count(self) -> int:
+        return len(self.chunks) - len(self.tombstones)
+
+    def chunk_positions(self) -> Dict[str, int]:
+        """chunk id -> index in chunks, so single chunks are found without a scan"""
+        if self.positions is None:
+            # A cache, not content: two readers building it at once get the same map
+            self.positions = {ch["id"]: i for i, ch in enumerate(self.chunks)}
+        return self.positions
 
 class Session:
     def __init__(self):
         self.created = time.time()
-        self.docs: Dict[str, Dict[str, Any]] = {}
-        self.chunks: List[Dict[str, Any]] = []
-        self.embeddings: Dict[str, list] = {}
-        self.ready = False
+        # Current published index; replaced wholesale, never modified in place
+        self.index = SessionIndex()
+        # Serializes writers only; readers never take it
+        self.lock = threading.Lock()
+        # memory-mapped snapshot the embeddings point into, if restored from one
+        self.backing = None
+        # near-duplicate fingerprint table (services/dedup.py), built on first upload
+        self.dedup = None
+        self.last_used = time.time()
+        # session id while this object is spilled to disk (see SessionStore.spill)
+        self.spilled: Optional[str] = None
+
+    def publish(self, index: SessionIndex):
+        """Swap in the next index version (caller holds self.lock)"""
+        self.index = index
+        self.last_used = time.time()
+        if self.spilled:
+            # A writer that fetched the session before it was spilled: its copy wins
+            SESSIONS.reinstate(self.spilled, self)
+
+    # Read-only conveniences over the current index. Code that reads more than
+    # one of these should take `idx = s.index` once instead.
+    @property
+    def docs(self): return self.index.docs
+    @property
+    def chunks(self): return self.index.chunks
+    @property
+    def embeddings(self): return self.index.embeddings
+    @property
+    def version(self) -> int: return self.index.version
+    @property
+    def ready(self) -> bool: return bool(self.index.chunks)
+
+    def live_chunk_count(self) -> int:
+        return self.index.live_chunk_count()
+
+SESSIONS_RESIDENT = Gauge("docuchat_sessions", "Sessions by storage tier", ("tier",))
+
+
+class Spilled:
+    """Stand-in for a session whose content lives in a snapshot file"""
+    __slots__ = ("path", "created", "size", "live")
+
+    def __init__(self, path: str, created: float, size: int, session: Session):
+        self.path = path
+        self.created = created
+        self.size = size
+        # The in-memory object stays usable while a request still holds it
+        self.live = weakref.ref(session)
+
 
 class SessionStore:
-    def __init__(self, ttl: int):
+    """
+    Sessions by id, in two tiers: resident, or spilled to a snapshot file in
+    `spill_dir` after `spill_idle` seconds without use. get() faults a spilled
+    session back in by memory-mapping its file, so embeddings are paged in
+    lazily instead of parsed.
+    """
+
+    def __init__(self, ttl: int, spill_idle: float = 0, spill_dir: str = ""):
         self.ttl = ttl
+        self.spill_idle = spill_idle
+        self.spill_dir = os.path.join(spill_dir, str(os.getpid())) if spill_dir else ""
         self._store: Dict[str, Session] = {}
+        self._spilled: Dict[str, Spilled] = {}
+        # Guards moves between tiers; plain lookups of resident sessions skip it
+        self._lock = threading.Lock()
+        self._stats = {"spills": 0, "faults": 0, "reinstates": 0}
 
     def new(self) -> str:
+        return self.add(Session())
+
+    def add(self, session: Session) -> str:
         sid = str(uuid.uuid4())
-        self._store[sid] = Session()
+        self._store[sid] = session
+        self._update_gauges()
         return sid
 
     def get(self, sid: str) -> Session:
-        s = self._store.get(sid)
+        s = self._store.get(sid) or self._fault_in(sid)
         if not s: raise HTTPException(404, "session not found")
         if time.time() - s.created > self.ttl:
             self.delete(sid)
             raise HTTPException(410, "session expired")
+        s.last_used = time.time()
         return s
 
     def delete(self, sid: str):
+        from .services.context_cache import CONTEXT_CACHE
         self._store.pop(sid, None)
+        with self._lock:
+            stub = self._spilled.pop(sid, None)
+        if stub:
+            self._remove(stub.path)
+        CONTEXT_CACHE.forget(sid)
+        self._update_gauges()
+
+    def _fault_in(self, sid: str) -> Optional[Session]:
+        from .services.snapshot import map_session
+        with self._lock:
+            s = self._store.get(sid)
+            if s is not None:
+                return s
+            stub = self._spilled.pop(sid, None)
+            if stub is None:
+                return None
+            s = stub.live()
+            if s is not None:
+                self._remove(stub.path)
+                self._stats["reinstates"] += 1
+            else:
+                t0 = time.perf_counter()
+                s = map_session(stub.path)
+                observe("session.fault_in", time.perf_counter() - t0)
+                s.created = stub.created
+                self._stats["faults"] += 1
+            s.spilled = None
+            self._store[sid] = s
+        self._update_gauges()
+        return s
+
+    def reinstate(self, sid: str, s: Session):
+        """Put a spilled session object back in the resident tier"""
+        with self._lock:
+            stub = self._spilled.pop(sid, None)
+            s.spilled = None
+            if stub is None:
+                # Already faulted back in (or deleted) meanwhile
+                return
+            self._store[sid] = s
+            self._stats["reinstates"] += 1
+        self._remove(stub.path)
+        self._update_gauges()
+
+    def spill(self, sid: str) -> bool:
+        """Write one resident session to disk and drop it from memory"""
+        from .services.context_cache import CONTEXT_CACHE
+        from .services.snapshot import write_session
+        s = self._store.get(sid)
+        if s is None or not self.spill_dir:
+            return False
+        idx = s.index
+        path = os.path.join(self.spill_dir, f"{sid}.{idx.version}.snap")
+        t0 = time.perf_counter()
+        size = write_session(s, path)
+        with s.lock, self._lock:
+            # Only if nothing was published meanwhile and nobody swapped the entry
+            if s.index is not idx or self._store.get(sid) is not s:
+                self._remove(path)
+                return False
+            del self._store[sid]
+            self._spilled[sid] = Spilled(path, s.created, size, s)
+            s.spilled = sid
+            self._stats["spills"] += 1
+        # An idle session's provider caches would only expire unused
+        CONTEXT_CACHE.forget(sid)
+        observe("session.spill", time.perf_counter() - t0)
+        self._update_gauges()
+        return True
+
+    def sweep(self) -> Dict[str, int]:
+        """Drop expired sessions and spill idle ones; run periodically"""
+        now = time.time()
+        expired = [sid for sid, s in list(self._store.items()) if now - s.created > self.ttl]
+        with self._lock:
+            expired += [sid for sid, stub in self._spilled.items() if now - stub.created > self.ttl]
+        for sid in expired:
+            self.delete(sid)
+        spilled = 0
+        if self.spill_idle > 0:
+            for sid, s in list(self._store.items()):
+                if now - s.last_used > self.spill_idle and s.chunks and not s.lock.locked():
+                    try:
+                        spilled += self.spill(sid)
+                    except OSError as e:
+                        print(f"[sessions] spill of {sid} failed: {e}")
+        return {"expired": len(expired), "spilled": spilled}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk = sum(stub.size for stub in self._spilled.values())
+            return {"resident": len(self._store), "spilled": len(self._spilled), "spilled_bytes": disk, **self._stats}
+
+    def close(self):
+        """Remove this process's spill files (on shutdown)"""
+        if self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _remove(self, path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _update_gauges(self):
+        SESSIONS_RESIDENT.set(("resident",), len(self._store))
+        SESSIONS_RESIDENT.set(("spilled",), len(self._spilled))
 
-SESSIONS = SessionStore(settings.session_ttl)
+SESSIONS = SessionStore(settings.session_ttl, settings.session_spill_idle, settings.session_spill_dir)
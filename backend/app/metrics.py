@@ -0,0 +1,218 @@
+"""
+Per-stage latency histograms and per-request timing
+
+`stage("chat.retrieve")` times a block, feeds the process-wide histogram and,
+when called inside a request, adds the duration to that request's timing so it
+can be returned as a Server-Timing header or a final SSE timing event.
+Histograms and gauges are rendered in Prometheus text format on /metrics.
+"""
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # bucket counts..., +Inf count, sum
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for le, count in zip(self.buckets, series):
+                cumulative += count
+                yield f'{self.name}_bucket{{{base}{sep}le="{le}"}} {int(cumulative)}'
+            cumulative += series[len(self.buckets)]
+            yield f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {int(cumulative)}'
+            yield f"{self.name}_sum{{{base}}} {series[-1]}"
+            yield f"{self.name}_count{{{base}}} {int(cumulative)}"
+
+
+class Gauge:
+    """Last-set value keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _GAUGES.append(self)
+
+    def set(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            yield f"{self.name}{{{base}}} {value}" if base else f"{self.name} {value}"
+
+
+_GAUGES: List[Gauge] = []
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram("docuchat_stage_seconds", "Time spent in one pipeline stage", ("stage",))
+REQUEST_SECONDS = Histogram("docuchat_request_seconds", "Time to response headers per route", ("method", "route", "status"))
+
+
+class RequestTiming:
+    """Stage durations accumulated for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        # Stages of one request may finish on several worker threads
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={sec * 1000:.1f}" for name, sec in list(self.stages.items())]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, float]:
+        out = {name: round(sec * 1000, 1) for name, sec in list(self.stages.items())}
+        out["total"] = round((time.perf_counter() - self.start) * 1000, 1)
+        return out
+
+
+_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _timing.get()
+
+
+def observe(name: str, seconds: float):
+    STAGE_SECONDS.observe((name,), seconds)
+    timing = _timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def observe_queue_wait(name: str):
+    """Record time from request arrival until now (e.g. waiting for a threadpool thread)"""
+    timing = _timing.get()
+    if timing is not None:
+        observe(name, time.perf_counter() - timing.start)
+
+
+def timed_stream(tokens: Iterable[str], name: str) -> Iterator[str]:
+    """Pass tokens through, recording `<name>.first_token` and total stream time"""
+    t0 = time.perf_counter()
+    first = True
+    try:
+        for tok in tokens:
+            if first:
+                observe(f"{name}.first_token", time.perf_counter() - t0)
+                first = False
+            yield tok
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def sse_timing_event() -> str:
+    timing = _timing.get()
+    if timing is None:
+        return ""
+    return f"event:timing\ndata:{json.dumps(timing.to_dict(), separators=(',', ':'))}\n\n"
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in (STAGE_SECONDS, REQUEST_SECONDS, *_GAUGES):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _route_label(scope) -> str:
+    """Path template for the matched route, e.g. /session/{session_id}/upload"""
+    if "route" not in scope:
+        return "unmatched"
+    path = scope.get("path", "")
+    for name, value in (scope.get("path_params") or {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware (does not buffer streaming bodies). Opens a
+    RequestTiming for each HTTP request, adds a Server-Timing header with the
+    stages finished before the response starts, and records request latency.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = RequestTiming()
+        token = _timing.set(timing)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.server_timing().encode()))
+                message = {**message, "headers": headers}
+                REQUEST_SECONDS.observe(
+                    (scope.get("method", ""), _route_label(scope), str(message.get("status", 0))),
+                    time.perf_counter() - timing.start,
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timing.reset(token)
@@ -0,0 +1,326 @@
+"""
+Opt-in sampling profiler for single requests
+
+A request is profiled when profiling is switched on (admin toggle or
+PROFILE_RATE) and it wins the sampling draw, or when header triggering is
+allowed and it sends `X-Profile: 1`. Only upload, document replace, chat and
+summarize requests are eligible.
+
+While a profile is open, one sampler thread wakes every PROFILE_INTERVAL_MS and
+records the Python stack of every thread currently working for that request.
+Threads join a request with attach(): the endpoint body (@profiled), each step
+of the streaming response (follow()), and the batch / single-flight worker
+threads. Finished profiles go into a bounded ring buffer and can be downloaded
+from /admin/profiles in speedscope JSON or collapsed-stack text.
+"""
+import functools
+import hmac
+import inspect
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+MAX_DEPTH = 128
+
+Frame = Tuple[str, str, int]
+
+
+class Profile:
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = next(self._ids)
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = 0.0
+        self.status = 0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def enter(self, tid: int):
+        with self._lock:
+            self._threads[tid] = self._threads.get(tid, 0) + 1
+
+    def leave(self, tid: int):
+        with self._lock:
+            n = self._threads.get(tid, 0) - 1
+            if n > 0:
+                self._threads[tid] = n
+            else:
+                self._threads.pop(tid, None)
+
+    def thread_ids(self) -> List[int]:
+        with self._lock:
+            return list(self._threads)
+
+    def add(self, stack: Tuple[Frame, ...]):
+        with self._lock:
+            self.stacks[stack] += 1
+            self.samples += 1
+
+    def finish(self, status: int):
+        self.duration = time.perf_counter() - self._t0
+        self.status = status
+
+    def summary(self) -> Dict[str, Any]:
+        return {"id": self.id, "method": self.method, "path": self.path, "status": self.status,
+                "started": self.started, "duration_ms": round(self.duration * 1000, 1),
+                "samples": self.samples, "interval_ms": self.interval * 1000}
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: root;...;leaf count"""
+        lines = []
+        for stack, n in self.stacks.most_common():
+            lines.append(";".join(f"{name} ({file}:{line})" for name, file, line in stack) + f" {n}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, n in self.stacks.items():
+            row = []
+            for fr in stack:
+                i = index.get(fr)
+                if i is None:
+                    i = index[fr] = len(frames)
+                    frames.append({"name": fr[0], "file": fr[1], "line": fr[2]})
+                row.append(i)
+            samples.append(row)
+            weights.append(n * self.interval * 1000)
+        name = f"{self.method} {self.path} #{self.id}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "docuchat",
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "milliseconds", "startValue": 0,
+                          "endValue": sum(weights), "samples": samples, "weights": weights}],
+        }
+
+
+def _stack(frame) -> Tuple[Frame, ...]:
+    out = []
+    while frame is not None and len(out) < MAX_DEPTH:
+        code = frame.f_code
+        if code.co_filename != __file__:
+            out.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    out.reverse()
+    return tuple(out)
+
+
+class Sampler:
+    """One background thread sampling every open profile; runs only while any is open"""
+
+    def __init__(self):
+        self._active: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, p: Profile):
+        with self._lock:
+            self._active.append(p)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, p: Profile):
+        with self._lock:
+            if p in self._active:
+                self._active.remove(p)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            interval = min(p.interval for p in active)
+            time.sleep(interval)
+            frames = sys._current_frames()
+            for p in active:
+                for tid in p.thread_ids():
+                    f = frames.get(tid)
+                    if f is not None:
+                        p.add(_stack(f))
+            del frames
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = settings.profile_rate > 0
+        self.rate = settings.profile_rate
+        self.allow_header = settings.profile_header
+        self.interval = settings.profile_interval_ms / 1000
+        self.profiles: deque = deque(maxlen=max(1, settings.profile_keep))
+        self.sampler = Sampler()
+        self._lock = threading.Lock()
+
+    def config(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "rate": self.rate, "header": self.allow_header,
+                "interval_ms": self.interval * 1000, "keep": self.profiles.maxlen}
+
+    def configure(self, enabled: Optional[bool] = None, rate: Optional[float] = None,
+                  header: Optional[bool] = None, interval_ms: Optional[float] = None) -> Dict[str, Any]:
+        if enabled is not None:
+            self.enabled = enabled
+        if rate is not None:
+            self.rate = min(1.0, max(0.0, rate))
+        if header is not None:
+            self.allow_header = header
+        if interval_ms is not None:
+            self.interval = max(0.001, interval_ms / 1000)
+        return self.config()
+
+    def wants(self, forced: bool) -> bool:
+        if forced and self.allow_header:
+            return True
+        return self.enabled and random.random() < self.rate
+
+    def begin(self, method: str, path: str) -> Profile:
+        p = Profile(method, path, self.interval)
+        self.sampler.start(p)
+        return p
+
+    def end(self, p: Profile, status: int):
+        self.sampler.stop(p)
+        p.finish(status)
+        with self._lock:
+            self.profiles.append(p)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [p.summary() for p in reversed(self.profiles)]
+
+    def get(self, pid: int) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self.profiles if p.id == pid), None)
+
+
+PROFILER = Profiler()
+
+_profile: ContextVar[Optional[Profile]] = ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def attach(p: Optional[Profile] = None):
+    """Count the current thread as working for the request's profile, if any"""
+    p = p or _profile.get()
+    if p is None:
+        yield
+        return
+    tid = threading.get_ident()
+    p.enter(tid)
+    try:
+        yield
+    finally:
+        p.leave(tid)
+
+
+def profiled(fn):
+    """Endpoint decorator: attach the thread (or event loop) running the body"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with attach():
+                return await fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with attach():
+                return fn(*args, **kwargs)
+    return wrapper
+
+
+def follow(it: Iterable) -> Iterator:
+    """Wrap a streaming body so every step is attributed, whichever thread runs it"""
+    p = _profile.get()
+    if p is None:
+        return iter(it)
+
+    def gen():
+        inner = iter(it)
+        try:
+            while True:
+                with attach(p):
+                    try:
+                        item = next(inner)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            close = getattr(inner, "close", None)
+            if close:
+                with attach(p):
+                    close()
+
+    return gen()
+
+
+def admin_ok(token: Optional[str]) -> bool:
+    """Whether a request carries the admin token; always False when none is configured"""
+    expected = settings.admin_token
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def _eligible(method: str, path: str) -> bool:
+    if method not in ("POST", "PUT"):
+        return False
+    return path.startswith(("/chat/", "/summarize")) or path.endswith("/upload") or "/documents/" in path
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that opens and closes a profile around eligible requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _eligible(scope.get("method", ""), scope.get("path", "")):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        forced = headers.get(b"x-profile", b"") in (b"1", b"true")
+        if forced and not admin_ok(headers.get(b"x-admin-token", b"").decode(errors="ignore")):
+            forced = False
+        if not PROFILER.wants(forced):
+            return await self.app(scope, receive, send)
+
+        p = PROFILER.begin(scope.get("method", ""), scope.get("path", ""))
+        token = _profile.set(p)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message.get("status", 0)
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", str(p.id).encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile.reset(token)
+            PROFILER.end(p, status)
+
+
+def render(p: Profile, fmt: str) -> Tuple[str, str, str]:
+    """(body, media type, file extension) of a stored profile"""
+    if fmt == "collapsed":
+        return p.collapsed(), "text/plain", "folded"
+    return json.dumps(p.speedscope()), "application/json", "speedscope.json"
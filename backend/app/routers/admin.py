@@ -0,0 +1,45 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response
+
+from ..schemas.admin import ProfilingIn
+from ..profiling import PROFILER, admin_ok, render
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Fail closed: without a configured ADMIN_TOKEN, /admin is off
+    if not admin_ok(x_admin_token):
+        raise HTTPException(403, "admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiling")
+def profiling_config():
+    return PROFILER.config()
+
+
+@router.post("/profiling")
+def set_profiling(payload: ProfilingIn):
+    """Turn sampling on/off, change the rate or allow `X-Profile: 1` at runtime"""
+    return PROFILER.configure(payload.enabled, payload.rate, payload.header, payload.interval_ms)
+
+
+@router.get("/profiles")
+def list_profiles():
+    return {"profiles": PROFILER.list()}
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: int, format: str = "speedscope"):
+    """speedscope JSON (default) or collapsed stacks (`format=collapsed`, for flamegraph.pl)"""
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(400, "format must be speedscope or collapsed")
+    p = PROFILER.get(profile_id)
+    if p is None:
+        raise HTTPException(404, "profile not found (expired from the ring buffer?)")
+    body, media_type, ext = render(p, format)
+    return Response(body, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="profile-{p.id}.{ext}"'})
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from ..services.asr_health import ASR_HEALTH
+from ..services.asr_cache import ASR_CACHE
+
+router = APIRouter()
+
+@router.get("/health")
+def asr_health():
+    """Circuit state plus call, error and latency counters per ASR provider"""
+    return {"providers": ASR_HEALTH.snapshot(), "cache": ASR_CACHE.stats()}
@@ -1,98 +1,222 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from ..schemas.chat import ChatIn
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fastapi import APIRouter, HTTPException, Request
+from ..config import settings
+from ..schemas.chat import ChatIn, BatchChatIn
 from ..memory import SESSIONS
-from ..services.retrieve import top_k
+from ..services.retrieve import top_k, top_k_many
 from ..services.pack import pack_context
-from ..services.llm import answer_stream
+from ..services.llm import answer_stream, answer_text, paced
 from ..services.conversation import conversation_manager
 from ..services.simple_chat import SimpleConversationalChat
+from ..services.admission import LLM_ADMISSION, AdmissionRejected, admit, INTERACTIVE, BACKGROUND
+from ..services.singleflight import CHAT_FLIGHTS, SUMMARY_FLIGHTS, prompt_key
+from ..services.model_router import ROUTER, classify
+from ..services.context_cache import CONTEXT_CACHE
+from ..metrics import stage, observe_queue_wait, timed_stream, sse_timing_event
+from .. import sse, deadline
+from ..deadline import Deadline
+from ..profiling import attach, profiled
 
 router = APIRouter()
 
-# Initialize chat service with fallback
-try:
-    from ..services.langchain_chat import DocumentAwareChatService
-    chat_service = DocumentAwareChatService()
-    print("✓ Using LangChain-based chat service")
-except (ImportError, ValueError) as e:
-    # Fallback to simple chat service if LangChain not available or API key missing
-    print(f"⚠ Falling back to SimpleConversationalChat: {e}")
-    chat_service = SimpleConversationalChat()
+# The chat service pulls in LangChain and langchain_google_genai, which dominates
+# cold start. Build it on first use (or from the lifespan warm-up) instead of at import.
+_chat_service = None
+_chat_service_lock = threading.Lock()
+
+def get_chat_service():
+    global _chat_service
+    if _chat_service is None:
+        with _chat_service_lock:
+            if _chat_service is None:
+                try:
+                    from ..services.langchain_chat import DocumentAwareChatService
+                    _chat_service = DocumentAwareChatService()
+                    print("✓ Using LangChain-based chat service")
+                except (ImportError, ValueError) as e:
+                    # Fallback to simple chat service if LangChain not available or API key missing
+                    print(f"⚠ Falling back to SimpleConversationalChat: {e}")
+                    _chat_service = SimpleConversationalChat()
+    return _chat_service
+
+def _rag_prompt(ctx: str, question: str) -> str:
+    sys = "You are a helpful assistant. Use ONLY the provided context to answer questions. Provide clear, well-structured responses without citations. If the context doesn't contain enough information to answer, say so clearly."
+    return f"{sys}\n\nCONTEXT:\n{ctx}\n\nUSER QUESTION: {question}\n\nASSISTANT RESPONSE:"
 
 @router.post("/stream")
-def chat_stream(payload: ChatIn):
+@profiled
+def chat_stream(payload: ChatIn, request: Request):
+    observe_queue_wait("chat.threadpool_wait")
+    dl = Deadline.for_request(payload.deadline_ms)
     s = SESSIONS.get(payload.session_id)
-    if not s.ready or not s.chunks:
+    if not s.ready or not s.live_chunk_count():
         raise HTTPException(400, "no indexed content; upload first")
+    version = s.version
 
-    hits = top_k(payload.message, s, k=payload.k or 8)
-    if not hits:
-        def gen_insufficient():
-            yield "data: insufficient evidence in sources\n\n"
-            yield "event:done\ndata:ok\n\n"
-        return StreamingResponse(gen_insufficient(), media_type="text/event-stream")
+    # Retrieval, packing and admission see the deadline and degrade to fit it
+    with deadline.active(dl):
+        with stage("chat.retrieve"):
+            hits = top_k(payload.message, s, k=payload.k or 8)
+        if not hits:
+            def gen_insufficient():
+                yield sse.event(" insufficient evidence in sources")
+                yield sse.done_event()
+            return sse.response(gen_insufficient(), request)
 
-    ctx = pack_context(hits, budget_chars=payload.max_ctx or 6000)
-    sys = "You are a helpful assistant. Use ONLY the provided context to answer questions. Provide clear, well-structured responses without citations. If the context doesn't contain enough information to answer, say so clearly."
-    prompt = f"{sys}\n\nCONTEXT:\n{ctx}\n\nUSER QUESTION: {payload.message}\n\nASSISTANT RESPONSE:"
+        with stage("chat.pack"):
+            ctx = pack_context(hits, budget_chars=dl.scale(payload.max_ctx or 6000, "pack"))
+        prompt = _rag_prompt(ctx, payload.message)
+        route = classify(payload.message, ctx, hits)
+        # Identical concurrent questions (same session version, question and context)
+        # share one generation. A leader turned away by admission control fails here,
+        # before any bytes are sent. The flight holds its LLM slot only for the
+        # provider call; the typing effect is applied per subscriber.
+        key = (payload.session_id, version, prompt_key(prompt))
+        tokens = CHAT_FLIGHTS.stream(key, lambda: answer_stream(prompt, pace=False, route=route), INTERACTIVE)
 
     def gen():
         # Cleaner metadata format
         sources = [{"source_id": h["source_id"], "chunk": h["span"]["chunk"]} for h in hits]
-        yield f"event:meta\ndata:{sources}\n\n"
-        
-        # Stream response in readable chunks
-        for token in answer_stream(prompt):
-            yield f"data:{token}\n\n"
-        yield "event:done\ndata:ok\n\n"
+        yield sse.json_event("meta", sources)
+
+        # Tokens are coalesced into fewer, larger frames. The deadline cuts the provider
+        # side only: an answer that arrived in time is sent in full, typing effect included
+        try:
+            yield from sse.text_events(timed_stream(paced(deadline.cut(tokens, dl)), "chat.llm"))
+        except HTTPException as e:
+            # Joined a generation that could not be admitted
+            yield sse.event(f"Error: {e.detail}")
+        if dl.cut or dl.degraded:
+            yield sse.json_event("deadline", dl.report())
+        yield sse_timing_event()
+        yield sse.done_event()
+
+    return sse.response(gen(), request)
+
+@router.post("/batch")
+@profiled
+def chat_batch(payload: BatchChatIn, request: Request):
+    """
+    Answer many questions against one session. Retrieval for all questions is
+    done in a single pass over the session, LLM calls run concurrently, and each
+    answer is streamed back as an `answer` event tagged with its question index
+    as soon as it finishes.
+    """
+    observe_queue_wait("batch.threadpool_wait")
+    s = SESSIONS.get(payload.session_id)
+    if not s.ready or not s.live_chunk_count():
+        raise HTTPException(400, "no indexed content; upload first")
+    questions = payload.questions
+    if not questions:
+        raise HTTPException(400, "no questions")
+    if len(questions) > settings.batch_max_questions:
+        raise HTTPException(400, f"too many questions (max {settings.batch_max_questions})")
+
+    with stage("batch.retrieve"):
+        all_hits = top_k_many(questions, s, k=payload.k or 8)
+    with stage("batch.pack"):
+        contexts = [pack_context(hits, budget_chars=payload.max_ctx or 6000) if hits else None for hits in all_hits]
+        prompts = [_rag_prompt(ctx, q) if ctx is not None else None for q, ctx in zip(questions, contexts)]
+    workers = max(1, min(payload.concurrency or settings.batch_concurrency, settings.batch_concurrency, len(questions)))
+
+    def answer(i: int) -> dict:
+        sources = [{"source_id": h["source_id"], "chunk": h["span"]["chunk"]} for h in all_hits[i]]
+        if prompts[i] is None:
+            text = "insufficient evidence in sources"
+        else:
+            # Batch work yields to interactive chats for LLM slots
+            try:
+                ticket = LLM_ADMISSION.acquire(BACKGROUND)
+            except AdmissionRejected as e:
+                return {"index": i, "question": questions[i], "error": e.reason, "retry_after": e.retry_after,
+                        "sources": sources}
+            with ticket, stage("batch.llm"), attach():
+                text = answer_text(prompts[i], route=classify(questions[i], contexts[i], all_hits[i])).strip()
+        return {"index": i, "question": questions[i], "answer": text, "sources": sources}
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+    def gen():
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-batch")
+        try:
+            # Each task gets its own copy of the request context so stage timings are recorded
+            futures = [executor.submit(contextvars.copy_context().run, answer, i) for i in range(len(questions))]
+            for fut in as_completed(futures):
+                yield sse.json_event("answer", fut.result())
+            yield sse_timing_event()
+            yield sse.done_event()
+        finally:
+            # Client went away or we finished: drop anything not yet started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return sse.response(gen(), request)
 
 @router.post("/conversational")
-def chat_conversational(payload: ChatIn):
+@profiled
+def chat_conversational(payload: ChatIn, request: Request):
     """
     Conversational chat endpoint with memory and prompt chaining
     Like NotebookLM/ChatGPT experience
     """
+    observe_queue_wait("conversational.threadpool_wait")
+    dl = Deadline.for_request(payload.deadline_ms)
     s = SESSIONS.get(payload.session_id)
-    if not s.ready or not s.chunks:
+    if not s.ready or not s.live_chunk_count():
         raise HTTPException(400, "no indexed content; upload first")
 
-    # Get relevant chunks
-    hits = top_k(payload.message, s, k=payload.k or 8)
-    if not hits:
-        def gen_insufficient():
-            yield "data: I don't have enough information in the documents to answer that question.\n\n"
-            yield "event:done\ndata:ok\n\n"
-        return StreamingResponse(gen_insufficient(), media_type="text/event-stream")
+    with deadline.active(dl):
+        # Get relevant chunks
+        with stage("conversational.retrieve"):
+            hits = top_k(payload.message, s, k=payload.k or 8)
+        if not hits:
+            def gen_insufficient():
+                yield sse.event(" I don't have enough information in the documents to answer that question.")
+                yield sse.done_event()
+            return sse.response(gen_insufficient(), request)
+
+        # Pack context
+        with stage("conversational.pack"):
+            ctx = pack_context(hits, budget_chars=dl.scale(payload.max_ctx or 6000, "pack"))
+
+        # Get conversation history
+        with stage("conversational.history"):
+            conversation = conversation_manager.get_conversation(payload.session_id)
+            conversation_history = conversation.get_recent_context(last_n=5)
+
+        chat_service = get_chat_service()
+        route = classify(payload.message, ctx, hits)
+        # Stable prefix (rules + the session's core documents) for provider-side caching, if it qualifies
+        cached = CONTEXT_CACHE.prefix_for(payload.session_id, s)
+        ticket = admit(INTERACTIVE)
+
+    def generate():
+        # The slot is held only for the provider call; the typing effect runs after it is freed
+        try:
+            # Check if we have LangChain service or simple service
+            if hasattr(chat_service, 'chat_with_documents'):
+                # LangChain service
+                tokens = list(chat_service.chat_with_documents(payload.message, ctx, payload.session_id,
+                                                               route=route, cached=cached, pace=False))
+            else:
+                # Simple service
+                tokens = list(chat_service.chat_with_documents(payload.message, ctx, conversation_history,
+                                                               route=route, cached=cached, pace=False))
+        finally:
+            # Released even if the stream was cut while the provider call was running
+            ticket.release()
+        yield from tokens
 
-    # Pack context
-    ctx = pack_context(hits, budget_chars=payload.max_ctx or 6000)
-    
-    # Get conversation history
-    conversation = conversation_manager.get_conversation(payload.session_id)
-    conversation_history = conversation.get_recent_context(last_n=5)
-    
     def gen():
         # Send metadata
         sources = [{"source_id": h["source_id"], "chunk": h["span"]["chunk"]} for h in hits]
-        yield f"event:meta\ndata:{sources}\n\n"
+        yield sse.json_event("meta", sources)
         
         # Stream conversational response and track full response
         assistant_response = ""
         try:
-            # Check if we have LangChain service or simple service
-            if hasattr(chat_service, 'chat_with_documents'):
-                # LangChain service
-                for token in chat_service.chat_with_documents(payload.message, ctx, payload.session_id):
-                    assistant_response += token
-                    yield f"data:{token}\n\n"
-            else:
-                # Simple service
-                for token in chat_service.chat_with_documents(payload.message, ctx, conversation_history):
-                    assistant_response += token
-                    yield f"data:{token}\n\n"
+            for chunk in sse.coalesce(timed_stream(paced(deadline.cut(generate(), dl)), "conversational.llm")):
+                assistant_response += chunk
+                yield sse.event(chunk)
             
             # Save both user and assistant messages to conversation memory
             conversation.add_message("user", payload.message, sources)
@@ -100,14 +224,32 @@ def chat_conversational(payload: ChatIn):
             
         except Exception as e:
             error_msg = f"Error: {str(e)}"
-            yield f"data:{error_msg}\n\n"
+            yield sse.event(error_msg)
             # Still save the conversation even if there's an error
             conversation.add_message("user", payload.message, sources)
             conversation.add_message("assistant", error_msg)
         
-        yield "event:done\ndata:ok\n\n"
+        if dl.cut or dl.degraded:
+            yield sse.json_event("deadline", dl.report())
+        yield sse_timing_event()
+        yield sse.done_event()
+
+    return sse.response(ticket.bind(gen()), request)
+
+@router.get("/admission")
+def admission_status():
+    """LLM slots in use, queue depth per priority, rejection and coalescing counters"""
+    return {**LLM_ADMISSION.snapshot(), "coalesced": {"chat": CHAT_FLIGHTS.stats(), "summarize": SUMMARY_FLIGHTS.stats()}}
+
+@router.get("/routing")
+def routing_status():
+    """Fast/strong tier models, routing thresholds and per-tier latency"""
+    return ROUTER.stats()
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+@router.get("/context-cache")
+def context_cache_status():
+    """Registered prompt-prefix caches and how often they were reused"""
+    return CONTEXT_CACHE.stats()
 
 @router.post("/conversation/clear")
 def clear_conversation(payload: ChatIn):
@@ -116,6 +258,7 @@ def clear_conversation(payload: ChatIn):
     conversation.clear()
     
     # Clear memory if LangChain service is available
+    chat_service = get_chat_service()
     if hasattr(chat_service, 'chat_service'):
         chat_service.chat_service.clear_memory()
     
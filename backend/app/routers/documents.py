@@ -0,0 +1,65 @@
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException
+
+from ..memory import SESSIONS
+from ..config import settings
+from ..services.ingest import extract, index_document, index_stream, stream_format, remove_document, needs_compaction, compact
+from ..metrics import stage
+from ..profiling import profiled
+
+router = APIRouter()
+
+def _schedule_compaction(s, background: BackgroundTasks):
+    if needs_compaction(s):
+        background.add_task(compact, s)
+
+@router.get("/{session_id}/documents")
+def list_documents(session_id: str):
+    s = SESSIONS.get(session_id)
+    idx = s.index
+    return {
+        "documents": [
+            {"source_id": sid, "filename": doc["meta"].get("filename"), "len": doc["meta"].get("chars", len(doc["text"])),
+             "chunks": len(idx.source_chunks.get(sid, []))}
+            for sid, doc in idx.docs.items()
+        ],
+        "version": idx.version,
+        "dedup": s.dedup.stats() if s.dedup is not None else None,
+    }
+
+@router.delete("/{session_id}/documents/{source_id}")
+def delete_document(session_id: str, source_id: str, background: BackgroundTasks):
+    s = SESSIONS.get(session_id)
+    if source_id not in s.docs:
+        raise HTTPException(404, "document not found")
+    removed = remove_document(s, source_id)
+    _schedule_compaction(s, background)
+    return {"source_id": source_id, "removed_chunks": removed, "total_chunks": s.live_chunk_count(), "version": s.version}
+
+@router.put("/{session_id}/documents/{source_id}")
+@profiled
+def replace_document(session_id: str, source_id: str, background: BackgroundTasks, file: UploadFile = File(...)):
+    """Swap one document for a new version, keeping its source_id"""
+    s = SESSIONS.get(session_id)
+    if source_id not in s.docs:
+        raise HTTPException(404, "document not found")
+    if file.size and file.size > settings.max_file_mb * 1024 * 1024:
+        raise HTTPException(400, "payload too large")
+
+    name = file.filename or "file"
+    mime = file.content_type or "application/octet-stream"
+    removed = len(s.index.source_chunks.get(source_id, []))
+    # Old chunks are tombstoned and new ones added in one published version
+    fmt = stream_format(name, mime)
+    if fmt:
+        _, meta = index_stream(s, file.file, name, mime, fmt, source_id=source_id)
+        length = meta["chars"]
+    else:
+        with stage("upload.read"):
+            b = file.file.read()
+        text, meta = extract(b, name, mime)
+        index_document(s, text, meta, source_id=source_id)
+        length = len(text)
+    _schedule_compaction(s, background)
+    idx = s.index
+    return {"source_id": source_id, "filename": name, "len": length, "removed_chunks": removed,
+            "total_chunks": idx.live_chunk_count(), "version": idx.version}
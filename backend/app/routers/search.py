@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from ..schemas.search import SearchIn
+from ..memory import SESSIONS
+from ..services.search import search
+from ..metrics import observe_queue_wait
+
+router = APIRouter()
+
+MAX_PAGE_SIZE = 50
+
+@router.post("")
+def search_session(payload: SearchIn):
+    """
+    Ranked passages containing the query's words, with highlight offsets into
+    each chunk's text. No LLM call, so it does not touch the admission queue.
+    """
+    observe_queue_wait("search.threadpool_wait")
+    s = SESSIONS.get(payload.session_id)
+    if not s.ready or not s.live_chunk_count():
+        raise HTTPException(400, "no indexed content; upload first")
+    if not payload.query.strip():
+        raise HTTPException(400, "empty query")
+    page = max(1, payload.page or 1)
+    page_size = max(1, min(payload.page_size or 10, MAX_PAGE_SIZE))
+    found = search(payload.query, s, offset=(page - 1) * page_size, limit=page_size)
+    return {
+        "query": payload.query,
+        "page": page,
+        "page_size": page_size,
+        "total": found["total"],
+        "has_more": page * page_size < found["total"],
+        "results": found["results"],
+    }
@@ -1,6 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from ..memory import SESSIONS
+from ..config import settings
 from ..schemas.session import NewSessionOut
+from ..services.snapshot import export_session, load_session
+from ..services.shards import SHARDS
+from ..metrics import stage
 
 router = APIRouter()
 
@@ -8,7 +13,32 @@ router = APIRouter()
 def new_session():
     return {"session_id": SESSIONS.new()}
 
+@router.get("/stats")
+def session_stats():
+    """Resident vs spilled sessions, tier moves since startup and retrieval shards"""
+    return {**SESSIONS.stats(), "retrieval_shards": SHARDS.stats()}
+
 @router.delete("/{session_id}")
 def kill_session(session_id: str):
     SESSIONS.delete(session_id)
     return {"ok": True}
+
+@router.get("/{session_id}/export")
+def export(session_id: str):
+    """Binary snapshot of the session (texts, chunk metadata, float32 embeddings)"""
+    s = SESSIONS.get(session_id)
+    return StreamingResponse(
+        export_session(s),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.snap"'},
+    )
+
+@router.post("/import", response_model=NewSessionOut)
+def import_session(file: UploadFile = File(...)):
+    """Restore a session from a snapshot; embeddings are memory-mapped, not parsed"""
+    try:
+        with stage("session.import"):
+            s = load_session(file.file, settings.snapshot_dir)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(400, f"invalid snapshot: {e}")
+    return {"session_id": SESSIONS.add(s)}
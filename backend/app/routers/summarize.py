@@ -3,18 +3,33 @@ from fastapi.responses import JSONResponse
 from ..schemas.chat import SummarizeIn
 from ..memory import SESSIONS
 from ..services.llm import answer_stream
+from ..services.admission import BACKGROUND
+from ..services.singleflight import SUMMARY_FLIGHTS
+from ..services.model_router import Route, STRONG
+from ..metrics import stage, observe_queue_wait
+from ..profiling import profiled
 
 router = APIRouter()
 
 @router.post("")
+@profiled
 def summarize(payload: SummarizeIn):
+    observe_queue_wait("summarize.threadpool_wait")
     s = SESSIONS.get(payload.session_id)
-    if not s.ready or not s.chunks:
+    if not s.ready or not s.live_chunk_count():
         raise HTTPException(400, "no indexed content; upload first")
-    parts = []
-    for sid, doc in s.docs.items():
-        txt = doc["text"]
-        parts.append(f"[{sid}] {txt[:600]}")
-    prompt = f"Summarize the following documents into a concise {payload.mode} brief with bullet action items.\n\n" + "\n\n".join(parts)
-    out = "".join(list(answer_stream(prompt)))
-    return JSONResponse({"summary": out, "sources": list(s.docs.keys())})
+    idx = s.index
+    with stage("summarize.prompt"):
+        parts = []
+        docs = idx.docs
+        for sid, doc in docs.items():
+            txt = doc["text"]
+            parts.append(f"[{sid}] {txt[:600]}")
+        prompt = f"Summarize the following documents into a concise {payload.mode} brief with bullet action items.\n\n" + "\n\n".join(parts)
+    # Concurrent calls for the same session version and mode share one result;
+    # summaries queue behind interactive chats for the LLM slot, which is held
+    # only for the provider call (no typing delays; the text is collected anyway)
+    key = (payload.session_id, idx.version, payload.mode)
+    with stage("summarize.llm"):
+        out = "".join(SUMMARY_FLIGHTS.stream(key, lambda: answer_stream(prompt, pace=False, route=Route(STRONG, "summary")), BACKGROUND))
+    return JSONResponse({"summary": out, "sources": list(docs.keys())})
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class ProfilingIn(BaseModel):
+    enabled: Optional[bool] = None
+    rate: Optional[float] = None
+    header: Optional[bool] = None
+    interval_ms: Optional[float] = None
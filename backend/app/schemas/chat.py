@@ -1,12 +1,21 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class ChatIn(BaseModel):
     session_id: str
     message: str
     k: Optional[int] = 8
     max_ctx: Optional[int] = 6000
+    # Latency budget for the whole request; None uses CHAT_DEADLINE_MS
+    deadline_ms: Optional[int] = None
 
 class SummarizeIn(BaseModel):
     session_id: str
     mode: str | None = "executive"
+
+class BatchChatIn(BaseModel):
+    session_id: str
+    questions: List[str]
+    k: Optional[int] = 8
+    max_ctx: Optional[int] = 6000
+    concurrency: Optional[int] = None
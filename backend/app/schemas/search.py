@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class SearchIn(BaseModel):
+    session_id: str
+    query: str
+    page: Optional[int] = 1
+    page_size: Optional[int] = 10
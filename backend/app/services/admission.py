@@ -0,0 +1,166 @@
+"""
+Admission control for upstream LLM calls
+
+At most `limit` generations run at once; further callers wait in a bounded
+queue and are admitted in priority order (interactive chat before summaries
+and batch work, FIFO within a class). When the queue is full, or a caller has
+waited longer than `queue_wait`, the request is turned away right away with
+AdmissionRejected, which the routers map to 429/503 plus Retry-After, instead
+of piling more calls onto a provider that is already rate-limiting us.
+
+Waiting callers block a server threadpool thread, so the queue is also capped
+at `max_blocked` (a quarter of THREADPOOL_SIZE by default): a burst of queued
+chats can never take the threads that search and uploads need.
+"""
+import heapq
+import itertools
+import threading
+import time
+import weakref
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..config import settings
+from ..metrics import Gauge, observe
+from ..deadline import timeout as deadline_timeout
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+QUEUE_DEPTH = Gauge("docuchat_llm_queue_depth", "LLM calls waiting for admission", ("priority",))
+IN_FLIGHT = Gauge("docuchat_llm_in_flight", "LLM calls currently admitted", ())
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def to_http(self) -> HTTPException:
+        return HTTPException(self.status, self.reason, headers={"Retry-After": str(self.retry_after)})
+
+
+class Ticket:
+    """One admitted call; release() is idempotent"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._start = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(time.perf_counter() - self._start)
+
+    def bind(self, obj):
+        """Release when obj (e.g. a streaming generator) is garbage collected, even if it never ran"""
+        weakref.finalize(obj, self.release)
+        return obj
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, limit: int, queue_size: int, queue_wait: float, max_blocked: Optional[int] = None):
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size if max_blocked is None else min(queue_size, max_blocked))
+        self.queue_wait = queue_wait
+        self._cond = threading.Condition()
+        self._running = 0
+        # (priority, seq) of waiting callers; the head is the next to be admitted
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        # Smoothed seconds per admitted call, for the Retry-After estimate
+        self._hold_ewma = 1.0
+        self._stats = {"admitted": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def _queued(self, priority: int) -> int:
+        return sum(1 for p, _ in self._waiters if p == priority)
+
+    def _retry_after(self) -> int:
+        # Rough time for the queue ahead of a new caller to drain
+        backlog = len(self._waiters) + self._running
+        return max(1, int(round(self._hold_ewma * backlog / self.limit)))
+
+    def _update_gauges(self):
+        for p, name in PRIORITY_NAMES.items():
+            QUEUE_DEPTH.set((name,), self._queued(p))
+        IN_FLIGHT.set((), self._running)
+
+    def acquire(self, priority: int = INTERACTIVE) -> Ticket:
+        t0 = time.perf_counter()
+        with self._cond:
+            if self._running < self.limit and not self._waiters:
+                return self._admit(priority, t0)
+            # Background work may only fill half of the queue so a burst of
+            # summaries cannot lock interactive chat out of it
+            cap = self.queue_size if priority == INTERACTIVE else max(1, self.queue_size // 2)
+            if self._queued(priority) >= cap or len(self._waiters) >= self.queue_size:
+                self._stats["rejected_full"] += 1
+                raise AdmissionRejected(429, "too many requests in queue, retry later", self._retry_after())
+
+            me = (priority, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            self._update_gauges()
+            # Never wait past the request's own deadline
+            deadline = t0 + deadline_timeout(self.queue_wait)
+            try:
+                while not (self._running < self.limit and self._waiters[0] == me):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._stats["rejected_timeout"] += 1
+                        raise AdmissionRejected(503, "upstream model busy, retry later", self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+                self._update_gauges()
+                # Someone else may now be at the head with a free slot
+                self._cond.notify_all()
+            return self._admit(priority, t0)
+
+    def _admit(self, priority: int, t0: float) -> Ticket:
+        self._running += 1
+        self._stats["admitted"] += 1
+        self._update_gauges()
+        observe(f"admission.{PRIORITY_NAMES[priority]}.wait", time.perf_counter() - t0)
+        return Ticket(self)
+
+    def _release(self, held: float):
+        with self._cond:
+            self._running -= 1
+            self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * held
+            self._update_gauges()
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self._running,
+                "queue_size": self.queue_size,
+                "queued": {name: self._queued(p) for p, name in PRIORITY_NAMES.items()},
+                "avg_call_s": round(self._hold_ewma, 3),
+                **self._stats,
+            }
+
+
+def admit(priority: int = INTERACTIVE) -> Ticket:
+    """Acquire an LLM slot or fail the request with 429/503 and Retry-After"""
+    try:
+        return LLM_ADMISSION.acquire(priority)
+    except AdmissionRejected as e:
+        raise e.to_http()
+
+
+LLM_ADMISSION = AdmissionController(settings.llm_concurrency, settings.llm_queue_size, settings.llm_queue_wait,
+                                    max_blocked=max(1, settings.threadpool_size // 4))
@@ -0,0 +1,143 @@
+"""
+On-disk transcription cache keyed by audio content hash
+
+Entries are small JSON files named after sha256(audio bytes) plus the ASR
+provider/model configuration, so re-uploading the same recording skips
+transcription entirely. The directory is kept under a size bound by evicting
+the least recently used entries (file mtime is bumped on every hit).
+
+The cache is best effort: a full or read-only disk only costs the cache write,
+never the upload that produced the transcript.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+from ..config import settings
+
+
+class TranscriptCache:
+    def __init__(self, root: str, max_bytes: int, namespace: str):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.write_errors = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, file_bytes: bytes) -> str:
+        h = hashlib.sha256(file_bytes)
+        h.update(b"\0" + self.namespace.encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # Read-only cache dir: the entry still counts, it just ages by write time
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        entry = {
+            "text": result.get("text", ""),
+            "segments": result.get("segments", []),
+            "lang": result.get("lang", "auto"),
+            "meta": result.get("meta", {}),
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            tmp = None
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                old = os.path.getsize(path) if os.path.exists(path) else 0
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                tmp = None
+                self._size = self._current_size() + len(data) - old
+                if self._size > self.max_bytes:
+                    self._evict()
+            except OSError as e:
+                self.write_errors += 1
+                print(f"[asr-cache] could not write {path}: {e}")
+            finally:
+                if tmp is not None:
+                    try:
+                        os.unlink(tmp)
+                    except OSError:
+                        pass
+
+    def _evict(self):
+        # Drop oldest entries until we are back under 90% of the bound
+        target = int(self.max_bytes * 0.9)
+        for path, size, _ in sorted(self._entries(), key=lambda e: e[2]):
+            if self._size <= target:
+                break
+            try:
+                os.unlink(path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "write_errors": self.write_errors,
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+ASR_CACHE = TranscriptCache(
+    settings.asr_cache_dir,
+    settings.asr_cache_max_mb * 1024 * 1024,
+    # Providers/models that can produce a transcript; changing any of them invalidates old entries
+    f"sarvam:saarika|whisper:{settings.whisper_model}",
+)
@@ -0,0 +1,153 @@
+"""
+Provider health tracking for the ASR fallback chain
+
+Each provider gets a circuit breaker: after a run of consecutive failures the
+circuit opens and the provider is skipped until a cooldown passes, then one
+trial call is let through (half-open) to decide whether to close it again.
+Only provider-side trouble counts as a failure (5xx, 429, timeouts, connection
+errors); a bad upload (4xx, unparseable response, unsupported format) says
+nothing about the provider's health.
+"""
+import time
+import threading
+from typing import Dict, Any, Callable, Optional
+
+from ..config import settings
+from ..metrics import observe
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Local pool errors that mean the provider is overloaded or stuck, like a 429 / timeout
+_OVERLOAD_ERRORS = ("whisper_timeout", "whisper_queue_full")
+
+
+def is_transient(e: BaseException) -> bool:
+    # requests, httpx and the stdlib all name these *Timeout* / *ConnectionError*
+    return isinstance(e, (TimeoutError, ConnectionError)) or any(
+        "Timeout" in t.__name__ or t.__name__ == "ConnectionError" for t in type(e).__mro__)
+
+
+def provider_failed(meta: Dict[str, Any]) -> bool:
+    """Whether a result's error should count against the provider's breaker"""
+    error = meta.get("error")
+    if not error:
+        return False
+    if meta.get("transient") or error in _OVERLOAD_ERRORS:
+        return True
+    if error.startswith("api_error_"):
+        code = error[len("api_error_"):]
+        return code.isdigit() and (int(code) >= 500 or int(code) in (408, 429))
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= self.cooldown:
+                # Let exactly one trial call through
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.state = OPEN
+                self.opened_at = time.time()
+
+
+class ProviderStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.skipped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, error: Optional[str]):
+        with self._lock:
+            self.calls += 1
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+            if error:
+                self.errors += 1
+                self.last_error = error
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "latency_avg_s": self.latency_total / self.calls if self.calls else 0.0,
+            "latency_max_s": self.latency_max,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderHealth:
+    """Registry of breakers and stats keyed by provider name"""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str):
+        with self._lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(self.threshold, self.cooldown)
+                self.stats[name] = ProviderStats()
+            return self.breakers[name], self.stats[name]
+
+    def call(self, name: str, fn: Callable[..., dict], *args) -> dict:
+        """Run one provider through its breaker; skipped calls return an error result"""
+        breaker, stats = self._get(name)
+        if not breaker.allow():
+            stats.skip()
+            return {"text": "", "segments": [], "lang": "auto", "meta": {"error": "circuit_open", "provider": name}}
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            result = {"text": "", "segments": [], "lang": "auto", "meta": {"error": str(e), "transient": is_transient(e)}}
+        meta = result.get("meta", {})
+        elapsed = time.perf_counter() - start
+        stats.observe(elapsed, meta.get("error"))
+        observe(f"asr.{name}", elapsed)
+        breaker.record(not provider_failed(meta))
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            names = list(self.breakers)
+        out = {}
+        for name in names:
+            breaker, stats = self.breakers[name], self.stats[name]
+            out[name] = {"state": breaker.state, "consecutive_failures": breaker.failures, **stats.to_dict()}
+        return out
+
+
+ASR_HEALTH = ProviderHealth(settings.asr_breaker_threshold, settings.asr_breaker_cooldown)
@@ -1,23 +1,57 @@
 import os
 import json
+import contextvars
+import threading
 from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ..config import settings
+from ..deadline import Deadline, active as deadline_active, timeout as deadline_timeout
 from .asr_fallback import transcribe_with_whisper, transcribe_with_ffmpeg_whisper
+from .asr_health import ASR_HEALTH, is_transient
+from .asr_cache import ASR_CACHE
 
-# Safe import for requests
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except ImportError:
-    REQUESTS_AVAILABLE = False
-    requests = None
+# Safe, lazy import for requests (it costs ~100 ms at startup; only needed for uploads)
+requests = None
+
+def _load_requests() -> bool:
+    global requests
+    if requests is None:
+        try:
+            import requests as _requests
+        except ImportError:
+            return False
+        requests = _requests
+    return True
+
+# Threads for hedged transcription (Sarvam chain and local chain run side by side).
+# One slot per thread: a chain that cannot start at once is not queued behind others.
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=settings.asr_hedge_workers, thread_name_prefix="asr-hedge")
+_HEDGE_SLOTS = threading.BoundedSemaphore(settings.asr_hedge_workers)
 
 def transcribe(file_bytes: bytes, filename: str, mime: str) -> dict:
+    """
+    Transcribe audio/video, serving repeat uploads of the same audio from the
+    on-disk transcript cache
+    """
+    key = ASR_CACHE.key(file_bytes) if ASR_CACHE.enabled else None
+    if key:
+        cached = ASR_CACHE.get(key)
+        if cached is not None:
+            cached["meta"] = {**cached.get("meta", {}), "filename": filename, "mime": mime, "cached": True}
+            return cached
+
+    result = _transcribe_uncached(file_bytes, filename, mime)
+    if key and 'error' not in result.get('meta', {}):
+        ASR_CACHE.put(key, result)
+    return result
+
+def _transcribe_uncached(file_bytes: bytes, filename: str, mime: str) -> dict:
     """
     Transcribe audio/video using Sarvam AI Speech-to-Text API
     Supports both Real-time API (for short files) and Batch API (for longer files)
     """
     # Check if requests module is available
-    if not REQUESTS_AVAILABLE:
+    if not _load_requests():
         return {
             "text": f"[SARVAM-ASR: requests module not available for {filename}. Using fallback transcription.]",
             "segments": [],
@@ -48,42 +82,26 @@ def transcribe(file_bytes: bytes, filename: str, mime: str) -> dict:
                 "meta": {"filename": filename, "mime": mime, "error": "file_too_large", "size_mb": file_size_mb}
             }
         
-        # Try real-time API first for all files
-        result = _transcribe_realtime(file_bytes, filename, mime, api_key)
-        
-        # If real-time fails, try batch
-        if 'error' in result.get('meta', {}):
-            batch_result = _transcribe_batch(file_bytes, filename, mime, api_key)
-            # If batch also fails, try fallback methods
-            if 'error' in batch_result.get('meta', {}):
-                # Try Whisper fallback first
-                whisper_result = transcribe_with_whisper(file_bytes, filename, mime)
-                if 'error' not in whisper_result.get('meta', {}):
-                    return whisper_result
-                
-                # Try FFmpeg + Whisper fallback
-                ffmpeg_result = transcribe_with_ffmpeg_whisper(file_bytes, filename, mime)
-                if 'error' not in ffmpeg_result.get('meta', {}):
-                    return ffmpeg_result
-                
-                # If all methods fail, return comprehensive error message
-                return {
-                    "text": f"[TRANSCRIPTION FAILED: Unable to transcribe {filename} using any available method.\n\nSARVAM API Issues:\n- Both real-time and batch APIs failed\n- This could be due to invalid/expired API key, service issues, or network problems\n\nFallback Methods Failed:\n- Whisper: {whisper_result['meta'].get('error', 'Unknown error')}\n- FFmpeg+Whisper: {ffmpeg_result['meta'].get('error', 'Unknown error')}\n\nRecommendations:\n1. Check your SARVAM API key\n2. Try a different audio file format (WAV, MP3)\n3. Install Whisper locally: pip install openai-whisper\n4. Install FFmpeg for audio conversion]",
-                    "segments": [],
-                    "lang": "auto",
-                    "meta": {
-                        "filename": filename, 
-                        "mime": mime, 
-                        "error": "all_methods_failed",
-                        "sarvam_realtime_error": result['meta'].get('error'),
-                        "sarvam_batch_error": batch_result['meta'].get('error'),
-                        "whisper_error": whisper_result['meta'].get('error'),
-                        "ffmpeg_error": ffmpeg_result['meta'].get('error')
-                    }
-                }
+        if settings.asr_hedge_delay > 0:
+            hedged = _transcribe_hedged(file_bytes, filename, mime, api_key)
+            if hedged is not None:
+                return hedged
+
+        # Try real-time API first, then batch; providers with an open circuit are skipped
+        result, batch_result = _run_sarvam(file_bytes, filename, mime, api_key)
+        if 'error' not in result.get('meta', {}):
+            return result
+        if 'error' not in batch_result.get('meta', {}):
             return batch_result
-        
-        return result
+
+        # If both Sarvam APIs fail, try fallback methods
+        whisper_result, ffmpeg_result = _run_local(file_bytes, filename, mime)
+        if 'error' not in whisper_result.get('meta', {}):
+            return whisper_result
+        if 'error' not in ffmpeg_result.get('meta', {}):
+            return ffmpeg_result
+
+        return _all_failed(filename, mime, result, batch_result, whisper_result, ffmpeg_result)
             
     except Exception as e:
         return {
@@ -93,13 +111,108 @@ def transcribe(file_bytes: bytes, filename: str, mime: str) -> dict:
             "meta": {"filename": filename, "mime": mime, "error": str(e)}
         }
 
+_NOT_RUN = {"text": "", "segments": [], "lang": "auto", "meta": {"error": "not_attempted"}}
+
+def _run_sarvam(file_bytes: bytes, filename: str, mime: str, api_key: str, stop: threading.Event | None = None):
+    """Sarvam realtime then batch; returns (realtime_result, batch_result)"""
+    result = ASR_HEALTH.call("sarvam_realtime", _transcribe_realtime, file_bytes, filename, mime, api_key)
+    if 'error' not in result.get('meta', {}) or (stop and stop.is_set()):
+        return result, _NOT_RUN
+    batch_result = ASR_HEALTH.call("sarvam_batch", _transcribe_batch, file_bytes, filename, mime, api_key)
+    return result, batch_result
+
+def _run_local(file_bytes: bytes, filename: str, mime: str, stop: threading.Event | None = None):
+    """Whisper then ffmpeg+Whisper; returns (whisper_result, ffmpeg_result)"""
+    whisper_result = ASR_HEALTH.call("whisper", transcribe_with_whisper, file_bytes, filename, mime)
+    if 'error' not in whisper_result.get('meta', {}) or (stop and stop.is_set()):
+        return whisper_result, _NOT_RUN
+    ffmpeg_result = ASR_HEALTH.call("ffmpeg_whisper", transcribe_with_ffmpeg_whisper, file_bytes, filename, mime)
+    return whisper_result, ffmpeg_result
+
+def _first_ok(pair) -> dict | None:
+    for r in pair:
+        if 'error' not in r.get('meta', {}):
+            return r
+    return None
+
+def _hedge_submit(fn, *args, stop: threading.Event):
+    """
+    Run one chain on the hedge pool under its own ASR_HEDGE_TIMEOUT budget (or the
+    caller's deadline if shorter); None if every hedge thread is busy
+    """
+    if not _HEDGE_SLOTS.acquire(blocking=False):
+        return None
+    budget = Deadline(deadline_timeout(settings.asr_hedge_timeout))
+
+    def attempt():
+        with deadline_active(budget):
+            return fn(*args, stop=stop)
+
+    future = _HEDGE_POOL.submit(contextvars.copy_context().run, attempt)
+    future.add_done_callback(lambda _: _HEDGE_SLOTS.release())
+    return future
+
+def _transcribe_hedged(file_bytes: bytes, filename: str, mime: str, api_key: str) -> dict | None:
+    """
+    Start the Sarvam chain, and start the local chain too if Sarvam has not
+    answered within ASR_HEDGE_DELAY seconds. The first successful result wins;
+    the loser finishes its current provider call (so provider health stays
+    current) but does not start the next one. None if the pool is full.
+    """
+    stop = threading.Event()
+    sarvam = _hedge_submit(_run_sarvam, file_bytes, filename, mime, api_key, stop=stop)
+    if sarvam is None:
+        return None
+    try:
+        pending = {sarvam}
+        local = None
+        done, _ = wait(pending, timeout=settings.asr_hedge_delay)
+        if not done or _first_ok(sarvam.result()) is None:
+            local = _hedge_submit(_run_local, file_bytes, filename, mime, stop=stop)
+            if local is not None:
+                pending.add(local)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ok = _first_ok(fut.result())
+                if ok is not None:
+                    return ok
+
+        result, batch_result = sarvam.result()
+        # No thread was free for the local chain: run it here, after Sarvam
+        whisper_result, ffmpeg_result = local.result() if local is not None else _run_local(file_bytes, filename, mime)
+        ok = _first_ok((whisper_result, ffmpeg_result))
+        if ok is not None:
+            return ok
+        return _all_failed(filename, mime, result, batch_result, whisper_result, ffmpeg_result)
+    finally:
+        stop.set()
+
+def _all_failed(filename: str, mime: str, result: dict, batch_result: dict, whisper_result: dict, ffmpeg_result: dict) -> dict:
+    # If all methods fail, return comprehensive error message
+    return {
+        "text": f"[TRANSCRIPTION FAILED: Unable to transcribe {filename} using any available method.\n\nSARVAM API Issues:\n- Both real-time and batch APIs failed\n- This could be due to invalid/expired API key, service issues, or network problems\n\nFallback Methods Failed:\n- Whisper: {whisper_result['meta'].get('error', 'Unknown error')}\n- FFmpeg+Whisper: {ffmpeg_result['meta'].get('error', 'Unknown error')}\n\nRecommendations:\n1. Check your SARVAM API key\n2. Try a different audio file format (WAV, MP3)\n3. Install Whisper locally: pip install openai-whisper\n4. Install FFmpeg for audio conversion]",
+        "segments": [],
+        "lang": "auto",
+        "meta": {
+            "filename": filename, 
+            "mime": mime, 
+            "error": "all_methods_failed",
+            "sarvam_realtime_error": result['meta'].get('error'),
+            "sarvam_batch_error": batch_result['meta'].get('error'),
+            "whisper_error": whisper_result['meta'].get('error'),
+            "ffmpeg_error": ffmpeg_result['meta'].get('error')
+        }
+    }
+
 def _transcribe_realtime(file_bytes: bytes, filename: str, mime: str, api_key: str) -> dict:
     """
     Use Sarvam Real-time API for short audio files (< 1MB)
     """
     try:
         # Use the correct Sarvam API endpoint
-        url = "https://api.sarvam.ai/v1/speech-to-text"
+        url = f"{settings.sarvam_base_url}/v1/speech-to-text"
         
         headers = {
             "Authorization": f"Bearer {api_key}"
@@ -120,7 +233,7 @@ def _transcribe_realtime(file_bytes: bytes, filename: str, mime: str, api_key: s
             }
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
+        response = requests.post(url, headers=headers, json=payload, timeout=deadline_timeout(settings.asr_http_timeout))
         
         if response.status_code == 200:
             try:
@@ -158,7 +271,7 @@ def _transcribe_realtime(file_bytes: bytes, filename: str, mime: str, api_key: s
             "text": f"[SARVAM-ASR: Real-time API error for {filename}: {str(e)}]",
             "segments": [],
             "lang": "auto",
-            "meta": {"filename": filename, "mime": mime, "error": str(e)}
+            "meta": {"filename": filename, "mime": mime, "error": str(e), "transient": is_transient(e)}
         }
 
 def _transcribe_batch(file_bytes: bytes, filename: str, mime: str, api_key: str) -> dict:
@@ -167,7 +280,7 @@ def _transcribe_batch(file_bytes: bytes, filename: str, mime: str, api_key: str)
     """
     try:
         # Use the batch endpoint for large files
-        url = "https://api.sarvam.ai/v1/speech-to-text"
+        url = f"{settings.sarvam_base_url}/v1/speech-to-text"
         
         headers = {
             "Authorization": f"Bearer {api_key}"
@@ -185,8 +298,8 @@ def _transcribe_batch(file_bytes: bytes, filename: str, mime: str, api_key: str)
             "response_format": "json"
         }
         
-        # Increased timeout for large files
-        response = requests.post(url, headers=headers, files=files, data=data, timeout=300)
+        # Large files take longer than a sync call; still bounded by the caller's deadline
+        response = requests.post(url, headers=headers, files=files, data=data, timeout=deadline_timeout(settings.asr_batch_http_timeout))
         
         if response.status_code == 200:
             result = response.json()
@@ -216,7 +329,7 @@ def _transcribe_batch(file_bytes: bytes, filename: str, mime: str, api_key: str)
             "text": f"[SARVAM-ASR: Batch API error for {filename}: {str(e)}]",
             "segments": [],
             "lang": "auto",
-            "meta": {"filename": filename, "mime": mime, "error": str(e)}
+            "meta": {"filename": filename, "mime": mime, "error": str(e), "transient": is_transient(e)}
         }
 
 def get_supported_formats() -> list:
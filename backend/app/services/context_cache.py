@@ -0,0 +1,209 @@
+"""
+Provider-side caching of a session's stable prompt prefix
+
+Conversational prompts are laid out as
+
+    prefix  system rules + the session's core document context   (same bytes every turn)
+    suffix  retrieved context + history + current question       (changes every turn)
+
+The core context is the session's live chunks, grouped by document in upload
+order, up to CONTEXT_CACHE_MAX_CHARS; documents past the budget are left out,
+so a growing session keeps the same core once it is full. When the core is at
+least CONTEXT_CACHE_MIN_CHARS (providers refuse tiny caches), the prefix is
+registered once per model with the Gemini cachedContents API, and turns send
+only the suffix plus the cache handle. A handle is reused until it is about to
+expire or the core changes. Without a handle (registration failed, or the
+provider rejected it) the core is not sent inline: the turn goes out as the
+system rules plus the suffix, which carries the retrieved context anyway.
+Handles are dropped when their session is deleted or spilled.
+
+loadtest/stubs.py implements cachedContents, so this can be exercised offline
+with GEMINI_BASE_URL pointing at the stub.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from ..metrics import observe
+
+SYSTEM_PROMPT = "You are a helpful AI assistant. Use ONLY the provided document context to answer questions."
+
+# Renew a handle this long before the provider expires it
+RENEW_MARGIN = 30
+MEMO_SIZE = 64
+
+
+class CachedPrefix:
+    """The stable prefix of one session version, and where it is registered"""
+    __slots__ = ("session_id", "version", "context", "key")
+
+    def __init__(self, session_id: str, version: int, context: str):
+        self.session_id = session_id
+        self.version = version
+        # Core document context; the prefix is rebuilt from it so only one copy is kept
+        self.context = context
+        self.key = hashlib.sha256(self.text.encode("utf-8", errors="ignore")).hexdigest()
+
+    @property
+    def text(self) -> str:
+        return prefix_text(self.context)
+
+
+def core_context(idx) -> str:
+    """Live chunk texts, whole documents in upload order, up to CONTEXT_CACHE_MAX_CHARS"""
+    positions = idx.chunk_positions()
+    parts, used, emitted = [], 0, set()
+    for sid, doc in idx.docs.items():
+        name = doc.get("meta", {}).get("filename") or sid
+        texts = []
+        for cid in idx.source_chunks.get(sid, ()):
+            if cid in positions and cid not in idx.tombstones and cid not in emitted:
+                emitted.add(cid)
+                texts.append(idx.chunks[positions[cid]]["text"])
+        if not texts:
+            continue
+        seg = f"\n[Document: {name}]\n" + "\n".join(texts) + "\n"
+        if used + len(seg) > settings.context_cache_max_chars:
+            # Stop at the first document that does not fit, so later uploads leave the core alone
+            break
+        used += len(seg)
+        parts.append(seg)
+    return "".join(parts)
+
+
+def system_text() -> str:
+    """Start of every conversational prompt; all a turn needs in front of it without a cache handle"""
+    return f"{SYSTEM_PROMPT}\n\n"
+
+
+def prefix_text(core: str) -> str:
+    return f"{system_text()}SESSION DOCUMENTS:\n{core}\n\n"
+
+
+def turn_text(context: str) -> str:
+    """Retrieved context at the start of the per-turn suffix"""
+    return f"DOCUMENT CONTEXT:\n{context}\n\n"
+
+
+class ContextCache:
+    def __init__(self):
+        # (session_id, version) -> CachedPrefix, so the core context is built once per version
+        self._prefixes: "OrderedDict[Tuple[str, int], Optional[CachedPrefix]]" = OrderedDict()
+        # (session_id, model) -> (prefix key, handle name, expires at, client that created it)
+        self._handles: Dict[Tuple[str, str], Tuple[str, str, float, Any]] = {}
+        # (prefix key, model) the provider refused, so it is not retried every turn
+        self._refused: Dict[Tuple[str, str], float] = {}
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"registered": 0, "reused": 0, "renewed": 0, "failed": 0, "uncached": 0, "chars_saved": 0}
+
+    def prefix_for(self, session_id: str, session) -> Optional[CachedPrefix]:
+        """The session's stable prefix, or None if caching is off or the session does not qualify"""
+        if not settings.context_cache:
+            return None
+        idx = session.index
+        memo = (session_id, idx.version)
+        with self._lock:
+            if memo in self._prefixes:
+                self._prefixes.move_to_end(memo)
+                return self._prefixes[memo]
+        core = core_context(idx)
+        ref = None
+        if len(core) >= settings.context_cache_min_chars:
+            ref = CachedPrefix(session_id, idx.version, core)
+        with self._lock:
+            self._prefixes[memo] = ref
+            while len(self._prefixes) > MEMO_SIZE:
+                self._prefixes.popitem(last=False)
+        return ref
+
+    def handle(self, ref: CachedPrefix, model: str, client) -> Optional[str]:
+        """Registered cache name for this prefix on `model`, creating or renewing it as needed"""
+        slot = (ref.session_id, model)
+        with self._lock:
+            lock = self._key_locks.setdefault(slot, threading.Lock())
+        # One registration per session and model at a time; other sessions are not held up
+        with lock:
+            now = time.time()
+            with self._lock:
+                current = self._handles.get(slot)
+                if current and current[0] == ref.key and current[2] - RENEW_MARGIN > now:
+                    self._stats["reused"] += 1
+                    self._stats["chars_saved"] += len(ref.context)
+                    return current[1]
+                refused = self._refused.get((ref.key, model))
+                if refused and refused > now:
+                    self._stats["uncached"] += 1
+                    return None
+            stale = current[1] if current else None
+            name = self._register(ref, model, client)
+            with self._lock:
+                if name is None:
+                    for k in [k for k, until in self._refused.items() if until <= now]:
+                        del self._refused[k]
+                    self._refused[(ref.key, model)] = now + settings.context_cache_ttl
+                    self._handles.pop(slot, None)
+                    self._stats["failed"] += 1
+                else:
+                    self._handles[slot] = (ref.key, name, now + settings.context_cache_ttl, client)
+                    self._stats["renewed" if current and current[0] == ref.key else "registered"] += 1
+        if stale and stale != name:
+            self._delete(stale, client)
+        return name
+
+    def invalidate(self, ref: CachedPrefix, model: str):
+        """Forget a handle the provider no longer accepts"""
+        with self._lock:
+            current = self._handles.get((ref.session_id, model))
+            if current and current[0] == ref.key:
+                del self._handles[(ref.session_id, model)]
+
+    def forget(self, session_id: str):
+        """Drop everything kept for a session (deleted or spilled); its provider caches are deleted"""
+        with self._lock:
+            for memo in [m for m in self._prefixes if m[0] == session_id]:
+                del self._prefixes[memo]
+            slots = [slot for slot in self._key_locks if slot[0] == session_id]
+            for slot in slots:
+                del self._key_locks[slot]
+            handles = [self._handles.pop(slot) for slot in slots if slot in self._handles]
+        if handles:
+            # Provider round trips; the caller may be a request or the session sweeper
+            threading.Thread(target=lambda: [self._delete(h[1], h[3]) for h in handles],
+                             name="context-cache-delete", daemon=True).start()
+
+    def _register(self, ref: CachedPrefix, model: str, client) -> Optional[str]:
+        from google.genai import types
+        t0 = time.perf_counter()
+        try:
+            cache = client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    contents=[types.Content(role="user", parts=[types.Part(text=ref.text)])],
+                    display_name=f"docuchat-{ref.session_id[:8]}-v{ref.version}",
+                    ttl=f"{int(settings.context_cache_ttl)}s",
+                ),
+            )
+        except Exception as e:
+            print(f"[context-cache] registering prefix for {ref.session_id} on {model} failed: {e}")
+            return None
+        finally:
+            observe("llm.cache_register", time.perf_counter() - t0)
+        return cache.name
+
+    def _delete(self, name: str, client):
+        try:
+            client.caches.delete(name=name)
+        except Exception:
+            # It expires on its own
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": settings.context_cache, "handles": len(self._handles), **self._stats}
+
+
+CONTEXT_CACHE = ContextCache()
@@ -0,0 +1,99 @@
+"""
+Near-duplicate chunk detection for uploads
+
+Each chunk is fingerprinted with a 64-bit SimHash over its word 3-shingles.
+Two chunks whose fingerprints differ in at most `max_distance` bits are treated
+as the same content. Candidates come from LSH buckets: the fingerprint is cut
+into max_distance + 1 bands and only chunks sharing at least one band exactly
+are compared, which (by pigeonhole) still finds every match within the distance.
+
+The table is per session and only used by writers; readers never see it.
+"""
+import hashlib
+import threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+SHINGLE = 3
+
+
+def _h64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8", errors="ignore"), digest_size=8).digest(), "little")
+
+
+def simhash(text: str) -> int:
+    words = text.lower().split()
+    if len(words) <= SHINGLE:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    hashes = [_h64(g) for g in grams]
+    half = len(hashes) / 2
+    fp = 0
+    for bit in range(64):
+        mask = 1 << bit
+        if sum(1 for h in hashes if h & mask) > half:
+            fp |= mask
+    return fp
+
+
+class SessionDedup:
+    def __init__(self, max_distance: int):
+        self.max_distance = max(0, min(max_distance, 31))
+        self.bands = self.max_distance + 1
+        self.width = 64 // self.bands
+        self._mask = (1 << self.width) - 1
+        self.fingerprints: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, int], List[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"chunks_seen": 0, "chunks_folded": 0}
+
+    @classmethod
+    def from_index(cls, idx, max_distance: int) -> "SessionDedup":
+        """Fingerprint every live chunk of an index (e.g. one restored from a snapshot)"""
+        d = cls(max_distance)
+        for ch in idx.chunks:
+            if ch["id"] not in idx.tombstones:
+                d.add(ch["id"], simhash(ch["text"]))
+        return d
+
+    def _keys(self, fp: int) -> Iterable[Tuple[int, int]]:
+        return ((b, (fp >> (b * self.width)) & self._mask) for b in range(self.bands))
+
+    def find(self, fp: int, alive: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """Id of a stored chunk within max_distance bits of fp, if any"""
+        with self._lock:
+            for key in self._keys(fp):
+                for cid in self._buckets.get(key, ()):
+                    if (self.fingerprints[cid] ^ fp).bit_count() <= self.max_distance and (alive is None or alive(cid)):
+                        return cid
+        return None
+
+    def add(self, cid: str, fp: int):
+        with self._lock:
+            self.fingerprints[cid] = fp
+            for key in self._keys(fp):
+                self._buckets.setdefault(key, []).append(cid)
+
+    def discard(self, cids: Iterable[Hashable]):
+        with self._lock:
+            for cid in cids:
+                fp = self.fingerprints.pop(cid, None)
+                if fp is None:
+                    continue
+                for key in self._keys(fp):
+                    bucket = self._buckets.get(key)
+                    if bucket and cid in bucket:
+                        bucket.remove(cid)
+                        if not bucket:
+                            del self._buckets[key]
+
+    def record(self, seen: int, folded: int):
+        with self._lock:
+            self._stats["chunks_seen"] += seen
+            self._stats["chunks_folded"] += folded
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            seen = self._stats["chunks_seen"]
+            return {**self._stats, "fold_rate": round(self._stats["chunks_folded"] / seen, 4) if seen else 0.0,
+                    "fingerprints": len(self.fingerprints)}
@@ -0,0 +1,297 @@
+"""
+Document ingestion and removal for a session's chunk store
+
+Writers never modify the published index: each change builds the next
+SessionIndex and publishes it under the session's writer lock. Removal is
+incremental: a document's chunk ids are tombstoned (retrieval skips them) and
+the chunk list and embeddings are only rebuilt by compact(), which runs in the
+background once enough of the list is dead. Every visible change bumps the
+index version so caches keyed on it are invalidated.
+
+Near-duplicate chunks (services/dedup.py) are not embedded again: they are
+folded into the existing canonical chunk, whose `sources` list then records
+every (source_id, span) it stands for. Removing a document only tombstones the
+chunks no other document still references.
+"""
+import time
+import uuid
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from ..config import settings
+from ..memory import SessionIndex
+from ..metrics import stage, observe
+from .extract import read_text_any
+from .stream_extract import iter_pieces, detect_format
+from .asr_sarvam import transcribe
+from .chunk import chunk_text
+from .embed import embed_text
+from .quantize import quantize
+from .dedup import SessionDedup, simhash
+
+AV_EXTENSIONS = (".mp3", ".mp4", ".m4a", ".wav", ".mov", ".mkv")
+
+def stream_format(name: str, mime: str) -> Optional[str]:
+    """Format for index_stream, or None for uploads that go through extract()"""
+    if mime.startswith(("audio/", "video/")) or name.lower().endswith(AV_EXTENSIONS):
+        return None
+    return detect_format(name, mime)
+
+
+def extract(file_bytes: bytes, name: str, mime: str) -> Tuple[str, Dict[str, Any]]:
+    """Text plus metadata for one uploaded file (ASR for audio/video)"""
+    if mime.startswith(("audio/", "video/")) or name.lower().endswith(AV_EXTENSIONS):
+        with stage("upload.asr"):
+            tr = transcribe(file_bytes, name, mime)
+        return tr["text"], {"type": "av", "sarvam": True, **tr.get("meta", {})}
+    with stage("upload.extract"):
+        doc = read_text_any(file_bytes, name, mime)
+    return doc["text"], {"type": "doc", **doc["meta"]}
+
+
+def index_document(s, text: str, meta: Dict[str, Any], source_id: Optional[str] = None) -> str:
+    """
+    Chunk and embed one document into the session; returns its source_id.
+    If source_id already exists the old version is replaced in the same index
+    version, so readers see either the old or the new document, never neither.
+    """
+    with stage("upload.chunk"):
+        pieces = chunk_text(text, size=800)
+    return _index_pieces(s, ((p, {}) for p in pieces), {"text": text, "meta": meta}, source_id)
+
+
+def index_stream(s, fileobj, name: str, mime: str, fmt: str,
+                 source_id: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Extract, chunk and embed a text upload straight from its file object (see
+    stream_extract). The document keeps the full decoded text, as for
+    extract(); its length is in meta["chars"]. Returns (source_id, meta).
+    """
+    meta: Dict[str, Any] = {"type": "doc", "filename": name, "mime": mime}
+    doc = {"text": "", "meta": meta}
+    text: List[str] = []
+    extract_s = 0.0
+
+    def pieces():
+        nonlocal extract_s
+        it = iter_pieces(fileobj, fmt, meta, sink=text)
+        while True:
+            t0 = time.perf_counter()
+            piece = next(it, None)
+            extract_s += time.perf_counter() - t0
+            if piece is None:
+                # Exhausted: finish the document before it is published
+                observe("upload.extract", extract_s)
+                doc["text"] = "".join(text)
+                meta["chars"] = len(doc["text"])
+                return
+            yield piece
+
+    return _index_pieces(s, pieces(), doc, source_id), meta
+
+
+def _live(idx, cid: str) -> bool:
+    return cid in idx.embeddings and cid not in idx.tombstones
+
+
+def _dedup_for(s) -> Optional[SessionDedup]:
+    if not settings.dedup_enabled:
+        return None
+    if s.dedup is None:
+        with s.lock:
+            if s.dedup is None:
+                s.dedup = SessionDedup.from_index(s.index, settings.dedup_max_distance)
+    return s.dedup
+
+
+def _provenance(ch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return list(ch.get("sources") or [{"source_id": ch["source_id"], "span": ch["span"]}])
+
+
+def _detach(idx, source_id: str) -> Tuple[frozenset, Dict[str, Dict[str, Any]]]:
+    """
+    Take source_id off its chunks. Returns the chunk ids to tombstone (no other
+    source left) and replacement dicts for shared chunks that stay. Only the
+    document's own chunks are visited: source_chunks lists every chunk a
+    document owns or was folded into, and positions finds each one.
+    """
+    cids = set(idx.source_chunks.get(source_id, ()))
+    if not cids:
+        return frozenset(), {}
+    positions = idx.chunk_positions()
+    replaced = {}
+    for cid in cids:
+        pos = positions.get(cid)
+        ch = idx.chunks[pos] if pos is not None else None
+        if ch is not None and "sources" in ch:
+            remaining = [r for r in ch["sources"] if r["source_id"] != source_id]
+            if remaining:
+                new = {**ch, "source_id": remaining[0]["source_id"], "span": remaining[0]["span"]}
+                if len(remaining) > 1:
+                    new["sources"] = remaining
+                else:
+                    del new["sources"]
+                replaced[cid] = new
+    return frozenset(cids - replaced.keys()), replaced
+
+
+def _patched(idx, replaced: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Any], ...]:
+    """idx.chunks with some chunk dicts swapped in place (same positions)"""
+    if not replaced:
+        return idx.chunks
+    positions = idx.chunk_positions()
+    out = list(idx.chunks)
+    for cid, ch in replaced.items():
+        out[positions[cid]] = ch
+    return tuple(out)
+
+
+def _index_pieces(s, pieces: Iterable[Tuple[str, Dict[str, Any]]], doc: Dict[str, Any],
+                  source_id: Optional[str]) -> str:
+    source_id = source_id or str(uuid.uuid4())
+    dedup = _dedup_for(s)
+    # Near-duplicates of chunks already in the session (or earlier in this
+    # document) are not embedded; they are folded into that canonical chunk.
+    # The version being replaced is not a valid target.
+    pending = SessionDedup(settings.dedup_max_distance) if dedup else None
+    replacing = frozenset(s.index.source_chunks.get(source_id, ()))
+
+    def alive(cid: str) -> bool:
+        return cid not in replacing and _live(s.index, cid)
+
+    # The expensive part runs outside the writer lock. Upload routes are sync and
+    # run in the threadpool, so parallel uploads (even into one session) overlap
+    # here and chats keep streaming; CPU-bound embedding still shares the GIL.
+    new_chunks, new_embeddings = [], {}
+    order: List[str] = []          # this document's chunk ids in piece order
+    folded = []                    # (position in order, canonical id, provenance entry, text)
+    embed_s = dedup_s = 0.0
+    n = 0
+    for n, (piece, span) in enumerate(pieces, start=1):
+        span = {"chunk": n - 1, **span}
+        if dedup:
+            t0 = time.perf_counter()
+            fp = simhash(piece)
+            canon = pending.find(fp) or dedup.find(fp, alive)
+            dedup_s += time.perf_counter() - t0
+            if canon:
+                folded.append((len(order), canon, {"source_id": source_id, "span": span}, piece))
+                order.append(canon)
+                continue
+        cid = str(uuid.uuid4())
+        new_chunks.append({"id": cid, "text": piece, "source_id": source_id, "span": span})
+        order.append(cid)
+        t0 = time.perf_counter()
+        new_embeddings[cid] = quantize(embed_text(piece))
+        embed_s += time.perf_counter() - t0
+        if dedup:
+            pending.add(cid, fp)
+    observe("upload.embed", embed_s)
+    if dedup:
+        observe("upload.dedup", dedup_s)
+
+    with s.lock:
+        idx = s.index
+        local = {ch["id"]: ch for ch in new_chunks}
+        wanted = {canon for _, canon, _, _ in folded if canon not in local}
+        positions = idx.chunk_positions()
+        published = {cid: idx.chunks[positions[cid]] for cid in wanted if cid in positions}
+        replaced: Dict[str, Dict[str, Any]] = {}
+        for pos, canon, ref, piece in folded:
+            if canon in local:
+                ch = local[canon]
+                ch.setdefault("sources", _provenance(ch)).append(ref)
+            elif canon in published and _live(idx, canon):
+                if canon not in replaced:
+                    replaced[canon] = {**published[canon], "sources": _provenance(published[canon])}
+                replaced[canon]["sources"].append(ref)
+            else:
+                # Canonical chunk was removed meanwhile: index this one after all
+                cid = str(uuid.uuid4())
+                ch = {"id": cid, "text": piece, "source_id": source_id, "span": ref["span"]}
+                new_chunks.append(ch)
+                local[cid] = ch
+                new_embeddings[cid] = quantize(embed_text(piece))
+                order[pos] = cid
+        dead, detached = _detach(idx, source_id) if replacing else (frozenset(), {})
+        replaced.update(detached)
+        source_chunks = dict(idx.source_chunks)
+        source_chunks[source_id] = list(dict.fromkeys(order))
+        base = len(idx.chunks)
+        positions = dict(positions)
+        positions.update((ch["id"], base + i) for i, ch in enumerate(new_chunks))
+        s.publish(SessionIndex(
+            version=idx.version + 1,
+            docs={**idx.docs, source_id: doc},
+            chunks=_patched(idx, replaced) + tuple(new_chunks),
+            embeddings={**idx.embeddings, **new_embeddings},
+            source_chunks=source_chunks,
+            tombstones=idx.tombstones | dead if dead else idx.tombstones,
+            positions=positions,
+        ))
+    if dedup:
+        for cid in new_embeddings:
+            fp = pending.fingerprints.get(cid)
+            dedup.add(cid, simhash(local[cid]["text"]) if fp is None else fp)
+        dedup.discard(dead)
+        dedup.record(n, n - len(new_chunks))
+        doc["meta"]["deduplicated_chunks"] = n - len(new_chunks)
+    return source_id
+
+
+def remove_document(s, source_id: str) -> int:
+    """Detach a document from its chunks; returns how many chunks it had"""
+    with s.lock:
+        idx = s.index
+        if source_id not in idx.docs:
+            return 0
+        count = len(idx.source_chunks.get(source_id, ()))
+        # Chunks shared with other documents (folded duplicates) stay, the rest are tombstoned
+        dead, replaced = _detach(idx, source_id)
+        source_chunks = dict(idx.source_chunks)
+        source_chunks.pop(source_id, None)
+        docs = dict(idx.docs)
+        docs.pop(source_id, None)
+        s.publish(SessionIndex(
+            version=idx.version + 1,
+            docs=docs,
+            chunks=_patched(idx, replaced),
+            embeddings=idx.embeddings,
+            source_chunks=source_chunks,
+            tombstones=idx.tombstones | dead,
+            # Chunks keep their positions until compaction
+            positions=idx.positions,
+        ))
+    if s.dedup is not None:
+        s.dedup.discard(dead)
+    return count
+
+
+def needs_compaction(s) -> bool:
+    idx = s.index
+    return bool(idx.tombstones) and len(idx.tombstones) >= settings.compact_min_dead_fraction * max(1, len(idx.chunks))
+
+
+def compact(s) -> int:
+    """
+    Rebuild the chunk list and embeddings without tombstoned entries; returns
+    how many were dropped. The rebuild runs without the writer lock and is only
+    published if no other write happened meanwhile (otherwise a later
+    compaction picks it up).
+    """
+    with stage("session.compact"):
+        idx = s.index
+        dead = idx.tombstones
+        if not dead:
+            return 0
+        compacted = SessionIndex(
+            version=idx.version,
+            docs=idx.docs,
+            chunks=tuple(ch for ch in idx.chunks if ch["id"] not in dead),
+            embeddings={cid: v for cid, v in idx.embeddings.items() if cid not in dead},
+            source_chunks=idx.source_chunks,
+        )
+        with s.lock:
+            if s.index is not idx:
+                return 0
+            s.publish(compacted)
+    return len(dead)
@@ -4,6 +4,11 @@ LangChain-based conversational chat service with prompt chaining
 import os
 import time
 from typing import Generator, List, Dict, Any, Optional
+from ..config import settings
+from .model_router import ROUTER, TIERS, Route, STRONG
+from .context_cache import CachedPrefix
+from .llm import answer_stream, paced
+from .simple_chat import turn_prompt
 
 # Safe imports for LangChain
 try:
@@ -48,7 +53,7 @@ except ImportError:
         def predict(self, input):
             return "LangChain not available"
     class ChatGoogleGenerativeAI:
-        def __init__(self, model, google_api_key, temperature, max_output_tokens):
+        def __init__(self, model, google_api_key, temperature, max_output_tokens, **kwargs):
             pass
         def invoke(self, messages):
             return type('obj', (object,), {'content': 'LangChain not available'})()
@@ -68,13 +73,22 @@ class ConversationalChatService:
         if not LANGCHAIN_AVAILABLE:
             raise ImportError("LangChain not installed. Please install with: pip install langchain langchain-google-genai")
         
-        # Initialize Gemini LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=self.api_key,
-            temperature=0.7,
-            max_output_tokens=2048
-        )
+        # Initialize one Gemini LLM per tier (see model_router.py); the strong one is the default
+        endpoint = {}
+        if settings.gemini_base_url:
+            endpoint = {"client_options": {"api_endpoint": settings.gemini_base_url}, "transport": "rest"}
+        self.llms = {
+            name: ChatGoogleGenerativeAI(
+                model=tier.model,
+                google_api_key=self.api_key,
+                temperature=0.7,
+                max_output_tokens=tier.max_tokens,
+                timeout=tier.timeout,
+                **endpoint
+            )
+            for name, tier in TIERS.items()
+        }
+        self.llm = self.llms[STRONG]
         
         # Create conversation memory
         self.memory = ConversationBufferWindowMemory(
@@ -188,20 +202,8 @@ Be conversational and reference previous parts of our conversation when relevant
         """Clear conversation memory"""
         self.memory.clear()
 
-class DocumentAwareChatService:
-    """Enhanced chat service with document awareness and conversation flow"""
-    
-    def __init__(self):
-        self.chat_service = ConversationalChatService()
-    
-    def create_conversation_chain(self, context: str) -> ConversationChain:
-        """Create a conversation chain with document context"""
-        
-        # System prompt with document context
-        system_prompt = f"""You are a helpful AI assistant that answers questions based on the provided documents.
-
-DOCUMENT CONTEXT:
-{context}
+# Same bytes every turn, so the provider's implicit prefix cache covers it and the history after it
+DOCUMENT_CHAT_RULES = """You are a helpful AI assistant that answers questions based on the provided documents.
 
 RULES:
 1. Use ONLY the provided document context to answer questions
@@ -211,16 +213,26 @@ RULES:
 5. Maintain natural conversation flow
 6. Provide clear, well-structured responses similar to ChatGPT"""
 
-        # Create prompt template
+class DocumentAwareChatService:
+    """Enhanced chat service with document awareness and conversation flow"""
+    
+    def __init__(self):
+        self.chat_service = ConversationalChatService()
+    
+    def create_conversation_chain(self, context: str, tier: str = STRONG) -> ConversationChain:
+        """Create a conversation chain with document context"""
+        
+        # Fixed rules first; the retrieved context changes every turn, so it goes with the question.
+        # It is bound as a partial variable, so braces in documents are not read as template fields.
         prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
+            ("system", DOCUMENT_CHAT_RULES),
             MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}")
-        ])
+            ("human", "DOCUMENT CONTEXT:\n{context}\n\nQuestion: {input}")
+        ]).partial(context=context)
         
         # Create conversation chain
         chain = ConversationChain(
-            llm=self.chat_service.llm,
+            llm=self.chat_service.llms[tier],
             memory=self.chat_service.memory,
             prompt=prompt,
             verbose=False
@@ -228,24 +240,46 @@ RULES:
         
         return chain
     
-    def chat_with_documents(self, question: str, context: str, session_id: str) -> Generator[str, None, None]:
-        """Chat with document context and conversation memory"""
+    def chat_with_documents(self, question: str, context: str, session_id: str,
+                            route: Optional[Route] = None,
+                            cached: Optional[CachedPrefix] = None, pace: bool = True) -> Generator[str, None, None]:
+        """Chat with document context and conversation memory (pace=False: no typing delays)"""
+        if cached is not None:
+            yield from self._chat_cached(question, context, route, cached, pace)
+            return
         try:
-            # Create conversation chain
-            chain = self.create_conversation_chain(context)
-            
+            # Create the chain for the routed tier; a timeout retries on the other tier
+            def predict(tier, timeout):
+                return self.create_conversation_chain(context, tier.name).predict(input=question)
+
             # Get response
-            response = chain.predict(input=question)
+            response = ROUTER.call(route or Route(STRONG, "default"), predict)
             
             # Stream response
             words = response.split()
             for word in words:
                 yield word + " "
-                time.sleep(0.03)
+                if pace:
+                    time.sleep(0.03)
                 
         except Exception as e:
             yield f"Error: {str(e)}"
     
+    def _chat_cached(self, question: str, context: str, route: Optional[Route], cached: CachedPrefix,
+                     pace: bool) -> Generator[str, None, None]:
+        """
+        A turn on a session with a cached prefix. LangChain's Gemini model cannot
+        pass a cache handle, so it goes through the genai client (llm.answer_stream)
+        with the same memory the chain uses.
+        """
+        memory = self.chat_service.memory
+        recent = memory.chat_memory.messages[-2 * memory.k:]
+        history = "\n".join(f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in recent)
+        tokens = list(answer_stream(turn_prompt(question, context, history), pace=False, route=route, cached=cached))
+        memory.chat_memory.add_user_message(question)
+        memory.chat_memory.add_ai_message("".join(tokens).strip())
+        yield from paced(tokens) if pace else tokens
+    
     def get_conversation_summary(self) -> Dict[str, Any]:
         """Get conversation summary"""
         return {
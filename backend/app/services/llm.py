@@ -1,11 +1,47 @@
 import time
 import os
-from typing import Generator
+import threading
+from typing import Generator, Iterable, Optional
+from ..config import settings
+from ..metrics import stage
+from .model_router import ROUTER, Route, STRONG, is_timeout
+from .context_cache import CONTEXT_CACHE, CachedPrefix, system_text
 
-def answer_stream(prompt: str) -> Generator[str, None, None]:
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+def _get_client(genai, api_key: str):
+    """One Gemini client per process, built on first use"""
+    global _client, _client_key
+    with _client_lock:
+        if _client is None or _client_key != api_key:
+            http_options = {"base_url": settings.gemini_base_url} if settings.gemini_base_url else None
+            _client = genai.Client(api_key=api_key, http_options=http_options)
+            _client_key = api_key
+        return _client
+
+def paced(tokens: Iterable[str]) -> Generator[str, None, None]:
+    """
+    Typing effect for a finished answer. Apply it outside any admitted section,
+    so LLM slots are not held while words trickle out to the client.
     """
-    Stream responses from Gemini 2.5 Flash model
+    for token in tokens:
+        yield token
+        time.sleep(0.1 if token == "\n\n" else 0.03)
+
+def answer_stream(prompt: str, pace: bool = True, route: Optional[Route] = None,
+                  cached: Optional[CachedPrefix] = None) -> Generator[str, None, None]:
+    """
+    Stream responses from the Gemini model of the routed tier (strong if no route)
+    pace=False drops the typing-effect delays (for callers that hold an LLM slot
+    or collect the full text; see paced())
+    cached: stable prompt prefix; `prompt` is then only the part that follows it
     """
+    tokens = _answer_tokens(prompt, route, cached)
+    return paced(tokens) if pace else tokens
+
+def _answer_tokens(prompt: str, route: Optional[Route], cached: Optional[CachedPrefix]) -> Generator[str, None, None]:
     try:
         from google import genai
         
@@ -15,13 +51,39 @@ def answer_stream(prompt: str) -> Generator[str, None, None]:
             yield "Error: GEMINI_API_KEY not found in environment variables"
             return
             
-        client = genai.Client(api_key=api_key)
+        client = _get_client(genai, api_key)
         
+        from google.genai import types
+
+        def generate(tier, timeout):
+            def call(contents, handle=None):
+                return client.models.generate_content(
+                    model=tier.model,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        max_output_tokens=tier.max_tokens,
+                        cached_content=handle,
+                        http_options=types.HttpOptions(timeout=int(timeout * 1000)),
+                    ),
+                )
+
+            if cached is None:
+                return call(prompt)
+            handle = CONTEXT_CACHE.handle(cached, tier.model, client)
+            if handle:
+                try:
+                    return call(prompt, handle)
+                except Exception as e:
+                    if is_timeout(e):
+                        raise
+                    # Expired or evicted on the provider side: go without it this time
+                    CONTEXT_CACHE.invalidate(cached, tier.model)
+            # The prompt already carries the retrieved context; the core is not sent inline
+            return call(system_text() + prompt)
+
         # Generate content (Gemini doesn't support streaming in this SDK version)
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
+        with stage("llm.generate"):
+            response = ROUTER.call(route or Route(STRONG, "default"), generate)
         
         # Stream response in clean, readable chunks
         if hasattr(response, 'text') and response.text:
@@ -40,9 +102,7 @@ def answer_stream(prompt: str) -> Generator[str, None, None]:
                     words = paragraph.strip().split()
                     for word in words:
                         yield word + " "
-                        time.sleep(0.03)  # Faster typing speed
                     yield "\n\n"  # Add paragraph break
-                    time.sleep(0.1)  # Pause between paragraphs
                 
     except ImportError:
         # Fallback to stub if google-genai not installed
@@ -51,7 +111,6 @@ def answer_stream(prompt: str) -> Generator[str, None, None]:
         txt = f"[STUB] {prompt[:200]}"
         for tok in txt.split():
             yield tok + " "
-            time.sleep(0.003)
             
     except Exception as e:
         yield f"Error calling Gemini API: {str(e)}"
@@ -59,4 +118,8 @@ def answer_stream(prompt: str) -> Generator[str, None, None]:
         txt = f"[STUB] {prompt[:200]}"
         for tok in txt.split():
             yield tok + " "
-            time.sleep(0.003)
+
+
+def answer_text(prompt: str, route: Optional[Route] = None) -> str:
+    """Full answer as one string, without streaming delays"""
+    return "".join(answer_stream(prompt, pace=False, route=route))
@@ -0,0 +1,160 @@
+"""
+Fast / strong LLM tier routing
+
+Each request is classified locally before the LLM call:
+
+  fast    short question, retrieved context covers most of its words, small packed context
+  strong  everything else (long questions, weak retrieval, large contexts, summaries)
+
+Tiers are configured by model name, max output tokens and a timeout
+(LLM_FAST_* / LLM_STRONG_*). A call that times out is retried once on the
+other tier, within whatever is left of the request deadline. Per-tier latency
+goes to the `llm.fast.generate` / `llm.strong.generate` stages and to
+ROUTER.stats() (p50/p95, timeouts, fallbacks) for tuning the thresholds.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional, TypeVar
+
+from ..config import settings
+from ..deadline import timeout as deadline_timeout
+from ..metrics import observe
+
+FAST = "fast"
+STRONG = "strong"
+
+T = TypeVar("T")
+
+
+class Tier:
+    __slots__ = ("name", "model", "max_tokens", "timeout")
+
+    def __init__(self, name: str, model: str, max_tokens: int, timeout: float):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+
+
+TIERS = {
+    FAST: Tier(FAST, settings.llm_fast_model, settings.llm_fast_max_tokens, settings.llm_fast_timeout),
+    STRONG: Tier(STRONG, settings.llm_strong_model, settings.llm_strong_max_tokens, settings.llm_strong_timeout),
+}
+
+
+class Route:
+    __slots__ = ("tier", "reason")
+
+    def __init__(self, tier: str, reason: str):
+        self.tier = tier
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Route({self.tier!r}, {self.reason!r})"
+
+
+def coverage(question: str, hits: Optional[Iterable[Dict[str, Any]]]) -> float:
+    """Share of the question's words found in the best-covered retrieved chunk"""
+    words = set(question.lower().split())
+    if not words or not hits:
+        return 0.0
+    return max((len(words & set(h["text"].lower().split())) / len(words) for h in hits), default=0.0)
+
+
+def classify(question: str, context: str = "", hits=None) -> Route:
+    if not settings.llm_routing:
+        return Route(STRONG, "routing disabled")
+    if len(question.strip()) > settings.route_fast_max_question:
+        return Route(STRONG, "long question")
+    if len(context) > settings.route_fast_max_context:
+        return Route(STRONG, "large context")
+    if coverage(question, hits) < settings.route_fast_min_coverage:
+        return Route(STRONG, "low retrieval confidence")
+    return Route(FAST, "short question, well covered")
+
+
+def is_timeout(e: BaseException) -> bool:
+    # httpx, requests, google-genai and LangChain all name their timeout errors *Timeout*
+    return isinstance(e, TimeoutError) or any("Timeout" in t.__name__ for t in type(e).__mro__)
+
+
+class TierStats:
+    def __init__(self, window: int = 512):
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.routed = 0
+        self.recent: deque = deque(maxlen=window)
+
+
+class ModelRouter:
+    def __init__(self):
+        self._stats = {name: TierStats() for name in TIERS}
+        self._lock = threading.Lock()
+
+    def call(self, route: Route, fn: Callable[[Tier, float], T]) -> T:
+        """
+        fn(tier, timeout) on the routed tier; if it times out, once more on the
+        other tier. Other errors propagate.
+        """
+        first = TIERS[route.tier]
+        other = TIERS[STRONG if route.tier == FAST else FAST]
+        with self._lock:
+            self._stats[first.name].routed += 1
+        for i, tier in enumerate((first, other)):
+            t0 = time.perf_counter()
+            try:
+                out = fn(tier, deadline_timeout(tier.timeout))
+            except Exception as e:
+                elapsed = time.perf_counter() - t0
+                observe(f"llm.{tier.name}.generate", elapsed)
+                with self._lock:
+                    st = self._stats[tier.name]
+                    st.calls += 1
+                    if is_timeout(e):
+                        st.timeouts += 1
+                    else:
+                        st.errors += 1
+                if i == 0 and is_timeout(e):
+                    with self._lock:
+                        self._stats[other.name].fallbacks += 1
+                    print(f"[llm] {tier.model} timed out after {elapsed:.1f}s; falling back to {other.model}")
+                    continue
+                raise
+            elapsed = time.perf_counter() - t0
+            observe(f"llm.{tier.name}.generate", elapsed)
+            with self._lock:
+                st = self._stats[tier.name]
+                st.calls += 1
+                st.recent.append(elapsed)
+            return out
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        with self._lock:
+            for name, st in self._stats.items():
+                lat = sorted(st.recent)
+                pct = (lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1)) if lat else (lambda q: None)
+                out[name] = {
+                    "model": TIERS[name].model,
+                    "max_tokens": TIERS[name].max_tokens,
+                    "timeout_s": TIERS[name].timeout,
+                    "routed": st.routed,
+                    "calls": st.calls,
+                    "timeouts": st.timeouts,
+                    "errors": st.errors,
+                    "fallbacks_in": st.fallbacks,
+                    "p50_ms": pct(0.5),
+                    "p95_ms": pct(0.95),
+                    "avg_ms": round(sum(lat) / len(lat) * 1000, 1) if lat else None,
+                }
+        return {"enabled": settings.llm_routing, "tiers": out,
+                "thresholds": {"fast_max_question": settings.route_fast_max_question,
+                               "fast_max_context": settings.route_fast_max_context,
+                               "fast_min_coverage": settings.route_fast_min_coverage}}
+
+
+ROUTER = ModelRouter()
@@ -0,0 +1,76 @@
+"""
+Compact storage for chunk embeddings
+
+EMBED_STORAGE picks how vectors are kept in a session:
+
+  float32  array('f'), 4 bytes per dimension (snapshots restore into this form too)
+  float16  half-precision bytes, 2 bytes per dimension
+  int8     signed bytes plus one float scale per vector (max |x| / 127), 1 byte per dimension
+
+A Python list of floats costs about 32 bytes per dimension. dot() scores a float
+query against any of these forms without keeping a dequantized copy around.
+float16 is read in place through a memoryview where Python supports the 'e'
+format (3.12+); older versions unpack each vector per score, which makes a
+float16 scan slower than float32 (see bench/quant.py).
+"""
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from operator import mul
+from typing import Sequence
+
+from ..config import settings
+
+MODES = ("float32", "float16", "int8")
+# memoryview.cast("e") is native-endian; stored halves are little-endian
+HALF_VIEW = sys.version_info >= (3, 12) and sys.byteorder == "little"
+
+
+class QInt8:
+    """int8 codes with a per-vector scale: x[i] ~= scale * codes[i]"""
+    __slots__ = ("scale", "codes")
+
+    def __init__(self, scale: float, codes: array):
+        self.scale = scale
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+
+@lru_cache(maxsize=16)
+def _half(n: int) -> struct.Struct:
+    return struct.Struct(f"<{n}e")
+
+
+def quantize(vec: Sequence[float], mode: str = None):
+    mode = mode or settings.embed_storage
+    if mode == "float16":
+        return _half(len(vec)).pack(*vec)
+    if mode == "int8":
+        peak = max((abs(x) for x in vec), default=0.0)
+        scale = peak / 127 if peak else 1.0
+        return QInt8(scale, array("b", [max(-127, min(127, round(x / scale))) for x in vec]))
+    if mode == "float32":
+        return array("f", vec)
+    raise ValueError(f"unknown embedding storage mode {mode!r}")
+
+
+def dequantize(vec) -> Sequence[float]:
+    """Floats back from any storage form (for export)"""
+    if type(vec) is bytes:
+        return _half(len(vec) // 2).unpack(vec)
+    if type(vec) is QInt8:
+        return [vec.scale * c for c in vec.codes]
+    return vec
+
+
+def dot(vq: Sequence[float], vt) -> float:
+    t = type(vt)
+    if t is QInt8:
+        return vt.scale * sum(map(mul, vq, vt.codes))
+    if t is bytes:
+        vt = memoryview(vt).cast("e") if HALF_VIEW else _half(len(vt) // 2).unpack(vt)
+    return sum(map(mul, vq, vt))
+
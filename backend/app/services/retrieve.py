@@ -1,16 +1,80 @@
 def _score(q: str, t: str, vq: list[float], vt: list[float]) -> float:
-    swq, swt = set(q.lower().split()), set(t.lower().split())
+    return _score_sets(set(q.lower().split()), set(t.lower().split()), vq, vt)
+
+def _score_sets(swq: set, swt: set, vq: list[float], vt) -> float:
     j = len(swq & swt) / max(1, len(swq | swt))
-    dot = sum(a*b for a,b in zip(vq, vt))
-    return j*0.4 + dot*0.6
+    # vt may be stored quantized (see quantize.py); dot scores it as is
+    return j*0.4 + dot(vq, vt)*0.6
 
+import heapq
 from .embed import embed_text
+from .quantize import dot
+from .shards import SHARDS
+from ..metrics import stage
+from .. import deadline
+
+# Chunks scored between deadline checks
+DEADLINE_STRIDE = 256
 
 def top_k(query: str, session, k=8):
-    vq = embed_text(query)
-    cands = []
-    for ch in session.chunks:
-        vt = session.embeddings[ch["id"]]
-        cands.append((_score(query, ch["text"], vq, vt), ch))
-    cands.sort(key=lambda x: x[0], reverse=True)
+    # Under a request deadline: skip the query embedding once half the budget is
+    # gone, and stop scanning (ranking what was scored) when a quarter is left
+    dl = deadline.current()
+    lexical = dl is not None and dl.fraction_left() < 0.5
+    if lexical:
+        dl.note("retrieve", "lexical")
+    else:
+        with stage("retrieve.embed_query"):
+            vq = embed_text(query)
+    # One immutable index version for the whole scan; uploads publish a new one
+    idx = session.index
+    if SHARDS.wants(idx):
+        # Very large sessions: score shards on all cores (None = scan here instead)
+        hits = SHARDS.search(session, idx, [query.lower().split()], None if lexical else [vq], k, dl)
+        if hits is not None:
+            return hits[0]
+    with stage("retrieve.score"):
+        cands = []
+        dead, embeddings = idx.tombstones, idx.embeddings
+        swq = set(query.lower().split())
+        for n, ch in enumerate(idx.chunks):
+            if dl is not None and n % DEADLINE_STRIDE == 0 and n and dl.fraction_left() < 0.25:
+                dl.note("retrieve", {"mode": "partial", "scanned": n, "of": len(idx.chunks)})
+                break
+            if ch["id"] in dead:
+                continue
+            if lexical:
+                swt = set(ch["text"].lower().split())
+                cands.append((len(swq & swt) / max(1, len(swq | swt)), ch))
+            else:
+                cands.append((_score(query, ch["text"], vq, embeddings[ch["id"]]), ch))
+    with stage("retrieve.rank"):
+        cands.sort(key=lambda x: x[0], reverse=True)
     return [c for _, c in cands[:k]]
+
+def top_k_many(queries: list[str], session, k=8) -> list[list[dict]]:
+    """
+    Retrieve for several queries in one pass over the session: each chunk is
+    tokenized and fetched once and scored against every query.
+    """
+    with stage("retrieve.embed_query"):
+        vqs = [embed_text(q) for q in queries]
+        swqs = [set(q.lower().split()) for q in queries]
+    # One immutable index version for the whole scan; uploads publish a new one
+    idx = session.index
+    if SHARDS.wants(idx):
+        hits = SHARDS.search(session, idx, [sorted(w) for w in swqs], vqs, k)
+        if hits is not None:
+            return hits
+    with stage("retrieve.score"):
+        cands = [[] for _ in queries]
+        dead, embeddings = idx.tombstones, idx.embeddings
+        for ch in idx.chunks:
+            if ch["id"] in dead:
+                continue
+            vt = embeddings[ch["id"]]
+            swt = set(ch["text"].lower().split())
+            for i, (swq, vq) in enumerate(zip(swqs, vqs)):
+                cands[i].append((_score_sets(swq, swt, vq, vt), ch))
+    with stage("retrieve.rank"):
+        return [[c for _, c in heapq.nlargest(k, cs, key=lambda x: x[0])] for cs in cands]
@@ -0,0 +1,71 @@
+"""
+LLM-free search over a session
+
+Ranks chunks with the same hybrid score as chat retrieval (query-term overlap
+plus embedding similarity), but only among chunks that actually contain a query
+term, and returns every match with its character offsets in the chunk text so
+clients can highlight them. Pagination happens after ranking, with a bounded
+heap: page n costs one scan plus O(n * page_size) heap work.
+"""
+import heapq
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from .embed import embed_text
+from .retrieve import _score_sets
+from ..metrics import stage
+
+MAX_TERMS = 32
+
+
+def query_pattern(query: str) -> Optional[Pattern]:
+    """Case-insensitive alternation of the query's words (longest first)"""
+    terms = {t for t in re.findall(r"\w+", query.lower()) if t}
+    if not terms:
+        return None
+    terms = sorted(terms, key=len, reverse=True)[:MAX_TERMS]
+    return re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\b", re.IGNORECASE)
+
+
+def highlights(pattern: Pattern, text: str) -> List[Tuple[int, int]]:
+    return [m.span() for m in pattern.finditer(text)]
+
+
+def search(query: str, session, offset: int = 0, limit: int = 10) -> Dict[str, Any]:
+    pattern = query_pattern(query)
+    if pattern is None:
+        return {"total": 0, "results": []}
+    with stage("search.embed_query"):
+        vq = embed_text(query)
+    swq = set(query.lower().split())
+    with stage("search.score"):
+        # One immutable index version for the whole scan; uploads publish a new one
+        idx = session.index
+        dead, embeddings = idx.tombstones, idx.embeddings
+        matches = []
+        for n, ch in enumerate(idx.chunks):
+            if ch["id"] in dead or not pattern.search(ch["text"]):
+                continue
+            score = _score_sets(swq, set(ch["text"].lower().split()), vq, embeddings[ch["id"]])
+            # n breaks ties in document order and keeps dicts out of comparisons
+            matches.append((score, -n, ch))
+    with stage("search.rank"):
+        top = heapq.nlargest(offset + limit, matches, key=lambda m: (m[0], m[1]))[offset:]
+    results = []
+    for rank, (score, _, ch) in enumerate(top, start=offset + 1):
+        doc = idx.docs.get(ch["source_id"], {})
+        hit = {
+            "rank": rank,
+            "score": round(score, 4),
+            "chunk_id": ch["id"],
+            "source_id": ch["source_id"],
+            "filename": doc.get("meta", {}).get("filename"),
+            "span": ch["span"],
+            "text": ch["text"],
+            "highlights": highlights(pattern, ch["text"]),
+        }
+        if "sources" in ch:
+            # Folded near-duplicate: the same passage in several documents
+            hit["sources"] = ch["sources"]
+        results.append(hit)
+    return {"total": len(matches), "results": results}
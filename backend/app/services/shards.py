@@ -0,0 +1,427 @@
+"""
+Sharded multi-core retrieval for very large sessions
+
+The in-process scan in retrieve.top_k runs on one core under the GIL. For
+sessions with at least RETRIEVE_SHARD_MIN_CHUNKS live chunks, the index
+version is copied once into shards kept in shared memory:
+
+  header   rows, dim, text bytes                    struct "<IIQ"
+  rows     position of each chunk in idx.chunks     int64 x rows
+  offsets  start of each chunk's text               int64 x (rows + 1)
+  vectors  embeddings                               float32 x rows x dim
+  text     lowercased chunk texts                   UTF-8
+
+A spawn-context process pool (RETRIEVE_WORKERS) scores the shards in
+parallel, with the same hybrid score as the in-process scan. Each shard
+returns its local top-k, and the lists are combined with a k-way merge
+(heapq.merge). Ties keep document order, as in the in-process scan. Workers
+only receive shard names and the query, so nothing large goes through pipes.
+A worker keeps the blocks it has seen attached and scores straight from the
+mapping through typed memoryviews, so a query copies nothing but the text of
+the row being scored. Blocks are detached once the parent reports them
+retired, or when more than MAX_ATTACHED are held.
+
+The first query of each index version starts a build on a background thread
+(one build at a time). Until it is done, queries keep using the shards of the
+previous version if the new one only added or deleted chunks: rows deleted
+since are dropped and the appended chunks are scored in process. The old
+blocks are unlinked when the last search using them finishes. Otherwise
+(no shards yet, a compacted index, a broken pool) queries use the in-process
+scan.
+"""
+import heapq
+import multiprocessing as mp
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict, deque
+from itertools import islice
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..config import settings
+from ..logging import get_logger
+from ..metrics import stage
+from .quantize import dequantize, dot
+
+log = get_logger("retrieve")
+
+HEADER = struct.Struct("<IIQ")
+# Smaller shards cost more in per-task overhead than they save
+MIN_SHARD_ROWS = 2048
+# Rows scored between deadline checks (matches retrieve.DEADLINE_STRIDE)
+STRIDE = 256
+# Blocks one worker keeps attached; the least recently used one goes first
+MAX_ATTACHED = 64
+
+
+def _attach(name: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # Before 3.13, attaching registers the block with the resource tracker,
+    # which then unlinks it (or warns) when this worker exits. The parent owns it.
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *a, **kw: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class _Mapped:
+    """A shard attached in a worker: views into the block, nothing copied"""
+
+    def __init__(self, name: str):
+        self.shm = _attach(name)
+        buf = self.shm.buf
+        rows, self.dim, text_len = HEADER.unpack_from(buf, 0)
+        pos = HEADER.size
+        self.rowids = buf[pos:pos + 8 * rows].cast("q")
+        pos += 8 * rows
+        self.offsets = buf[pos:pos + 8 * (rows + 1)].cast("q")
+        pos += 8 * (rows + 1)
+        self.vectors = buf[pos:pos + 4 * rows * self.dim].cast("f")
+        pos += 4 * rows * self.dim
+        self.text = buf[pos:pos + text_len]
+        self._views = (self.rowids, self.offsets, self.vectors, self.text, buf)
+
+    def close(self):
+        # Views have to go before the mapping can be closed
+        for v in self._views:
+            v.release()
+        self.shm.close()
+
+
+# Worker-side: shard name -> attached block, most recently used last
+_mapped: "OrderedDict[str, _Mapped]" = OrderedDict()
+
+
+def _mapping(name: str, retired: Sequence[str]) -> _Mapped:
+    for gone in retired:
+        m = _mapped.pop(gone, None)
+        if m is not None:
+            m.close()
+    m = _mapped.get(name)
+    if m is None:
+        m = _mapped[name] = _Mapped(name)
+        while len(_mapped) > MAX_ATTACHED:
+            _mapped.popitem(last=False)[1].close()
+    else:
+        _mapped.move_to_end(name)
+    return m
+
+
+def _score_shard(name: str, swqs: List[List[str]], vqs: Optional[List[Sequence[float]]], k: int,
+                 stop_at: Optional[float], retired: Sequence[str] = ()) -> Tuple[List[List[Tuple[float, int]]], int, int]:
+    """
+    Worker: local top-k of one shard for each query, as (score, row) sorted by
+    score then row. Also returns rows scanned and rows in the shard. Blocks in
+    `retired` were unlinked by the parent and are detached first.
+    """
+    m = _mapping(name, retired)
+    rowids, offsets, dim, vectors, text = m.rowids, m.offsets, m.dim, m.vectors, m.text
+    qsets = [set(w) for w in swqs]
+    cands: List[List[Tuple[float, int]]] = [[] for _ in qsets]
+    n = len(rowids)
+    for i in range(n):
+        if stop_at is not None and i % STRIDE == 0 and i and time.monotonic() >= stop_at:
+            n = i
+            break
+        swt = set(str(text[offsets[i]:offsets[i + 1]], "utf-8", "ignore").split())
+        if vqs is None:
+            for swq, out in zip(qsets, cands):
+                out.append((len(swq & swt) / max(1, len(swq | swt)), -rowids[i]))
+        else:
+            vt = vectors[i * dim:(i + 1) * dim]
+            for swq, vq, out in zip(qsets, vqs, cands):
+                j = len(swq & swt) / max(1, len(swq | swt))
+                out.append((j * 0.4 + dot(vq, vt) * 0.6, -rowids[i]))
+    return [[(s, -r) for s, r in heapq.nlargest(k, out)] for out in cands], n, len(rowids)
+
+
+def _noop() -> bool:
+    return True
+
+
+# Names of recently unlinked blocks, passed to workers so they detach them too
+_retired: "deque[str]" = deque(maxlen=4 * MAX_ATTACHED)
+
+
+def _release(blocks: List[SharedMemory]):
+    for shm in blocks:
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        _retired.append(shm.name)
+
+
+class ShardSet:
+    """Shared-memory shards of one index version"""
+
+    def __init__(self, idx, blocks: List[SharedMemory], rows: int):
+        self.version = idx.version
+        # The version the rows are positions in (compaction keeps the number, not the positions)
+        self.index = idx
+        self.names = [b.name for b in blocks]
+        self.rows = rows
+        self.nbytes = sum(b.size for b in blocks)
+        # Unlinked once nothing (cache or in-flight search) refers to this set
+        self._finalizer = weakref.finalize(self, _release, blocks)
+
+    def close(self):
+        self._finalizer()
+
+
+def build_shards(idx, n_shards: int) -> Optional[ShardSet]:
+    """Copy an index version's live chunks into shared memory; None if embeddings are ragged"""
+    dead, embeddings = idx.tombstones, idx.embeddings
+    live = [(n, ch) for n, ch in enumerate(idx.chunks) if ch["id"] not in dead]
+    if not live:
+        return None
+    dim = len(dequantize(embeddings[live[0][1]["id"]]))
+    n_shards = max(1, min(n_shards, len(live) // MIN_SHARD_ROWS))
+    size = -(-len(live) // n_shards)
+    blocks: List[SharedMemory] = []
+    try:
+        for start in range(0, len(live), size):
+            part = live[start:start + size]
+            rowids, offsets, vectors = array("q"), array("q", [0]), array("f")
+            texts = []
+            used = 0
+            for n, ch in part:
+                vec = dequantize(embeddings[ch["id"]])
+                if len(vec) != dim:
+                    _release(blocks)
+                    return None
+                rowids.append(n)
+                vectors.extend(vec)
+                t = ch["text"].lower().encode("utf-8", errors="ignore")
+                texts.append(t)
+                used += len(t)
+                offsets.append(used)
+            text = b"".join(texts)
+            body = [rowids.tobytes(), offsets.tobytes(), vectors.tobytes(), text]
+            shm = SharedMemory(create=True, size=HEADER.size + sum(len(b) for b in body))
+            blocks.append(shm)
+            HEADER.pack_into(shm.buf, 0, len(part), dim, len(text))
+            pos = HEADER.size
+            for b in body:
+                shm.buf[pos:pos + len(b)] = b
+                pos += len(b)
+    except BaseException:
+        _release(blocks)
+        raise
+    return ShardSet(idx, blocks, len(live))
+
+
+def _extends(idx, old) -> bool:
+    """
+    Whether `idx` was published from `old` by uploads and deletes only, so every
+    chunk of `old` is at the same position. Compaction moves the last one.
+    """
+    n = len(old.chunks)
+    return (idx.version > old.version and n <= len(idx.chunks)
+            and (n == 0 or idx.chunks[n - 1]["id"] == old.chunks[n - 1]["id"]))
+
+
+def _score_tail(idx, start: int, swqs: List[List[str]], vqs: Optional[List[Sequence[float]]],
+                k: int) -> List[List[Tuple[float, int]]]:
+    """In process: local top-k of idx.chunks[start:], scored and ordered like _score_shard"""
+    dead, embeddings = idx.tombstones, idx.embeddings
+    qsets = [set(w) for w in swqs]
+    cands: List[List[Tuple[float, int]]] = [[] for _ in qsets]
+    for n in range(start, len(idx.chunks)):
+        ch = idx.chunks[n]
+        if ch["id"] in dead:
+            continue
+        swt = set(ch["text"].lower().split())
+        if vqs is None:
+            for swq, out in zip(qsets, cands):
+                out.append((len(swq & swt) / max(1, len(swq | swt)), -n))
+        else:
+            # Same float32 values the shards hold
+            vt = array("f", dequantize(embeddings[ch["id"]]))
+            for swq, vq, out in zip(qsets, vqs, cands):
+                j = len(swq & swt) / max(1, len(swq | swt))
+                out.append((j * 0.4 + dot(vq, vt) * 0.6, -n))
+    return [[(s, -r) for s, r in heapq.nlargest(k, out)] for out in cands]
+
+
+class ShardStore:
+    """Per-session shard sets plus the worker pool that scores them"""
+
+    def __init__(self, workers: int, shards: int, min_chunks: int):
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # One build at a time, so at most one version is being copied
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-build")
+        # session -> ShardSet of its latest sharded version; dropped with the session
+        self._sets: "weakref.WeakKeyDictionary[Any, ShardSet]" = weakref.WeakKeyDictionary()
+        # session -> index version queued or being built
+        self._building: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+        self._stats = {"builds": 0, "build_errors": 0, "searches": 0, "stale": 0, "partial": 0,
+                       "fallbacks": 0, "pool_errors": 0}
+        self.configure(workers, shards, min_chunks)
+
+    def configure(self, workers: int, shards: int, min_chunks: int):
+        """0 workers = one per core, 0 shards = two per worker, 0 min_chunks = off"""
+        self.shutdown()
+        self.workers = workers or os.cpu_count() or 1
+        self.shards = shards or 2 * self.workers
+        self.min_chunks = min_chunks
+        with self._lock:
+            self._sets.clear()
+
+    def wants(self, idx) -> bool:
+        return 0 < self.min_chunks <= idx.live_chunk_count() and self.workers > 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a threaded server process
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"))
+            return self._executor
+
+    def warm_up(self):
+        executor = self._get_executor()
+        for f in [executor.submit(_noop) for _ in range(self.workers)]:
+            f.result()
+
+    def build(self, session, idx) -> Optional[ShardSet]:
+        """Shard `idx` now (benchmarks, tests, the background builder); None if it cannot be"""
+        with self._lock:
+            current = self._sets.get(session)
+        if current is not None and current.index is idx:
+            return current
+        with stage("retrieve.shard_build"):
+            built = build_shards(idx, self.shards)
+        if built is None:
+            return None
+        with self._lock:
+            current = self._sets.get(session)
+            if current is None or current.version <= built.version:
+                self._sets[session] = built
+            self._stats["builds"] += 1
+        return built
+
+    def _build_later(self, ref, idx):
+        session = ref()
+        try:
+            # Skip versions that were replaced while queued; the next query asks for the new one
+            if session is not None and session.index is idx:
+                self.build(session, idx)
+        except Exception as e:
+            log.warning(f"shard build failed: {e}")
+            with self._lock:
+                self._stats["build_errors"] += 1
+        finally:
+            with self._lock:
+                if session is not None and self._building.get(session) is idx:
+                    del self._building[session]
+
+    def _shards_for(self, session, idx) -> Optional[ShardSet]:
+        """
+        The session's shards for `idx`, or for an older version `idx` extends.
+        Queues a build of `idx` if it has none; never builds in the caller.
+        """
+        with self._lock:
+            current = self._sets.get(session)
+            if current is not None and current.index is idx:
+                return current
+            if self._building.get(session) is not idx:
+                self._building[session] = idx
+                self._builder.submit(self._build_later, weakref.ref(session), idx)
+        if current is not None and _extends(idx, current.index):
+            return current
+        return None
+
+    def search(self, session, idx, swqs: List[List[str]], vqs: Optional[List[Sequence[float]]], k: int,
+               dl=None) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Top-k chunks of `idx` for each query (vqs None = lexical only), or None
+        if the caller should scan in process instead.
+        """
+        shards = self._shards_for(session, idx)
+        if shards is None:
+            with self._lock:
+                self._stats["fallbacks"] += 1
+            return None
+        base = shards.index
+        # Serving an older version: skip rows deleted since, score the appended ones here
+        dead = idx.tombstones - base.tombstones if base is not idx else frozenset()
+        want = k + len(dead)
+        stop_at = None
+        if dl is not None:
+            # Same cut-off as the in-process scan: stop once a quarter of the budget is left.
+            # perf_counter and monotonic share a clock on Linux; convert anyway.
+            stop_at = time.monotonic() + (dl.at - 0.25 * dl.budget - time.perf_counter())
+        try:
+            with stage("retrieve.score"):
+                executor = self._get_executor()
+                retired = tuple(_retired)
+                futures = [executor.submit(_score_shard, name, swqs, vqs, want, stop_at, retired)
+                           for name in shards.names]
+                tail = _score_tail(idx, len(base.chunks), swqs, vqs, k) if base is not idx else None
+                parts = [f.result() for f in futures]
+        except Exception as e:
+            # BrokenProcessPool and friends: drop the pool so the next search restarts it
+            log.warning(f"sharded search failed, scanning in process: {e}")
+            self.shutdown()
+            with self._lock:
+                self._stats["pool_errors"] += 1
+            return None
+        with stage("retrieve.rank"):
+            chunks = idx.chunks
+            out = []
+            for q in range(len(swqs)):
+                lists = [p[0][q] for p in parts] + ([tail[q]] if tail is not None else [])
+                merged = heapq.merge(*lists, key=lambda c: (-c[0], c[1]))
+                hits = (chunks[row] for _, row in merged)
+                if dead:
+                    hits = (ch for ch in hits if ch["id"] not in dead)
+                out.append(list(islice(hits, k)))
+        scanned = sum(p[1] for p in parts)
+        with self._lock:
+            self._stats["searches"] += 1
+            if base is not idx:
+                self._stats["stale"] += 1
+            if scanned < shards.rows:
+                self._stats["partial"] += 1
+        if dl is not None and scanned < shards.rows:
+            dl.note("retrieve", {"mode": "partial", "scanned": scanned, "of": shards.rows})
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sets = list(self._sets.values())
+            return {"enabled": self.min_chunks > 0 and self.workers > 1, "workers": self.workers,
+                    "shards": self.shards, "min_chunks": self.min_chunks, "sessions": len(sets),
+                    "blocks": sum(len(s.names) for s in sets), "rows": sum(s.rows for s in sets), "bytes": sum(s.nbytes for s in sets), **self._stats}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.shutdown()
+        with self._lock:
+            builder, self._builder = self._builder, ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-build")
+            sets = list(self._sets.values())
+            self._sets.clear()
+            self._building.clear()
+        builder.shutdown(wait=False, cancel_futures=True)
+        for s in sets:
+            s.close()
+
+
+SHARDS = ShardStore(settings.retrieve_workers, settings.retrieve_shards, settings.retrieve_shard_min_chunks)
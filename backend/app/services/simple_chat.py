@@ -3,8 +3,23 @@ Simple conversational chat service without LangChain dependency
 """
 import os
 import time
-from typing import Generator
+from typing import Generator, Optional
 from ..services.llm import answer_stream
+from ..services.model_router import Route
+from ..services.context_cache import CachedPrefix, system_text, turn_text
+
+def turn_prompt(question: str, context: str, conversation_history: str = "") -> str:
+    """The part of a conversational prompt that changes every turn (follows the stable prefix)"""
+    if conversation_history:
+        return turn_text(context) + f"""CONVERSATION HISTORY:
+{conversation_history}
+
+Current Question: {question}
+
+Please provide a helpful, well-structured response based on the documents and conversation context. Be conversational and reference previous parts of our conversation when relevant. Do not include citations or source references in your response."""
+    return turn_text(context) + f"""Current Question: {question}
+
+Please provide a helpful, well-structured response based on the documents. Do not include citations or source references in your response."""
 
 class SimpleConversationalChat:
     """Simple conversational chat with basic memory"""
@@ -15,32 +30,20 @@ class SimpleConversationalChat:
             print("⚠ Warning: GEMINI_API_KEY not found in environment - chat will use fallback")
             # Don't raise error, let it fail gracefully in the chat method
     
-    def chat_with_documents(self, question: str, context: str, conversation_history: str = "") -> Generator[str, None, None]:
-        """Simple chat with document context and conversation history"""
+    def chat_with_documents(self, question: str, context: str, conversation_history: str = "",
+                            route: Optional[Route] = None,
+                            cached: Optional[CachedPrefix] = None, pace: bool = True) -> Generator[str, None, None]:
+        """Simple chat with document context and conversation history (pace: see llm.answer_stream)"""
         
-        # Create a conversational prompt
-        if conversation_history:
-            prompt = f"""You are a helpful AI assistant. Use ONLY the provided document context to answer questions.
-
-DOCUMENT CONTEXT:
-{context}
-
-CONVERSATION HISTORY:
-{conversation_history}
-
-Current Question: {question}
-
-Please provide a helpful, well-structured response based on the documents and conversation context. Be conversational and reference previous parts of our conversation when relevant. Do not include citations or source references in your response."""
+        # Prompt layout: stable prefix (rules, plus the session's core documents when
+        # cached), then the parts that change every turn: retrieved context, history, question
+        suffix = turn_prompt(question, context, conversation_history)
+
+        # Stream response using the existing LLM service; with a cached prefix only
+        # the suffix is sent along with the cache handle
+        if cached is not None:
+            tokens = answer_stream(suffix, pace=pace, route=route, cached=cached)
         else:
-            prompt = f"""You are a helpful AI assistant. Use ONLY the provided document context to answer questions.
-
-DOCUMENT CONTEXT:
-{context}
-
-Current Question: {question}
-
-Please provide a helpful, well-structured response based on the documents. Do not include citations or source references in your response."""
-        
-        # Stream response using the existing LLM service
-        for token in answer_stream(prompt):
-            yield token
\ No newline at end of file
+            tokens = answer_stream(system_text() + suffix, pace=pace, route=route)
+        for token in tokens:
+            yield token
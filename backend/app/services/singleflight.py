@@ -0,0 +1,158 @@
+"""
+Single-flight coalescing of identical in-flight generations
+
+The first request for a key (the leader) takes an LLM admission slot and starts
+one upstream generation on a background thread; concurrent requests for the
+same key join it instead of starting their own. Tokens are kept in the flight,
+so every subscriber replays the stream from the first token and then follows
+it live. The flight leaves the registry as soon as it finishes, so only
+requests that overlap in time are coalesced. If every subscriber goes away the
+generation is stopped early.
+"""
+import contextvars
+import hashlib
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+from .admission import admit
+from ..profiling import attach
+
+
+def prompt_key(*parts: Any) -> str:
+    """Stable short key for a prompt and whatever else identifies a generation"""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8", errors="ignore"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class Flight:
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        # Joined subscribers that have not finished reading yet
+        self.interest = 0
+        self._cond = threading.Condition()
+
+    def _push(self, token: str):
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def _finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def subscribe(self, group: "SingleFlight") -> Iterator[str]:
+        """All tokens from the start, then live ones until the generation ends"""
+        left = []
+
+        def leave():
+            if not left:
+                left.append(True)
+                group._leave(self)
+
+        tokens = self._replay(leave)
+        # A generator that is never started (client gone before the first frame)
+        # never runs its finally; drop its interest when it is collected instead
+        weakref.finalize(tokens, leave)
+        return tokens
+
+    def _replay(self, leave: Callable[[], None]) -> Iterator[str]:
+        i = 0
+        try:
+            while True:
+                with self._cond:
+                    while i >= len(self.tokens) and not self.done:
+                        self._cond.wait()
+                    batch = self.tokens[i:]
+                    done, error = self.done, self.error
+                i += len(batch)
+                yield from batch
+                if done and i >= len(self.tokens):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            leave()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "joined": 0, "cancelled": 0}
+
+    def stream(self, key: Hashable, produce: Callable[[], Iterable[str]], priority: int) -> Iterator[str]:
+        """
+        Join the flight for key, starting it if there is none. Only the leader
+        goes through admission control, so a full queue raises (429/503) here
+        for the leader; joiners of a flight that could not start get the same
+        error from the returned iterator.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self._stats["started"] += 1
+            else:
+                self._stats["joined"] += 1
+            flight.interest += 1
+
+        if leader:
+            try:
+                ticket = admit(priority)
+            except Exception as e:
+                with self._lock:
+                    self._flights.pop(key, None)
+                flight._finish(e)
+                raise
+            # The leader's request context (stage timings) follows the generation
+            ctx = contextvars.copy_context()
+            threading.Thread(target=ctx.run, args=(self._run, key, flight, produce, ticket),
+                             name=f"{self.name}-flight", daemon=True).start()
+        return flight.subscribe(self)
+
+    def _run(self, key: Hashable, flight: Flight, produce: Callable[[], Iterable[str]], ticket):
+        error = None
+        tokens = produce()
+        try:
+            with attach():
+                for token in tokens:
+                    with self._lock:
+                        if flight.interest <= 0:
+                            # Nobody is listening any more; new requests start a fresh flight
+                            self._flights.pop(key, None)
+                            self._stats["cancelled"] += 1
+                            break
+                    flight._push(token)
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(tokens, "close", None)
+            if close:
+                close()
+            ticket.release()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight._finish(error)
+
+    def _leave(self, flight: Flight):
+        with self._lock:
+            flight.interest -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
+
+
+CHAT_FLIGHTS = SingleFlight("chat")
+SUMMARY_FLIGHTS = SingleFlight("summarize")
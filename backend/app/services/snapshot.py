@@ -0,0 +1,218 @@
+"""
+Binary session snapshots
+
+Layout (little-endian):
+
+    magic      8 bytes   b"DCSNAP1\\0"
+    hdr_len    uint64
+    header     JSON      dim, counts, section offsets, docs/chunks metadata
+    pad        to 64-byte boundary
+    text       UTF-8     all document and chunk texts back to back (offsets in header)
+    pad        to 64-byte boundary
+    embeddings float32   n_chunks x dim, row i belongs to header.chunks[i]
+
+Loading memory-maps the file: the embedding block is never parsed, each chunk's
+vector is a zero-copy memoryview row into the mapping. Quantized sessions are
+exported as float32 and restored as float32 rows (the mapping is file-backed,
+so it does not count against the process heap the way quantization targets).
+"""
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from typing import Iterator, BinaryIO
+
+from ..memory import Session, SessionIndex
+from .quantize import dequantize
+
+MAGIC = b"DCSNAP1\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+
+def _pad(n: int) -> int:
+    return (-n) % ALIGN
+
+
+def _le_bytes(vec) -> bytes:
+    a = array("f", vec)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a.tobytes()
+
+
+def export_session(s: Session) -> Iterator[bytes]:
+    """Serialize the live content of a session as a stream of byte blocks"""
+    idx = s.index
+    docs = idx.docs
+    chunks = [ch for ch in idx.chunks if ch["id"] not in idx.tombstones]
+    vectors = [idx.embeddings[ch["id"]] for ch in chunks]
+    dim = len(dequantize(vectors[0])) if vectors else 0
+
+    text = io.BytesIO()
+
+    def put(t: str):
+        b = t.encode("utf-8")
+        off = text.tell()
+        text.write(b)
+        return [off, len(b)]
+
+    header = {
+        "format": FORMAT_VERSION,
+        "created": s.created,
+        "exported": time.time(),
+        "version": idx.version,
+        "dim": dim,
+        "docs": {sid: {"meta": d["meta"], "text": put(d["text"])} for sid, d in docs.items()},
+        "chunks": [{"id": ch["id"], "source_id": ch["source_id"], "span": ch["span"], "text": put(ch["text"]),
+                    **({"sources": ch["sources"]} if "sources" in ch else {})}
+                   for ch in chunks],
+    }
+    text_bytes = text.getvalue()
+
+    # Section offsets depend on the header length, which depends on the offsets: fix
+    # the header size by reserving room for the two offset numbers first
+    header["text_offset"] = header["emb_offset"] = 0
+    hdr = json.dumps(header, separators=(",", ":")).encode()
+    base = len(MAGIC) + 8 + len(hdr) + 40
+    header["text_offset"] = base + _pad(base)
+    emb_start = header["text_offset"] + len(text_bytes)
+    header["emb_offset"] = emb_start + _pad(emb_start)
+    hdr = json.dumps(header, separators=(",", ":")).encode()
+    hdr += b" " * (header["text_offset"] - len(MAGIC) - 8 - len(hdr))
+
+    yield MAGIC + struct.pack("<Q", len(hdr)) + hdr
+    yield text_bytes
+    yield b"\0" * (header["emb_offset"] - emb_start)
+    for i in range(0, len(vectors), 4096):
+        yield b"".join(_le_bytes(dequantize(v)) for v in vectors[i:i + 4096])
+
+
+def _copy_to_temp(src: BinaryIO, directory: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".snap")
+    with os.fdopen(fd, "wb") as f:
+        while True:
+            block = src.read(1 << 20)
+            if not block:
+                break
+            f.write(block)
+    return path
+
+
+def load_session(src: BinaryIO, directory: str) -> Session:
+    """Build a Session from a snapshot stream; embeddings stay memory-mapped"""
+    return map_session(_copy_to_temp(src, directory))
+
+
+def write_session(s: Session, path: str) -> int:
+    """Snapshot a session to `path` (atomically); returns the size in bytes"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    size = 0
+    with open(tmp, "wb") as f:
+        for block in export_session(s):
+            f.write(block)
+            size += len(block)
+    os.replace(tmp, path)
+    return size
+
+
+def map_session(path: str) -> Session:
+    """Memory-map a snapshot file into a Session and unlink the file"""
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        try:
+            # The mapping stays valid after unlink on POSIX; elsewhere the temp dir is cleaned up later
+            os.unlink(path)
+        except OSError:
+            pass
+    return session_from_buffer(mm)
+
+
+def _check_ref(ref, size: int, what: str):
+    """A [offset, length] pair that lies inside a section of `size` bytes"""
+    if (not isinstance(ref, list) or len(ref) != 2 or not all(type(x) is int for x in ref)
+            or ref[0] < 0 or ref[1] < 0 or ref[0] + ref[1] > size):
+        raise ValueError(f"{what} is out of bounds")
+
+
+def session_from_buffer(buf) -> Session:
+    """
+    Session from a snapshot in memory. Every offset and size is checked against
+    the buffer first; a truncated or corrupt snapshot raises ValueError.
+    """
+    try:
+        return _session_from_buffer(buf)
+    except (KeyError, TypeError, IndexError, AttributeError, struct.error) as e:
+        raise ValueError(f"corrupt snapshot ({type(e).__name__}: {e})") from None
+
+
+def _session_from_buffer(buf) -> Session:
+    total = len(buf)
+    if total < len(MAGIC) + 8 or bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError("not a session snapshot")
+    (hdr_len,) = struct.unpack_from("<Q", buf, len(MAGIC))
+    start = len(MAGIC) + 8
+    if start + hdr_len > total:
+        raise ValueError("snapshot header is truncated")
+    header = json.loads(bytes(buf[start:start + hdr_len]))
+    if not isinstance(header, dict):
+        raise ValueError("snapshot header is not an object")
+    if header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"unsupported snapshot format {header.get('format')}")
+
+    text_off, emb_off = header["text_offset"], header["emb_offset"]
+    dim, metas = header["dim"], header["chunks"]
+    if not all(type(x) is int and x >= 0 for x in (text_off, emb_off, dim)) or not isinstance(metas, list):
+        raise ValueError("snapshot header has invalid offsets")
+    if not start + hdr_len <= text_off <= emb_off <= total:
+        raise ValueError("snapshot sections are out of bounds")
+    text_size = emb_off - text_off
+
+    view = memoryview(buf)
+
+    def text(ref, what: str) -> str:
+        _check_ref(ref, text_size, what)
+        off, n = ref
+        return str(view[text_off + off:text_off + off + n], "utf-8")
+
+    n = len(metas)
+    if dim and n:
+        if emb_off + n * dim * 4 != total:
+            raise ValueError(f"embedding block is {total - emb_off} bytes, expected {n} x {dim} float32")
+        block = view[emb_off:emb_off + n * dim * 4]
+        if sys.byteorder == "little":
+            rows = block.cast("f")
+        else:
+            rows = array("f", block)
+            rows.byteswap()
+    elif n:
+        raise ValueError("snapshot has chunks but no embedding dimension")
+    else:
+        rows = []
+
+    docs = {sid: {"text": text(d["text"], f"document {sid}"), "meta": d["meta"]} for sid, d in header["docs"].items()}
+    chunks, embeddings, source_chunks = [], {}, {}
+    for i, c in enumerate(metas):
+        ch = {"id": c["id"], "text": text(c["text"], f"chunk {i}"), "source_id": c["source_id"], "span": c["span"]}
+        if "sources" in c:
+            # Folded near-duplicate: one chunk, several documents
+            ch["sources"] = c["sources"]
+        chunks.append(ch)
+        embeddings[ch["id"]] = rows[i * dim:(i + 1) * dim]
+        for sid in dict.fromkeys(r["source_id"] for r in c.get("sources", [c])):
+            source_chunks.setdefault(sid, []).append(ch["id"])
+
+    s = Session()
+    s.publish(SessionIndex(version=header.get("version", 1), docs=docs, chunks=tuple(chunks), embeddings=embeddings, source_chunks=source_chunks))
+    # Keep the mapping alive as long as the session references rows in it
+    s.backing = buf
+    return s
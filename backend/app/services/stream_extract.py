@@ -0,0 +1,384 @@
+"""
+Streaming, format-aware extractors for text uploads
+
+The upload is read in blocks and chunks are produced as the reader goes, so
+working memory stays at about one block plus one chunk whatever the file size:
+
+  csv   rows packed into chunks, each starting with the header row
+  json  top-level array elements / concatenated or line-delimited values, packed by record
+  log   line windows
+  html  tags, scripts and styles stripped; chunks tagged with the enclosing heading
+  text  everything else textual (txt, md, source files, xml), word-packed like chunk_text
+
+Each chunk comes with a span dict (rows / records / lines / section) that is
+stored on the chunk next to its index. Document-level facts (format, CSV
+columns, HTML title, counts) are written into the `meta` dict passed in. The
+decoded text can also be collected as it is read (`sink`), for callers that
+keep the document text.
+"""
+import csv
+import io
+import json
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .chunk import chunk_text
+
+BLOCK = 64 * 1024
+CHUNK_CHARS = 800
+# Largest single JSON value buffered while looking for its end; beyond this the
+# rest of the file is treated as plain text
+MAX_JSON_VALUE = 16 * 1024 * 1024
+
+Piece = Tuple[str, Dict[str, Any]]
+
+TEXT_EXTENSIONS = (".txt", ".md", ".markdown", ".xml", ".py", ".js", ".css", ".sql")
+
+
+def detect_format(name: str, mime: str) -> Optional[str]:
+    """Streaming format for an upload, or None if it needs the whole-file path"""
+    name = name.lower()
+    if name.endswith(".csv") or mime == "text/csv":
+        return "csv"
+    if name.endswith((".json", ".jsonl", ".ndjson")) or mime == "application/json":
+        return "json"
+    if name.endswith(".log"):
+        return "log"
+    if name.endswith((".html", ".htm")) or mime == "text/html":
+        return "html"
+    if name.endswith(TEXT_EXTENSIONS) or mime.startswith("text/"):
+        return "text"
+    return None
+
+
+def _blocks(stream) -> Iterator[str]:
+    while True:
+        block = stream.read(BLOCK)
+        if not block:
+            return
+        yield block
+
+
+def _pack(units: Iterable[Tuple[str, int]], size: int, sep: str = "\n",
+          head: str = "") -> Iterator[Tuple[str, int, int]]:
+    """
+    Pack numbered text units into chunks of about `size` chars; yields
+    (text, first unit no, last unit no). A unit longer than a chunk is split
+    on its own, with `head` (e.g. a CSV header) repeated in front of each chunk.
+    """
+    buf: List[str] = []
+    used, first, last = len(head), 0, 0
+    prefix = head + sep if head else ""
+    for text, n in units:
+        if len(text) + len(prefix) > size:
+            if buf:
+                yield prefix + sep.join(buf), first, last
+                buf, used = [], len(head)
+            for part in chunk_text(text, size=max(1, size - len(prefix))):
+                yield prefix + part, n, n
+            continue
+        if buf and used + len(sep) + len(text) > size:
+            yield prefix + sep.join(buf), first, last
+            buf, used = [], len(head)
+        if not buf:
+            first = n
+        buf.append(text)
+        used += len(sep) + len(text)
+        last = n
+    if buf:
+        yield prefix + sep.join(buf), first, last
+
+
+def _csv_pieces(stream, meta: Dict[str, Any], size: int) -> Iterator[Piece]:
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        return
+    meta["columns"] = header
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="")
+
+    def line(row) -> str:
+        out.seek(0)
+        out.truncate()
+        writer.writerow(row)
+        return out.getvalue()
+
+    rows = 0
+
+    def numbered():
+        nonlocal rows
+        for rows, row in enumerate(reader, start=1):
+            if row:
+                yield line(row), rows
+
+    for text, a, b in _pack(numbered(), size, head=line(header)):
+        yield text, {"rows": [a, b]}
+    meta["rows"] = rows
+
+
+class _NotJSON(ValueError):
+    """Input stopped being valid JSON; carries the unparsed remainder"""
+
+    def __init__(self, rest: str, blocks: Iterator[str]):
+        super().__init__("invalid JSON")
+        self.rest = rest
+        self.blocks = blocks
+
+
+def _json_values(stream) -> Iterator[Any]:
+    """
+    Top-level array elements, or a sequence of whitespace-separated values
+    (covers JSON Lines and a single document). Raises _NotJSON when the input
+    stops being valid JSON.
+    """
+    decoder = json.JSONDecoder()
+    blocks = _blocks(stream)
+    buf, eof = "", False
+
+    def fill() -> bool:
+        nonlocal buf, eof
+        block = next(blocks, None)
+        if block is None:
+            eof = True
+            return False
+        buf += block
+        return True
+
+    def skip(chars: str):
+        nonlocal buf
+        while True:
+            buf = buf.lstrip(chars)
+            if buf or not fill():
+                return
+
+    skip(" \t\r\n")
+    in_array = buf.startswith("[")
+    if in_array:
+        buf = buf[1:]
+    while True:
+        skip(" \t\r\n," if in_array else " \t\r\n")
+        if not buf or (in_array and buf.startswith("]")):
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if len(buf) <= MAX_JSON_VALUE and fill():
+                    continue
+                raise _NotJSON(buf, blocks)
+            # A number at the very end of the buffer may continue in the next block
+            if end == len(buf) and not eof and isinstance(value, (int, float)) and fill():
+                continue
+            break
+        buf = buf[end:]
+        yield value
+
+
+def _json_pieces(stream, meta: Dict[str, Any], size: int) -> Iterator[Piece]:
+    records = 0
+    bad: Optional[_NotJSON] = None
+
+    def numbered():
+        nonlocal records, bad
+        try:
+            for records, value in enumerate(_json_values(stream), start=1):
+                yield json.dumps(value, ensure_ascii=False, separators=(",", ":")), records
+        except _NotJSON as e:
+            bad = e
+
+    for text, a, b in _pack(numbered(), size):
+        yield text, {"records": [a, b]}
+    meta["records"] = records
+    if bad is not None:
+        # Not (or no longer) valid JSON: index the rest as plain text
+        meta["json_error_after_record"] = records
+        for text, span in _text_pieces(_chain(bad.rest, bad.blocks), size):
+            yield text, {**span, "after_record": records}
+
+
+def _chain(first: str, blocks: Iterator[str]) -> Iterator[str]:
+    yield first
+    yield from blocks
+
+
+def _log_pieces(stream, meta: Dict[str, Any], size: int) -> Iterator[Piece]:
+    lines = 0
+
+    def numbered():
+        nonlocal lines
+        for lines, line in enumerate(stream, start=1):
+            line = line.rstrip("\r\n")
+            if line.strip():
+                yield line, lines
+
+    for text, a, b in _pack(numbered(), size):
+        yield text, {"lines": [a, b]}
+    meta["lines"] = lines
+
+
+class _HTMLText(HTMLParser):
+    """Collects visible text as paragraphs, remembering the latest heading"""
+
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    BLOCK_TAGS = {"p", "div", "li", "ul", "ol", "br", "tr", "table", "section", "article", "header",
+                  "footer", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "dt", "dd"}
+    HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.current: List[str] = []
+        self.in_heading = False
+        self.in_title = False
+        self.title = ""
+        self.section = ""
+        # (paragraph text, heading it belongs to), drained by the caller after each feed
+        self.ready: List[Tuple[str, str]] = []
+
+    def _flush(self):
+        text = " ".join(" ".join(self.current).split())
+        self.current = []
+        if not text:
+            return
+        if self.in_heading:
+            self.section = text
+        self.ready.append((text, self.section))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip_depth += 1
+        elif tag == "title":
+            self.in_title = True
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            self.in_heading = tag in self.HEADINGS
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "title":
+            self.in_title = False
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            self.in_heading = False
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.in_title:
+            self.title += data
+            return
+        self.current.append(data)
+
+
+def _html_pieces(stream, meta: Dict[str, Any], size: int) -> Iterator[Piece]:
+    parser = _HTMLText()
+
+    def paragraphs():
+        n = 0
+        for block in _blocks(stream):
+            parser.feed(block)
+            for item in parser.ready:
+                n += 1
+                yield item, n
+            parser.ready.clear()
+        parser.close()
+        parser._flush()
+        for item in parser.ready:
+            n += 1
+            yield item, n
+
+    # Remember the heading of each paragraph so a chunk can report where it starts
+    sections: Dict[int, str] = {}
+
+    def texts():
+        for (text, section), n in paragraphs():
+            sections[n] = section
+            yield text, n
+
+    for text, a, b in _pack(texts(), size):
+        span = {"paragraphs": [a, b]}
+        if sections.get(a):
+            span["section"] = sections[a]
+        yield text, span
+        for n in [n for n in sections if n <= b]:
+            del sections[n]
+    if parser.title.strip():
+        meta["title"] = " ".join(parser.title.split())
+
+
+def _text_pieces(blocks: Iterable[str], size: int) -> Iterator[Piece]:
+    """Word packing with the same boundaries as chunk_text, without holding the whole text"""
+    buf: List[str] = []
+    used = -1
+    tail = ""
+    for block in blocks:
+        data = tail + block
+        # Keep a trailing partial word for the next block
+        cut = len(data)
+        while cut > 0 and not data[cut - 1].isspace():
+            cut -= 1
+        tail = data[cut:]
+        for w in data[:cut].split():
+            buf.append(w)
+            used += len(w) + 1
+            if used > size:
+                yield " ".join(buf), {}
+                buf, used = [], -1
+    for w in tail.split():
+        buf.append(w)
+        used += len(w) + 1
+        if used > size:
+            yield " ".join(buf), {}
+            buf, used = [], -1
+    if buf:
+        yield " ".join(buf), {}
+
+
+class _Recorder:
+    """Text stream that appends everything read through it to `sink`"""
+
+    def __init__(self, stream, sink: List[str]):
+        self.stream = stream
+        self.sink = sink
+
+    def read(self, n: int = -1) -> str:
+        data = self.stream.read(n)
+        self.sink.append(data)
+        return data
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.stream.readline()
+        if not line:
+            raise StopIteration
+        self.sink.append(line)
+        return line
+
+
+def iter_pieces(fileobj, fmt: str, meta: Dict[str, Any], size: int = CHUNK_CHARS,
+                sink: Optional[List[str]] = None) -> Iterator[Piece]:
+    """
+    Decode a binary file object incrementally and yield (chunk text, span)
+    pairs; the decoded text is appended to `sink` if one is given
+    """
+    meta["format"] = fmt
+    raw = io.TextIOWrapper(fileobj, encoding="utf-8", errors="ignore", newline="" if fmt == "csv" else None)
+    stream = raw if sink is None else _Recorder(raw, sink)
+    try:
+        if fmt == "csv":
+            yield from _csv_pieces(stream, meta, size)
+        elif fmt == "json":
+            yield from _json_pieces(stream, meta, size)
+        elif fmt == "log":
+            yield from _log_pieces(stream, meta, size)
+        elif fmt == "html":
+            yield from _html_pieces(stream, meta, size)
+        else:
+            yield from _text_pieces(_blocks(stream), size)
+    finally:
+        # Leave the caller's file object open
+        raw.detach()
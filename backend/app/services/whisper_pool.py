@@ -0,0 +1,159 @@
+"""
+Process-wide Whisper model pool for the ASR fallback
+
+Models are loaded once inside a dedicated worker process and reused for every
+job. Audio bytes are piped through ffmpeg straight into the model as a PCM
+array, so no temp files are written on the normal path.
+"""
+import os
+import subprocess
+import tempfile
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional
+
+from ..config import settings
+
+SAMPLE_RATE = 16000
+
+# Worker-process state: model size -> loaded whisper model
+_MODELS: Dict[str, Any] = {}
+
+
+def _load_model(size: str):
+    model = _MODELS.get(size)
+    if model is None:
+        import whisper
+        model = whisper.load_model(size)
+        _MODELS[size] = model
+    return model
+
+
+def _init_worker(size: str, warm: bool):
+    if warm:
+        try:
+            _load_model(size)
+        except Exception:
+            # Errors resurface on the first real job with a proper result dict
+            pass
+
+
+def _decode_pcm(file_bytes: bytes, suffix: str, seekable: bool):
+    """Decode any container to 16 kHz mono float32 via ffmpeg pipes."""
+    import numpy as np
+
+    out_args = ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+    if not seekable:
+        proc = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", *out_args],
+            input=file_bytes, capture_output=True, timeout=settings.whisper_ffmpeg_timeout,
+        )
+    else:
+        # Some containers (e.g. mp4 with a trailing moov atom) need a seekable input
+        with tempfile.NamedTemporaryFile(suffix=suffix) as temp_file:
+            temp_file.write(file_bytes)
+            temp_file.flush()
+            proc = subprocess.run(
+                ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", temp_file.name, *out_args],
+                capture_output=True, timeout=settings.whisper_ffmpeg_timeout,
+            )
+    if proc.returncode != 0 or not proc.stdout:
+        raise RuntimeError(f"ffmpeg decode failed: {proc.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def _run_job(file_bytes: bytes, suffix: str, size: str, seekable: bool) -> Dict[str, Any]:
+    try:
+        model = _load_model(size)
+    except ImportError:
+        return {"error": "whisper_not_installed"}
+    try:
+        audio = _decode_pcm(file_bytes, suffix, seekable)
+        result = model.transcribe(audio)
+        return {
+            "text": result.get("text", ""),
+            "segments": result.get("segments", []),
+            "language": result.get("language", "auto"),
+        }
+    except FileNotFoundError:
+        return {"error": "ffmpeg_not_available"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _noop() -> bool:
+    return True
+
+
+class WhisperPool:
+    """Lazily started process pool with a bounded number of queued jobs"""
+
+    def __init__(self, model_size: str, workers: int, queue_size: int):
+        self.model_size = model_size
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self, warm: bool = False) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a threaded server process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_size, warm),
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Start the workers and load the model before the first upload"""
+        executor = self._get_executor(warm=True)
+        for _ in range(self.workers):
+            executor.submit(_noop)
+
+    def transcribe(self, file_bytes: bytes, filename: str, seekable: bool = False,
+                   model_size: Optional[str] = None) -> Dict[str, Any]:
+        if not self._slots.acquire(timeout=settings.whisper_queue_wait):
+            return {"error": "whisper_queue_full"}
+        suffix = f".{filename.split('.')[-1]}" if "." in filename else ""
+        try:
+            future = self._get_executor().submit(
+                _run_job, file_bytes, suffix, model_size or self.model_size, seekable
+            )
+        except Exception as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self.shutdown()
+            return {"error": str(e)}
+        # The slot is held until the job is really over, also after we stop waiting for it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=settings.whisper_timeout)
+        except FutureTimeout:
+            # Still queued: drop it; already running: it keeps its slot until it finishes
+            future.cancel()
+            return {"error": "whisper_timeout"}
+        except BrokenProcessPool as e:
+            # A worker died: drop the pool so the next job restarts it
+            self.shutdown()
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+WHISPER_POOL = WhisperPool(
+    settings.whisper_model,
+    settings.whisper_workers,
+    settings.whisper_queue_size,
+)
@@ -0,0 +1,80 @@
+"""
+Server-sent events encoding for the chat streams
+
+Tokens are coalesced into frames: a frame is written once `flush_ms` has passed
+since the previous one or `flush_bytes` of text are buffered (the first token
+always goes out right away so time to first byte does not change). Text with
+newlines is split over several `data:` lines as the SSE spec requires, named
+events (meta, answer, timing, done) carry JSON, and the whole stream is
+optionally gzip-compressed with a sync flush after every frame.
+"""
+import json
+import time
+import zlib
+from typing import Any, Iterable, Iterator, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .config import settings
+from .profiling import follow
+
+
+def event(data: str, name: Optional[str] = None) -> str:
+    head = f"event:{name}\n" if name else ""
+    return head + "".join(f"data:{line}\n" for line in data.split("\n")) + "\n"
+
+
+def json_event(name: str, obj: Any) -> str:
+    return event(json.dumps(obj, separators=(",", ":")), name)
+
+
+def done_event() -> str:
+    return json_event("done", {"ok": True})
+
+
+def coalesce(tokens: Iterable[str], flush_ms: Optional[float] = None, flush_bytes: Optional[int] = None) -> Iterator[str]:
+    """Join consecutive tokens into chunks by time and size window"""
+    window = (settings.sse_flush_ms if flush_ms is None else flush_ms) / 1000
+    limit = settings.sse_flush_bytes if flush_bytes is None else flush_bytes
+    buf, size = [], 0
+    last = None
+    for tok in tokens:
+        buf.append(tok)
+        size += len(tok)
+        now = time.perf_counter()
+        if last is None or now - last >= window or size >= limit:
+            yield "".join(buf)
+            buf, size, last = [], 0, now
+    if buf:
+        yield "".join(buf)
+
+
+def text_events(tokens: Iterable[str]) -> Iterator[str]:
+    """Coalesced token stream as unnamed data frames"""
+    for chunk in coalesce(tokens):
+        yield event(chunk)
+
+
+def _gzip(frames: Iterable[str]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for frame in frames:
+            if frame:
+                # Sync flush so the client can decode every frame as it arrives
+                yield z.compress(frame.encode()) + z.flush(zlib.Z_SYNC_FLUSH)
+        yield z.flush()
+    finally:
+        close = getattr(frames, "close", None)
+        if close:
+            close()
+
+
+def response(frames: Iterable[str], request: Optional[Request] = None) -> StreamingResponse:
+    frames = follow(frames)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if settings.sse_compress and request is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(_gzip(frames), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(frames, media_type="text/event-stream", headers=headers)
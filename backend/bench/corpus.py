@@ -0,0 +1,81 @@
+"""
+Deterministic synthetic corpus for benchmarks
+
+Text is drawn from a fixed Zipf-like vocabulary with a seeded RNG, so every run
+(and every machine) benchmarks exactly the same documents and queries.
+"""
+import random
+import string
+import uuid
+from typing import Dict, List, Tuple
+
+from app.memory import Session, SessionIndex
+from app.services.embed import embed_text
+
+DEFAULT_SEED = 1234
+
+
+def _vocabulary(rng: random.Random, size: int = 5000) -> List[str]:
+    words = set()
+    while len(words) < size:
+        n = rng.randint(2, 10)
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(n)))
+    return sorted(words)
+
+
+class Corpus:
+    def __init__(self, seed: int = DEFAULT_SEED):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.vocab = _vocabulary(self.rng)
+        # Zipf-ish weights: a few very common words, a long tail of rare ones
+        self.weights = [1.0 / (i + 1) for i in range(len(self.vocab))]
+
+    def words(self, n: int) -> List[str]:
+        return self.rng.choices(self.vocab, weights=self.weights, k=n)
+
+    def document(self, n_chars: int) -> str:
+        # Average word plus space is ~6 chars for this vocabulary
+        out, used = [], 0
+        while used < n_chars:
+            batch = self.words(1024)
+            out.extend(batch)
+            used += sum(len(w) + 1 for w in batch)
+        return " ".join(out)[:n_chars]
+
+    def chunk_texts(self, n: int, words_per_chunk: int = 130) -> List[str]:
+        return [" ".join(self.words(words_per_chunk)) for _ in range(n)]
+
+    def queries(self, n: int, words: int = 8) -> List[str]:
+        return [" ".join(self.words(words)) for _ in range(n)]
+
+    def chunks(self, n: int, sources: int = 10) -> List[Dict]:
+        source_ids = [str(uuid.UUID(int=self.rng.getrandbits(128))) for _ in range(sources)]
+        out = []
+        for i, text in enumerate(self.chunk_texts(n)):
+            cid = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            out.append({"id": cid, "text": text, "source_id": source_ids[i % sources], "span": {"chunk": i // sources}})
+        return out
+
+    def session(self, n_chunks: int) -> Session:
+        """A ready memory.Session holding n_chunks indexed chunks"""
+        chunks = self.chunks(n_chunks)
+        docs, source_chunks = {}, {}
+        for ch in chunks:
+            docs.setdefault(ch["source_id"], {"text": "", "meta": {"type": "doc"}})
+            source_chunks.setdefault(ch["source_id"], []).append(ch["id"])
+        s = Session()
+        s.publish(SessionIndex(
+            version=1,
+            docs=docs,
+            chunks=tuple(chunks),
+            embeddings={ch["id"]: embed_text(ch["text"]) for ch in chunks},
+            source_chunks=source_chunks,
+        ))
+        return s
+
+
+def text_pairs(corpus: Corpus, n: int) -> List[Tuple[str, str]]:
+    qs = corpus.queries(n)
+    ts = corpus.chunk_texts(n)
+    return list(zip(qs, ts))
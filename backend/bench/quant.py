@@ -0,0 +1,130 @@
+"""
+Embedding storage benchmark: memory per vector and recall@k per storage mode
+
+Builds seeded random unit vectors of --dim dimensions (default EMBED_DIM),
+stores them as Python float lists (the old layout) and in every EMBED_STORAGE
+mode, and reports traced memory, scan time per query (also relative to float32) and
+recall@k of the top-k by quantized dot product against exact full-precision
+search.
+
+Usage (from backend/):
+    python -m bench.quant                        # 5000 vectors x EMBED_DIM
+    python -m bench.quant --n 20000 --dim 1024 --k 10 --out quant.json
+"""
+import argparse
+import gc
+import heapq
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from .corpus import DEFAULT_SEED
+
+from app.config import settings
+from app.services.quantize import HALF_VIEW, MODES, quantize, dot
+
+
+def unit_vectors(rng: random.Random, n: int, dim: int) -> List[List[float]]:
+    out = []
+    for _ in range(n):
+        v = [rng.gauss(0, 1) for _ in range(dim)]
+        norm = math.sqrt(sum(x * x for x in v)) or 1.0
+        out.append([x / norm for x in v])
+    return out
+
+
+def queries_near(rng: random.Random, base: List[List[float]], n: int, noise: float) -> List[List[float]]:
+    """Noisy copies of stored vectors, so the true neighbours are close together"""
+    out = []
+    for _ in range(n):
+        src = rng.choice(base)
+        v = [x + rng.gauss(0, noise) for x in src]
+        norm = math.sqrt(sum(x * x for x in v)) or 1.0
+        out.append([x / norm for x in v])
+    return out
+
+
+def build(vectors: List[List[float]], store: Callable) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    stored = [store(v) for v in vectors]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {"stored": stored, "bytes": used}
+
+
+def search(q: List[float], stored: List, k: int) -> List[int]:
+    return [i for _, i in heapq.nlargest(k, ((dot(q, v), i) for i, v in enumerate(stored)))]
+
+
+def run(n: int, dim: int, n_queries: int, k: int, noise: float, seed: int) -> Dict:
+    rng = random.Random(seed)
+    vectors = unit_vectors(rng, n, dim)
+    queries = queries_near(rng, vectors, n_queries, noise)
+
+    # Fresh float objects, as an embedding model would return them
+    layouts = {"list": lambda v: [x + 0.0 for x in v]}
+    layouts.update({mode: (lambda v, m=mode: quantize(v, m)) for mode in MODES})
+
+    results, exact = [], None
+    for name, store in layouts.items():
+        built = build(vectors, store)
+        t0 = time.perf_counter()
+        hits = [search(q, built["stored"], k) for q in queries]
+        scan_s = (time.perf_counter() - t0) / len(queries)
+        if exact is None:
+            exact = hits
+        recall = sum(len(set(h) & set(e)) for h, e in zip(hits, exact)) / (k * len(queries))
+        results.append({
+            "layout": name,
+            "bytes_per_vector": built["bytes"] / n,
+            "total_mb": built["bytes"] / 2**20,
+            "scan_ms_per_query": scan_s * 1000,
+            "recall_at_k": recall,
+        })
+        del built
+    base = results[0]["bytes_per_vector"]
+    f32 = next(r for r in results if r["layout"] == "float32")
+    for r in results:
+        r["saved_vs_list"] = 1 - r["bytes_per_vector"] / base
+        r["saved_vs_float32"] = 1 - r["bytes_per_vector"] / f32["bytes_per_vector"]
+        # Per-query price of the smaller layout (>1 = slower scan than float32)
+        r["scan_vs_float32"] = r["scan_ms_per_query"] / f32["scan_ms_per_query"]
+        r["recall_loss"] = 1 - r["recall_at_k"]
+    return {"n": n, "dim": dim, "queries": n_queries, "k": k, "noise": noise, "seed": seed,
+            "half_view": HALF_VIEW, "results": results}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=5000, help="stored vectors")
+    parser.add_argument("--dim", type=int, default=settings.embed_dim)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05, help="query perturbation (std per dimension)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    report = run(args.n, args.dim, args.queries, args.k, args.noise, args.seed)
+    print(f"{args.n} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k} vs exact float search")
+    print(f"float16 scored {'in place (memoryview)' if HALF_VIEW else 'by unpacking each vector (Python < 3.12)'}")
+    print(f"{'layout':<10} {'B/vector':>10} {'total MB':>10} {'saved/list':>11} {'saved/f32':>10} "
+          f"{'scan ms/q':>10} {'vs f32':>7} {'recall@k':>9}")
+    for r in report["results"]:
+        print(f"{r['layout']:<10} {r['bytes_per_vector']:10.0f} {r['total_mb']:10.1f} {r['saved_vs_list']:10.1%} "
+              f"{r['saved_vs_float32']:10.1%} {r['scan_ms_per_query']:10.1f} {r['scan_vs_float32']:6.2f}x "
+              f"{r['recall_at_k']:9.3f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
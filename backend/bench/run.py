@@ -0,0 +1,161 @@
+"""
+Microbenchmarks for the chunk / embed / retrieve / pack hot paths
+
+Usage (from backend/):
+    python -m bench.run                               # default sizes, print table
+    python -m bench.run --sizes 1000,1000000 --out results.json
+    python -m bench.run --compare baseline.json --threshold 0.15
+
+Each benchmark is timed with tracemalloc off (median of --repeat runs), then
+run once more under tracemalloc to record peak allocated memory. --compare
+exits non-zero when any benchmark is slower (or uses more memory) than the
+baseline by more than --threshold.
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from .corpus import Corpus, DEFAULT_SEED, text_pairs
+
+from app.services.chunk import chunk_text
+from app.services.embed import embed_text
+from app.services.retrieve import top_k, top_k_many, _score
+from app.services.pack import pack_context
+from app.services.conversation import ConversationMemory
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+
+# Differences below this are treated as timer noise in --compare
+MIN_SECONDS = 0.0005
+MIN_PEAK_KB = 64
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_s": statistics.median(times), "min_s": min(times), "peak_kb": peak / 1024}
+
+
+def fixed_benchmarks(corpus: Corpus) -> Dict[str, Callable[[], object]]:
+    """Benchmarks whose workload does not depend on session size"""
+    doc = corpus.document(1_000_000)
+    texts = corpus.chunk_texts(1000)
+    pairs = text_pairs(corpus, 1000)
+    vecs = [(embed_text(q), embed_text(t)) for q, t in pairs]
+    hits_8 = corpus.chunks(8)
+    hits_64 = corpus.chunks(64)
+    messages = corpus.chunk_texts(200, words_per_chunk=40)
+
+    def bench_score():
+        for (q, t), (vq, vt) in zip(pairs, vecs):
+            _score(q, t, vq, vt)
+
+    def bench_memory():
+        mem = ConversationMemory()
+        for i, m in enumerate(messages):
+            mem.add_message("user" if i % 2 == 0 else "assistant", m)
+            mem.get_recent_context(last_n=5)
+        mem.get_conversation_context()
+        mem.get_summary()
+
+    return {
+        "chunk_text[1MB]": lambda: chunk_text(doc, size=800),
+        "embed_text[x1000]": lambda: [embed_text(t) for t in texts],
+        "_score[x1000]": bench_score,
+        "pack_context[k=8]": lambda: pack_context(hits_8, budget_chars=6000),
+        "pack_context[k=64]": lambda: pack_context(hits_64, budget_chars=48000),
+        "ConversationMemory[200 turns]": bench_memory,
+    }
+
+
+def run(sizes: List[int], repeat: int, seed: int) -> List[Dict]:
+    corpus = Corpus(seed)
+    results = []
+
+    def record(name: str, size: Optional[int], fn: Callable[[], object], n: int):
+        r = measure(fn, n)
+        results.append({"name": name, "size": size, **r})
+        label = f"{name}" + (f" n={size}" if size else "")
+        print(f"{label:<40} median {r['median_s'] * 1000:10.3f} ms   min {r['min_s'] * 1000:10.3f} ms   peak {r['peak_kb']:10.1f} KB",
+              flush=True)
+
+    for name, fn in fixed_benchmarks(corpus).items():
+        record(name, None, fn, repeat)
+
+    query = corpus.queries(1)[0]
+    batch = corpus.queries(8)
+    for size in sizes:
+        session = corpus.session(size)
+        # Large sessions take seconds per scan; keep total runtime bounded
+        n = repeat if size <= 100_000 else max(1, repeat // 3)
+        record("top_k[k=8]", size, lambda: top_k(query, session, k=8), n)
+        record("top_k_many[q=8,k=8]", size, lambda: top_k_many(batch, session, k=8), n)
+        del session
+        gc.collect()
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> int:
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    failures = 0
+    for r in results:
+        base = baseline.get((r["name"], r["size"]))
+        if base is None:
+            continue
+        checks = (
+            ("time", r["median_s"], base["median_s"], MIN_SECONDS),
+            ("peak", r["peak_kb"], base["peak_kb"], MIN_PEAK_KB),
+        )
+        for what, new, old, floor in checks:
+            if new - old > floor and old > 0 and new / old > 1 + threshold:
+                failures += 1
+                label = r["name"] + (f" n={r['size']}" if r["size"] else "")
+                print(f"REGRESSION {label} {what}: {old:.6g} -> {new:.6g} (+{(new / old - 1) * 100:.1f}%)")
+    if failures:
+        print(f"{failures} regression(s) beyond {threshold * 100:.0f}%")
+    else:
+        print(f"no regressions beyond {threshold * 100:.0f}%")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated session sizes in chunks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown ratio, e.g. 0.15 = 15%%")
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    results = run(sizes, args.repeat, args.seed)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "meta": {"python": sys.version.split()[0], "platform": platform.platform(), "seed": args.seed},
+                "results": results,
+            }, f, indent=2)
+    if args.compare:
+        return compare(results, args.compare, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
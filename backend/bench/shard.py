@@ -0,0 +1,126 @@
+"""
+Sharded retrieval scaling benchmark: query latency by worker count
+
+Builds a seeded synthetic session of --n chunks, times the in-process scan
+(retrieve.top_k with sharding off), then for each worker count in --workers
+shards the session (two shards per worker unless --shards is given) and
+times the same queries through the worker pool. Reports build time, ms per
+query, speedup over the in-process scan, parallel efficiency (speedup /
+workers) and whether the top-k matches the in-process scan exactly.
+
+Speedup is bounded by the cores actually available (os.cpu_count() is
+printed); worker counts above it only add overhead.
+
+Usage (from backend/):
+    python -m bench.shard                                   # 200k chunks, 1,2,4,...,cores
+    python -m bench.shard --n 500000 --workers 1,2,4,8,16 --queries 8 --out shard.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from .corpus import Corpus, DEFAULT_SEED
+
+from app.services.retrieve import top_k
+from app.services.embed import embed_text
+from app.services.shards import SHARDS
+
+
+def default_workers() -> str:
+    cores = os.cpu_count() or 1
+    counts, w = [], 1
+    while w < cores:
+        counts.append(w)
+        w *= 2
+    return ",".join(str(c) for c in counts + [cores])
+
+
+def time_queries(fn, queries: List[str], repeat: int) -> float:
+    """Median seconds per query over `repeat` passes"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        for q in queries:
+            fn(q)
+        times.append((time.perf_counter() - t0) / len(queries))
+    return statistics.median(times)
+
+
+def run(n: int, workers: List[int], shards: int, n_queries: int, k: int, repeat: int, seed: int) -> Dict:
+    corpus = Corpus(seed)
+    print(f"building a {n}-chunk session ...", flush=True)
+    session = corpus.session(n)
+    queries = corpus.queries(n_queries)
+    idx = session.index
+
+    SHARDS.configure(workers=1, shards=1, min_chunks=0)
+    exact = {q: [c["id"] for c in top_k(q, session, k=k)] for q in queries}
+    base_s = time_queries(lambda q: top_k(q, session, k=k), queries, repeat)
+    results = [{"workers": 0, "shards": 0, "build_s": 0.0, "ms_per_query": base_s * 1000,
+                "speedup": 1.0, "efficiency": None, "exact": True}]
+    print(f"{'in-process':<12} {'':>7} {'':>9} {base_s * 1000:12.1f} {1.0:8.2f}x", flush=True)
+
+    for w in workers:
+        SHARDS.configure(workers=w, shards=shards or 2 * w, min_chunks=1)
+        SHARDS.warm_up()
+
+        def search(q: str):
+            return SHARDS.search(session, idx, [q.lower().split()], [embed_text(q)], k)[0]
+
+        t0 = time.perf_counter()
+        SHARDS.build(session, idx)
+        build_s = time.perf_counter() - t0
+        hits = {q: [c["id"] for c in search(q)] for q in queries}
+        per_q = time_queries(search, queries, repeat)
+        stats = SHARDS.stats()
+        r = {
+            "workers": w,
+            "shards": stats["blocks"],
+            "build_s": build_s,
+            "ms_per_query": per_q * 1000,
+            "speedup": base_s / per_q,
+            "efficiency": base_s / per_q / w,
+            "exact": hits == exact,
+            "shard_mb": stats["bytes"] / 2**20,
+        }
+        results.append(r)
+        print(f"{'pool':<12} {w:7d} {r['shards']:9d} {r['ms_per_query']:12.1f} {r['speedup']:8.2f}x "
+              f"{r['efficiency']:10.0%} {r['build_s']:9.2f} {str(r['exact']):>6}", flush=True)
+    SHARDS.close()
+    return {"n": n, "queries": n_queries, "k": k, "repeat": repeat, "seed": seed,
+            "cpu_count": os.cpu_count(), "results": results}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="session size in chunks")
+    parser.add_argument("--workers", default=default_workers(), help="comma-separated worker counts")
+    parser.add_argument("--shards", type=int, default=0, help="shards per session (0 = two per worker)")
+    parser.add_argument("--queries", type=int, default=4)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    workers = [int(x) for x in args.workers.split(",") if x.strip()]
+    print(f"{os.cpu_count()} cores; top_k[k={args.k}] over {args.n} chunks, {args.queries} queries x {args.repeat}")
+    print(f"{'mode':<12} {'workers':>7} {'shards':>9} {'ms/query':>12} {'speedup':>9} {'efficiency':>10} "
+          f"{'build s':>9} {'exact':>6}")
+    report = run(args.n, workers, args.shards, args.queries, args.k, args.repeat, args.seed)
+    if args.out:
+        report["meta"] = {"python": sys.version.split()[0], "platform": platform.platform()}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Cold-start benchmark
+
+Imports the app in fresh interpreters with `-X importtime` and reports the
+median cumulative import time of every module, the app's own modules first.
+With --server it also starts uvicorn and measures time until /healthz answers.
+
+Usage (from backend/):
+    python -m bench.startup                       # import-time table
+    python -m bench.startup --server --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(target: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds per module for one cold import"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    out = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        body = line[len("import time:"):]
+        _, cumulative_us, name = (p.strip() for p in body.split("|"))
+        out[name] = int(cumulative_us)
+    return out
+
+
+def time_to_healthz(port: int) -> float:
+    import httpx
+
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/healthz", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - t0
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app.main", help="module to import")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25, help="third-party modules to list")
+    parser.add_argument("--server", action="store_true", help="also measure uvicorn start to first /healthz")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    runs: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(args.repeat):
+        for name, us in import_times(args.target).items():
+            runs[name].append(us)
+    median = {name: statistics.median(v) for name, v in runs.items()}
+
+    own = sorted(((n, us) for n, us in median.items() if n == "app" or n.startswith("app.")), key=lambda x: -x[1])
+    other = sorted(((n, us) for n, us in median.items() if not (n == "app" or n.startswith("app."))), key=lambda x: -x[1])
+    print(f"{'module':<50} {'cumulative ms':>14}")
+    for name, us in own:
+        print(f"{name:<50} {us / 1000:14.1f}")
+    print("-" * 65)
+    for name, us in other[:args.top]:
+        print(f"{name:<50} {us / 1000:14.1f}")
+
+    result = {"target": args.target, "import_ms": {n: us / 1000 for n, us in sorted(median.items(), key=lambda x: -x[1])}}
+    if args.server:
+        samples = [time_to_healthz(args.port) for _ in range(args.repeat)]
+        result["healthz_ms"] = statistics.median(samples) * 1000
+        print(f"\nuvicorn start -> first /healthz: {result['healthz_ms']:.0f} ms (median of {args.repeat})")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+End-to-end load generator
+
+Drives concurrent virtual users through the real API:
+  /session/new -> /session/{id}/upload -> /chat/stream, /chat/conversational -> /summarize
+and reports throughput, p50/p99 latency, time to first SSE byte and the
+server's RSS over time.
+
+Against a server you started yourself:
+    python -m loadtest.run --url http://127.0.0.1:8000 --users 50 --duration 60 --pid <uvicorn pid>
+
+Or let it start the stubs and the backend, wired together:
+    python -m loadtest.run --spawn --users 50 --duration 60 --stub-latency 0.8 --stub-error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[idx]
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    """Resident set size of pid plus its children (Linux /proc; psutil elsewhere)"""
+    try:
+        import psutil
+        proc = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [proc, *proc.children(recursive=True)]) // 1024
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    total = 0
+    pids = [pid]
+    while pids:
+        p = pids.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return total or None
+
+
+class Stats:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.ttfb: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.rss: List[tuple] = []
+
+    def report(self, elapsed: float) -> dict:
+        out = {"elapsed_s": round(elapsed, 2), "endpoints": {}, "rss_kb": self.rss}
+        for name in sorted(set(self.latency) | set(self.errors)):
+            lat = self.latency[name]
+            out["endpoints"][name] = {
+                "ok": len(lat),
+                "errors": self.errors[name],
+                "rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(lat, 50) * 1000, 1),
+                "p99_ms": round(percentile(lat, 99) * 1000, 1),
+            }
+            if self.ttfb.get(name):
+                out["endpoints"][name]["ttfb_p50_ms"] = round(percentile(self.ttfb[name], 50) * 1000, 1)
+                out["endpoints"][name]["ttfb_p99_ms"] = round(percentile(self.ttfb[name], 99) * 1000, 1)
+        return out
+
+
+async def timed(stats: Stats, name: str, coro):
+    t0 = time.perf_counter()
+    try:
+        r = await coro
+        if r.status_code >= 400:
+            stats.errors[f"{name} {r.status_code}"] += 1
+            return None
+        stats.latency[name].append(time.perf_counter() - t0)
+        return r
+    except httpx.HTTPError:
+        stats.errors[name] += 1
+        return None
+
+
+async def sse(stats: Stats, client: httpx.AsyncClient, name: str, path: str, body: dict):
+    t0 = time.perf_counter()
+    try:
+        async with client.stream("POST", path, json=body) as r:
+            if r.status_code >= 400:
+                await r.aread()
+                stats.errors[f"{name} {r.status_code}"] += 1
+                return
+            first = True
+            async for _ in r.aiter_bytes():
+                if first:
+                    stats.ttfb[name].append(time.perf_counter() - t0)
+                    first = False
+        stats.latency[name].append(time.perf_counter() - t0)
+    except httpx.HTTPError:
+        stats.errors[name] += 1
+
+
+def make_document(rng: random.Random, n_words: int) -> bytes:
+    words = ("revenue growth margin pipeline customer churn quarter forecast hiring roadmap risk "
+             "launch budget region partner pricing retention onboarding latency incident").split()
+    return " ".join(rng.choice(words) for _ in range(n_words)).encode()
+
+
+async def user(uid: int, args, stats: Stats, stop_at: float):
+    rng = random.Random(uid)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        while time.perf_counter() < stop_at:
+            r = await timed(stats, "session/new", client.post("/session/new"))
+            if r is None:
+                await asyncio.sleep(1)
+                continue
+            sid = r.json()["session_id"]
+            files = [("files", (f"doc{i}.txt", make_document(rng, args.doc_words), "text/plain")) for i in range(args.docs)]
+            if args.audio:
+                files.append(("files", ("clip.wav", os.urandom(32_000), "audio/wav")))
+            if await timed(stats, "upload", client.post(f"/session/{sid}/upload", files=files)) is None:
+                continue
+            for turn in range(args.turns):
+                if time.perf_counter() >= stop_at:
+                    break
+                msg = {"session_id": sid, "message": f"what is the forecast for region {rng.randint(1, 9)}?"}
+                path = "/chat/conversational" if turn % 2 else "/chat/stream"
+                await sse(stats, client, path.lstrip("/"), path, msg)
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+            await timed(stats, "summarize", client.post("/summarize", json={"session_id": sid}))
+            await client.delete(f"/session/{sid}")
+
+
+async def sample_rss(pid: int, stats: Stats, t0: float, stop_at: float, interval: float):
+    while time.perf_counter() < stop_at:
+        kb = rss_kb(pid)
+        if kb is not None:
+            stats.rss.append((round(time.perf_counter() - t0, 1), kb))
+        await asyncio.sleep(interval)
+
+
+async def drive(args, pid: Optional[int]) -> dict:
+    stats = Stats()
+    t0 = time.perf_counter()
+    stop_at = t0 + args.duration
+    tasks = [asyncio.create_task(user(i, args, stats, stop_at)) for i in range(args.users)]
+    if pid:
+        tasks.append(asyncio.create_task(sample_rss(pid, stats, t0, stop_at, args.rss_interval)))
+    await asyncio.gather(*tasks)
+    return stats.report(time.perf_counter() - t0)
+
+
+def wait_ready(url: str, path: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url + path, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def spawn(args):
+    """Start stubs and the backend as subprocesses wired to each other"""
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "loadtest.stubs", "--port", str(args.stub_port),
+         "--latency", str(args.stub_latency), "--error-rate", str(args.stub_error_rate),
+         "--chunk-interval", str(args.stub_chunk_interval)],
+        cwd=BACKEND_DIR,
+    )
+    env = {**os.environ, "GEMINI_API_KEY": "stub", "SARVAM_API_KEY": "stub",
+           "GEMINI_BASE_URL": stub_url, "SARVAM_BASE_URL": stub_url, "ASR_CACHE_MAX_MB": "0"}
+    port = int(args.url.rsplit(":", 1)[1])
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    wait_ready(stub_url, "/stub/stats")
+    wait_ready(args.url, "/healthz")
+    return stub, api
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--turns", type=int, default=4, help="chat turns per session")
+    parser.add_argument("--docs", type=int, default=2, help="documents uploaded per session")
+    parser.add_argument("--doc-words", type=int, default=3000)
+    parser.add_argument("--audio", action="store_true", help="also upload a short audio clip (exercises ASR)")
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--pid", type=int, help="server pid to sample RSS from")
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--spawn", action="store_true", help="start stubs and backend locally")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--stub-latency", type=float, default=0.5)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-chunk-interval", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    procs = spawn(args) if args.spawn else ()
+    pid = args.pid or (procs[1].pid if procs else None)
+    try:
+        report = asyncio.run(drive(args, pid))
+    finally:
+        for p in procs:
+            p.send_signal(signal.SIGINT)
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    print(json.dumps({k: v for k, v in report.items() if k != "rss_kb"}, indent=2))
+    if report["rss_kb"]:
+        print(f"rss: start {report['rss_kb'][0][1]} KB, peak {max(kb for _, kb in report['rss_kb'])} KB, "
+              f"end {report['rss_kb'][-1][1]} KB")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
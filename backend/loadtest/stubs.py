@@ -0,0 +1,179 @@
+"""
+Local stand-ins for the Gemini and Sarvam APIs
+
+One FastAPI app serves both:
+  POST /v1beta/models/{model}:generateContent         Gemini, unary JSON
+  POST /v1beta/models/{model}:streamGenerateContent   Gemini, SSE (?alt=sse)
+  POST /v1beta/cachedContents, DELETE .../{id}        Gemini context caching
+  POST /v1/speech-to-text                              Sarvam, JSON or multipart
+
+Latency, streaming cadence and error rates are configurable, so production-like
+upstream behaviour can be reproduced offline:
+
+    python -m loadtest.stubs --port 9100 --latency 0.8 --jitter 0.3 --error-rate 0.02
+
+Point the backend at it with GEMINI_BASE_URL=http://127.0.0.1:9100 and
+SARVAM_BASE_URL=http://127.0.0.1:9100 (any non-empty API keys).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("the report shows steady growth across all regions while costs remain flat and the team "
+         "recommends expanding the pilot next quarter with a focus on onboarding and retention").split()
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.5          # seconds before the first byte
+    jitter: float = 0.2           # +/- uniform jitter on latency
+    error_rate: float = 0.0       # fraction of requests answered with error_status
+    error_status: int = 503
+    answer_words: int = 120       # length of generated answers
+    chunk_words: int = 8          # words per streamed chunk
+    chunk_interval: float = 0.05  # seconds between streamed chunks
+    asr_latency: float = 2.0      # Sarvam processing time
+    slow_model: str = ""          # model name that gets slow_latency instead (tier routing tests)
+    slow_latency: float = 0.0
+    seed: int = 0
+
+
+def create_app(cfg: StubConfig) -> FastAPI:
+    app = FastAPI(title="Gemini/Sarvam stand-ins")
+    rng = random.Random(cfg.seed)
+    counters = {"gemini": 0, "gemini_stream": 0, "sarvam": 0, "errors": 0,
+                "caches_created": 0, "cache_hits": 0, "cache_misses": 0, "prompt_chars": 0, "cached_chars": 0}
+    # name -> (model, chars, expires at)
+    caches = {}
+    cache_ids = itertools.count(1)
+
+    def text_chars(contents) -> int:
+        if isinstance(contents, str):
+            return len(contents)
+        return sum(len(p.get("text", "")) for c in contents or [] for p in c.get("parts", []))
+
+    async def delay(base: float):
+        await asyncio.sleep(max(0.0, base + rng.uniform(-cfg.jitter, cfg.jitter)))
+
+    def failed() -> bool:
+        if rng.random() < cfg.error_rate:
+            counters["errors"] += 1
+            return True
+        return False
+
+    def error_response():
+        return JSONResponse({"error": {"code": cfg.error_status, "message": "stub injected error", "status": "UNAVAILABLE"}},
+                            status_code=cfg.error_status)
+
+    def answer() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(cfg.answer_words))
+
+    def candidate(text: str, finish: bool = True, prompt_chars: int = 0, cached_chars: int = 0) -> dict:
+        usage = {"promptTokenCount": (prompt_chars + cached_chars) // 4, "candidatesTokenCount": len(text.split())}
+        if cached_chars:
+            usage["cachedContentTokenCount"] = cached_chars // 4
+        out = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}],
+               "usageMetadata": usage}
+        if finish:
+            out["candidates"][0]["finishReason"] = "STOP"
+        return out
+
+    @app.post("/v1beta/cachedContents")
+    async def create_cache(request: Request):
+        body = await request.json()
+        name = f"cachedContents/stub{next(cache_ids)}"
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        chars = text_chars(body.get("contents"))
+        caches[name] = (body.get("model", ""), chars, time.time() + ttl)
+        counters["caches_created"] += 1
+        return {"name": name, "model": body.get("model", ""), "displayName": body.get("displayName", ""),
+                "usageMetadata": {"totalTokenCount": chars // 4}}
+
+    @app.delete("/v1beta/cachedContents/{cache_id}")
+    async def delete_cache(cache_id: str):
+        caches.pop(f"cachedContents/{cache_id}", None)
+        return {}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini(model_action: str, request: Request):
+        raw = await request.body()
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            body = {}
+        prompt_chars = text_chars(body.get("contents"))
+        cached_chars = 0
+        if body.get("cachedContent"):
+            entry = caches.get(body["cachedContent"])
+            if entry is None or entry[2] < time.time():
+                counters["cache_misses"] += 1
+                return JSONResponse({"error": {"code": 404, "message": "cached content not found", "status": "NOT_FOUND"}},
+                                    status_code=404)
+            counters["cache_hits"] += 1
+            cached_chars = entry[1]
+        counters["prompt_chars"] += prompt_chars
+        counters["cached_chars"] += cached_chars
+        if model_action.endswith(":streamGenerateContent"):
+            counters["gemini_stream"] += 1
+            await delay(cfg.latency)
+            if failed():
+                return error_response()
+            words = answer().split()
+
+            async def gen():
+                for i in range(0, len(words), cfg.chunk_words):
+                    last = i + cfg.chunk_words >= len(words)
+                    yield f"data: {json.dumps(candidate(' '.join(words[i:i + cfg.chunk_words]) + ' ', finish=last))}\r\n\r\n"
+                    await asyncio.sleep(cfg.chunk_interval)
+
+            return StreamingResponse(gen(), media_type="text/event-stream")
+
+        counters["gemini"] += 1
+        model = model_action.split(":")[0]
+        counters[f"model:{model}"] = counters.get(f"model:{model}", 0) + 1
+        # Unary calls pay for the whole generation up front
+        n_chunks = max(1, cfg.answer_words // max(1, cfg.chunk_words))
+        base = cfg.slow_latency if cfg.slow_model and model == cfg.slow_model else cfg.latency
+        await delay(base + n_chunks * cfg.chunk_interval)
+        if failed():
+            return error_response()
+        return candidate(answer(), prompt_chars=prompt_chars, cached_chars=cached_chars)
+
+    @app.post("/v1/speech-to-text")
+    async def sarvam(request: Request):
+        counters["sarvam"] += 1
+        await request.body()
+        await delay(cfg.asr_latency)
+        if failed():
+            return error_response()
+        return {"text": answer(), "segments": [], "language": "en"}
+
+    @app.get("/stub/stats")
+    def stats():
+        return counters
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gemini/Sarvam stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for name, default in StubConfig.__dataclass_fields__.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default.default), default=default.default)
+    args = parser.parse_args(argv)
+    cfg = StubConfig(**{k: getattr(args, k) for k in StubConfig.__dataclass_fields__})
+
+    import uvicorn
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
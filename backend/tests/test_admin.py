@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.profiling import PROFILER
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def test_admin_is_closed_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "")
+    assert client.get("/admin/profiling").status_code == 403
+    assert client.get("/admin/profiling", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_admin_requires_the_matching_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    assert client.get("/admin/profiling").status_code == 403
+    assert client.get("/admin/profiling", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/profiling", headers={"X-Admin-Token": "s3cret"}).status_code == 200
+
+
+@pytest.mark.parametrize("token, sent, profiled", [("", "", False), ("s3cret", "wrong", False), ("s3cret", "s3cret", True)])
+def test_profile_header_needs_the_admin_token(client, monkeypatch, token, sent, profiled):
+    monkeypatch.setattr(settings, "admin_token", token)
+    seen = []
+    monkeypatch.setattr(PROFILER, "wants", lambda forced: seen.append(forced) or False)
+    client.post("/chat/stream", json={}, headers={"X-Profile": "1", "X-Admin-Token": sent})
+    assert seen == [profiled]
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.routers.chat as chat_router
+import app.services.admission as admission
+import app.services.llm as llm
+from app.services.admission import AdmissionController, AdmissionRejected, BACKGROUND, INTERACTIVE
+from app.services.simple_chat import SimpleConversationalChat
+from app.services.singleflight import SingleFlight
+
+
+def test_full_queue_is_429_and_timeout_is_503():
+    ctl = AdmissionController(limit=1, queue_size=1, queue_wait=0.3)
+    held = ctl.acquire()
+    outcome = {}
+
+    def waiter():
+        try:
+            ctl.acquire()
+        except AdmissionRejected as e:
+            outcome["waiter"] = e
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    time.sleep(0.05)
+    with pytest.raises(AdmissionRejected) as full:
+        ctl.acquire()
+    assert full.value.status == 429 and full.value.retry_after >= 1
+    t.join()
+    assert outcome["waiter"].status == 503 and outcome["waiter"].retry_after >= 1
+    held.release()
+    ctl.acquire().release()
+    assert ctl.snapshot()["rejected_full"] == 1 and ctl.snapshot()["rejected_timeout"] == 1
+
+
+def test_interactive_is_admitted_before_background():
+    ctl = AdmissionController(limit=1, queue_size=4, queue_wait=2)
+    held = ctl.acquire()
+    order = []
+
+    def take(priority, name):
+        with ctl.acquire(priority):
+            order.append(name)
+
+    threads = [threading.Thread(target=take, args=(BACKGROUND, "summary"))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=take, args=(INTERACTIVE, "chat")))
+    threads[1].start()
+    time.sleep(0.05)
+    held.release()
+    for t in threads:
+        t.join()
+    assert order == ["chat", "summary"]
+
+
+def test_waiters_are_capped_by_the_threadpool_share():
+    ctl = AdmissionController(limit=1, queue_size=32, queue_wait=1, max_blocked=2)
+    assert ctl.snapshot()["queue_size"] == 2
+
+
+def test_http_rejection_carries_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_ADMISSION", AdmissionController(limit=1, queue_size=0, queue_wait=0.1))
+    monkeypatch.setattr(chat_router, "_chat_service", SimpleConversationalChat())
+    from app.main import app
+    c = TestClient(app)
+    sid = c.post("/session/new").json()["session_id"]
+    c.post(f"/session/{sid}/upload", files={"files": ("a.txt", b"the quarterly growth report " * 100, "text/plain")})
+    held = admission.LLM_ADMISSION.acquire()
+    try:
+        r = c.post("/chat/conversational", json={"session_id": sid, "message": "growth report"})
+    finally:
+        held.release()
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+
+
+def test_slot_is_released_before_the_typing_effect(monkeypatch):
+    ctl = AdmissionController(limit=1, queue_size=0, queue_wait=0.1)
+    monkeypatch.setattr(admission, "LLM_ADMISSION", ctl)
+    monkeypatch.setattr(llm, "_answer_tokens", lambda prompt, route, cached: iter(["word "] * 100))
+    flights = SingleFlight("test")
+    tokens = llm.paced(flights.stream("k", lambda: llm.answer_stream("p", pace=False), INTERACTIVE))
+    assert next(tokens) == "word "
+    time.sleep(0.05)
+    # 99 paced words (about 3 s) are still to come, but the provider call is over
+    assert ctl.snapshot()["in_flight"] == 0
+    tokens.close()
@@ -0,0 +1,36 @@
+import os
+
+from app.services.asr_cache import TranscriptCache
+
+RESULT = {"text": "hello", "segments": [], "lang": "en", "meta": {"provider": "sarvam"}}
+
+
+def test_round_trip(tmp_path):
+    cache = TranscriptCache(str(tmp_path), 1 << 20, "ns")
+    key = cache.key(b"audio")
+    cache.put(key, RESULT)
+    assert cache.get(key)["text"] == "hello"
+
+
+def test_write_failure_is_swallowed_and_cleans_up(tmp_path, monkeypatch):
+    cache = TranscriptCache(str(tmp_path), 1 << 20, "ns")
+    key = cache.key(b"audio")
+
+    def disk_full(src, dst):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "replace", disk_full)
+    cache.put(key, RESULT)
+    assert cache.write_errors == 1
+    assert not [n for _, _, names in os.walk(tmp_path) for n in names]
+    monkeypatch.undo()
+    assert cache.get(key) is None
+
+
+def test_unwritable_root_is_swallowed(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("x")
+    # makedirs under a regular file fails with an OSError
+    cache = TranscriptCache(str(blocker / "cache"), 1 << 20, "ns")
+    cache.put(cache.key(b"audio"), RESULT)
+    assert cache.write_errors == 1
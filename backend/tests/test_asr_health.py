@@ -0,0 +1,40 @@
+from app.services.asr_health import CLOSED, OPEN, ProviderHealth, provider_failed
+
+
+def _result(error, **meta):
+    return {"text": "", "segments": [], "lang": "auto", "meta": {"error": error, **meta}}
+
+
+def test_client_errors_do_not_count_against_the_provider():
+    for error in ("api_error_400", "api_error_413", "json_parse_error", "unsupported_format", "file_too_large"):
+        assert not provider_failed({"error": error})
+
+
+def test_provider_errors_count():
+    for error in ("api_error_500", "api_error_503", "api_error_429", "whisper_timeout"):
+        assert provider_failed({"error": error})
+    assert provider_failed({"error": "Read timed out", "transient": True})
+
+
+def test_bad_uploads_keep_the_breaker_closed():
+    health = ProviderHealth(threshold=2, cooldown=60)
+    for _ in range(5):
+        health.call("p", lambda: _result("api_error_400"))
+    assert health.snapshot()["p"]["state"] == CLOSED
+
+
+def test_server_errors_open_the_breaker():
+    health = ProviderHealth(threshold=2, cooldown=60)
+    health.call("p", lambda: _result("api_error_502"))
+    health.call("p", lambda: _result("api_error_502"))
+    assert health.snapshot()["p"]["state"] == OPEN
+    assert health.call("p", lambda: _result(None))["meta"]["error"] == "circuit_open"
+
+
+def test_raised_timeouts_count():
+    def boom():
+        raise TimeoutError("slow")
+
+    health = ProviderHealth(threshold=1, cooldown=60)
+    health.call("p", boom)
+    assert health.snapshot()["p"]["state"] == OPEN
@@ -0,0 +1,80 @@
+import threading
+import time
+import types
+
+import pytest
+
+from app.deadline import Deadline, active
+from app.services import asr_sarvam
+
+
+@pytest.fixture
+def timeouts(monkeypatch):
+    seen = []
+
+    def post(url, timeout=None, **kw):
+        seen.append(timeout)
+        return types.SimpleNamespace(status_code=503, text="busy")
+
+    monkeypatch.setattr(asr_sarvam, "requests", types.SimpleNamespace(post=post))
+    return seen
+
+
+def test_batch_calls_keep_their_longer_timeout(timeouts):
+    asr_sarvam._transcribe_batch(b"\0" * 64, "talk.mp3", "audio/mpeg", "key")
+    asr_sarvam._transcribe_realtime(b"\0" * 64, "talk.mp3", "audio/mpeg", "key")
+    assert timeouts == [300, 120]
+
+
+def test_deadline_caps_the_batch_timeout(timeouts):
+    with active(Deadline(5)):
+        asr_sarvam._transcribe_batch(b"\0" * 64, "talk.mp3", "audio/mpeg", "key")
+    assert 0 < timeouts[0] <= 5
+
+
+OK = {"text": "hello", "segments": [], "lang": "en", "meta": {"provider": "test"}}
+FAILED = {"text": "", "segments": [], "lang": "auto", "meta": {"error": "api_error_503"}}
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setenv("SARVAM_API_KEY", "key")
+    monkeypatch.setattr(asr_sarvam.settings, "asr_hedge_delay", 0.01)
+    monkeypatch.setattr(asr_sarvam.settings, "asr_hedge_timeout", 2)
+
+
+def test_full_hedge_pool_runs_unhedged_instead_of_queueing(hedging, monkeypatch):
+    threads = []
+
+    def run_sarvam(*args, stop=None):
+        threads.append(threading.current_thread())
+        return OK, asr_sarvam._NOT_RUN
+
+    monkeypatch.setattr(asr_sarvam, "_HEDGE_SLOTS", threading.BoundedSemaphore(1))
+    asr_sarvam._HEDGE_SLOTS.acquire()
+    monkeypatch.setattr(asr_sarvam, "_run_sarvam", run_sarvam)
+    result = asr_sarvam._transcribe_uncached(b"\0" * 64, "talk.mp3", "audio/mpeg")
+    assert result is OK
+    assert threads == [threading.current_thread()]
+
+
+def test_losing_chain_is_bounded_and_stops_after_the_winner(hedging, monkeypatch):
+    seen = {}
+
+    def run_sarvam(*args, stop=None):
+        seen["timeout"] = asr_sarvam.deadline_timeout(300)
+        seen["stopped"] = stop.wait(5)
+        return FAILED, asr_sarvam._NOT_RUN
+
+    monkeypatch.setattr(asr_sarvam, "_run_sarvam", run_sarvam)
+    monkeypatch.setattr(asr_sarvam, "_run_local", lambda *args, stop=None: (OK, asr_sarvam._NOT_RUN))
+    start = time.perf_counter()
+    assert asr_sarvam._transcribe_uncached(b"\0" * 64, "talk.mp3", "audio/mpeg") is OK
+    # The loser saw the hedge budget, and gave its thread back once the winner was in
+    for _ in range(100):
+        if "stopped" in seen:
+            break
+        time.sleep(0.01)
+    assert seen["timeout"] <= 2
+    assert seen["stopped"] is True
+    assert time.perf_counter() - start < 2
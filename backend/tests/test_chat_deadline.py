@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.routers.chat as chat_router
+from app.main import app
+from app.services import simple_chat
+from app.services.simple_chat import SimpleConversationalChat
+
+ANSWER = [f"word{i} " for i in range(40)]
+
+
+def _instant(prompt, pace=True, route=None, cached=None):
+    return iter(ANSWER)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(chat_router, "answer_stream", _instant)
+    monkeypatch.setattr(simple_chat, "answer_stream", _instant)
+    monkeypatch.setattr(chat_router, "_chat_service", SimpleConversationalChat())
+    with TestClient(app) as c:
+        sid = c.post("/session/new").json()["session_id"]
+        body = " ".join(f"word{i}" for i in range(200)).encode()
+        assert c.post(f"/session/{sid}/upload", files={"files": ("notes.txt", body, "text/plain")}).status_code == 200
+        yield c, sid
+
+
+@pytest.mark.parametrize("path", ["/chat/stream", "/chat/conversational"])
+def test_pacing_does_not_truncate_an_answer_that_arrived_in_time(client, path):
+    c, sid = client
+    # 40 paced words take about 1.2 s, well past the 500 ms budget
+    r = c.post(path, json={"session_id": sid, "message": "word1 word2", "deadline_ms": 500})
+    text = "".join(line[5:] for line in r.text.split("\n") if line.startswith("data:") and "{" not in line)
+    assert text.strip() == "".join(ANSWER).strip()
+    assert '"cut":true' not in r.text
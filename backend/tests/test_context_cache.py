@@ -0,0 +1,115 @@
+import threading
+import types
+
+import pytest
+
+from app.config import settings
+from app.memory import SESSIONS, Session
+from app.services import llm, simple_chat
+from app.services.context_cache import CONTEXT_CACHE, core_context, system_text
+from app.services.ingest import index_document
+
+DOC_A = " ".join(f"alpha{i}" for i in range(600))
+DOC_B = " ".join(f"omega{i}" for i in range(600))
+
+
+@pytest.fixture
+def caching(monkeypatch):
+    monkeypatch.setattr(settings, "context_cache", True)
+    monkeypatch.setattr(settings, "context_cache_min_chars", 1000)
+    monkeypatch.setattr(settings, "context_cache_max_chars", 6000)
+
+
+def test_core_is_bounded_and_stable_as_the_session_grows(caching):
+    s = Session()
+    index_document(s, DOC_A, {"type": "doc", "filename": "a.txt"})
+    core = core_context(s.index)
+    assert "alpha" in core and len(core) <= settings.context_cache_max_chars
+    index_document(s, DOC_B, {"type": "doc", "filename": "b.txt"})
+    assert core_context(s.index) == core
+
+
+def test_turns_carry_the_retrieved_context(caching, monkeypatch):
+    sent = []
+    monkeypatch.setattr(simple_chat, "answer_stream", lambda prompt, **kw: sent.append((prompt, kw)) or iter(()))
+    s = Session()
+    index_document(s, DOC_A, {"type": "doc", "filename": "a.txt"})
+    cached = CONTEXT_CACHE.prefix_for("ctx-test", s)
+    assert cached is not None
+    chat = simple_chat.SimpleConversationalChat()
+    list(chat.chat_with_documents("what?", "RETRIEVED BIT", "", cached=cached))
+    list(chat.chat_with_documents("what?", "RETRIEVED BIT", ""))
+    (with_cache, kw), (without, _) = sent
+    assert kw["cached"] is cached and "RETRIEVED BIT" in with_cache and "alpha" not in with_cache
+    assert without.startswith(system_text()) and "RETRIEVED BIT" in without and "alpha" not in without
+
+
+def test_no_handle_sends_the_turn_without_the_core(caching, monkeypatch):
+    calls = []
+
+    def generate_content(model, contents, config):
+        calls.append((contents, config.cached_content))
+        return types.SimpleNamespace(text="ok")
+
+    client = types.SimpleNamespace(models=types.SimpleNamespace(generate_content=generate_content))
+    monkeypatch.setenv("GEMINI_API_KEY", "k")
+    monkeypatch.setattr(llm, "_get_client", lambda genai, key: client)
+    monkeypatch.setattr(CONTEXT_CACHE, "handle", lambda ref, model, c: None)
+    s = Session()
+    index_document(s, DOC_A, {"type": "doc", "filename": "a.txt"})
+    cached = CONTEXT_CACHE.prefix_for("ctx-nohandle", s)
+    list(llm.answer_stream("DOCUMENT CONTEXT:\nRETRIEVED BIT\n\nCurrent Question: what?", pace=False, cached=cached))
+    [(contents, handle)] = calls
+    assert handle is None and "RETRIEVED BIT" in contents and "alpha" not in contents
+
+
+def test_deleting_a_session_drops_its_handles(caching, monkeypatch):
+    deleted = threading.Event()
+    client = types.SimpleNamespace(caches=types.SimpleNamespace(delete=lambda name: deleted.set()))
+    monkeypatch.setattr(CONTEXT_CACHE, "_register", lambda ref, model, c: "cachedContents/1")
+    sid = SESSIONS.new()
+    s = SESSIONS.get(sid)
+    index_document(s, DOC_A, {"type": "doc", "filename": "a.txt"})
+    ref = CONTEXT_CACHE.prefix_for(sid, s)
+    assert CONTEXT_CACHE.handle(ref, "m", client) == "cachedContents/1"
+    SESSIONS.delete(sid)
+    assert not any(k[0] == sid for k in CONTEXT_CACHE._handles)
+    assert not any(k[0] == sid for k in CONTEXT_CACHE._key_locks)
+    assert not any(k[0] == sid for k in CONTEXT_CACHE._prefixes)
+    assert deleted.wait(2)
+
+
+class _Memory:
+    k = 10
+
+    def __init__(self):
+        from app.services import langchain_chat
+        self.Human, self.AI = langchain_chat.HumanMessage, langchain_chat.AIMessage
+        self.chat_memory = self
+        self.messages = [self.Human("earlier question"), self.AI("earlier answer")]
+
+    def add_user_message(self, text):
+        self.messages.append(self.Human(text))
+
+    def add_ai_message(self, text):
+        self.messages.append(self.AI(text))
+
+
+def test_langchain_turns_with_a_cached_prefix_use_the_handle(caching, monkeypatch):
+    from app.services import langchain_chat
+
+    sent = []
+    monkeypatch.setattr(langchain_chat, "answer_stream",
+                        lambda prompt, **kw: sent.append((prompt, kw)) or iter(["an ", "answer"]))
+    service = object.__new__(langchain_chat.DocumentAwareChatService)
+    service.chat_service = types.SimpleNamespace(memory=_Memory())
+    s = Session()
+    index_document(s, DOC_A, {"type": "doc", "filename": "a.txt"})
+    cached = CONTEXT_CACHE.prefix_for("ctx-langchain", s)
+    out = "".join(service.chat_with_documents("what?", "RETRIEVED BIT", "ctx-langchain", cached=cached, pace=False))
+    assert out == "an answer"
+    [(prompt, kw)] = sent
+    assert kw["cached"] is cached
+    assert "RETRIEVED BIT" in prompt and "User: earlier question" in prompt and "alpha" not in prompt
+    assert [m.content for m in service.chat_service.memory.messages[-2:]] == ["what?", "an answer"]
+
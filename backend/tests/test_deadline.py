@@ -0,0 +1,68 @@
+import threading
+import time
+
+from app.deadline import Deadline, active, cut, timeout
+
+
+def test_fast_source_passes_through_whole():
+    dl = Deadline(5)
+    assert list(cut(iter(["a", "b", "c"]), dl)) == ["a", "b", "c"]
+    assert not dl.cut and "reason" not in dl.report()
+
+
+def test_slow_source_is_cut_on_time_and_closed():
+    closed = threading.Event()
+
+    def slow():
+        try:
+            yield "first "
+            time.sleep(1.0)
+            yield "late"
+        finally:
+            closed.set()
+
+    dl = Deadline(0.2)
+    t0 = time.perf_counter()
+    assert list(cut(slow(), dl)) == ["first "]
+    assert time.perf_counter() - t0 < 0.6
+    report = dl.report()
+    assert report["cut"] and report["degraded"] == {"generate": "cut"} and "reason" in report
+    # The source is closed once it yields again, not left running
+    assert closed.wait(2)
+
+
+def test_source_errors_reach_the_caller():
+    def broken():
+        yield "a"
+        raise RuntimeError("provider down")
+
+    out = []
+    try:
+        for tok in cut(broken(), Deadline(5)):
+            out.append(tok)
+    except RuntimeError as e:
+        assert str(e) == "provider down"
+    else:
+        raise AssertionError("error was swallowed")
+    assert out == ["a"]
+
+
+def test_timeouts_and_budgets_shrink_with_the_time_left():
+    assert timeout(120) == 120
+    with active(Deadline(2)):
+        assert 0 < timeout(120) <= 2
+    dl = Deadline(1)
+    assert dl.scale(6000, "pack") == 6000
+    dl.start -= 0.8
+    dl.at -= 0.8
+    assert 1500 <= dl.scale(6000, "pack") < 6000 and "pack" in dl.degraded
+
+
+def test_a_paced_answer_that_arrived_in_time_is_not_cut():
+    from app.services.llm import paced
+
+    words = [f"w{i} " for i in range(30)]
+    dl = Deadline(0.3)
+    # 30 words at 0.03 s each outlast the budget, but all of them arrived at once
+    assert "".join(paced(cut(iter(words), dl))) == "".join(words)
+    assert not dl.cut
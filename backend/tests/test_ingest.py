@@ -0,0 +1,124 @@
+import pytest
+
+from app.config import settings
+from app.memory import Session, SessionIndex
+from app.services.ingest import compact, index_document, needs_compaction, remove_document
+from app.services.retrieve import top_k
+
+ALPHA = "alpha beta gamma delta. " * 120
+OMEGA = "omega psi chi phi. " * 120
+
+
+def _live_ids(s):
+    return [ch["id"] for ch in s.index.chunks if ch["id"] not in s.index.tombstones]
+
+
+@pytest.fixture
+def dedup_on(monkeypatch):
+    monkeypatch.setattr(settings, "dedup_enabled", True)
+
+
+def test_remove_tombstones_and_hides_chunks():
+    s = Session()
+    a = index_document(s, ALPHA, {"type": "doc"})
+    b = index_document(s, OMEGA, {"type": "doc"})
+    a_chunks = list(s.index.source_chunks[a])
+    v = s.version
+    assert remove_document(s, a) == len(a_chunks)
+    assert s.version == v + 1
+    assert set(a_chunks) <= s.index.tombstones
+    assert a not in s.index.docs and a not in s.index.source_chunks
+    assert all(h["source_id"] == b for h in top_k("alpha beta", s, k=8))
+
+
+def test_compaction_drops_dead_chunks_and_keeps_live_ones():
+    s = Session()
+    a = index_document(s, ALPHA, {"type": "doc"})
+    index_document(s, OMEGA, {"type": "doc"})
+    live_before = [cid for cid in _live_ids(s) if cid not in s.index.source_chunks[a]]
+    remove_document(s, a)
+    assert needs_compaction(s)
+    dropped = compact(s)
+    assert dropped > 0 and not s.index.tombstones
+    assert [ch["id"] for ch in s.index.chunks] == live_before
+    assert set(s.index.embeddings) == set(live_before)
+    assert s.index.chunk_positions() == {cid: i for i, cid in enumerate(live_before)}
+
+
+def test_compaction_yields_to_a_concurrent_write():
+    s = Session()
+    a = index_document(s, ALPHA, {"type": "doc"})
+    remove_document(s, a)
+    idx = s.index
+    index_document(s, OMEGA, {"type": "doc"})
+    assert s.index is not idx
+    assert compact(s) > 0  # runs against the newest index, not the stale one
+
+
+def test_replace_keeps_source_id_in_one_version():
+    s = Session()
+    a = index_document(s, ALPHA, {"type": "doc"})
+    old = set(s.index.source_chunks[a])
+    v = s.version
+    index_document(s, OMEGA, {"type": "doc"}, source_id=a)
+    assert s.version == v + 1
+    assert old <= s.index.tombstones
+    assert all("omega" in s.index.chunks[s.index.chunk_positions()[cid]]["text"] for cid in s.index.source_chunks[a])
+
+
+def test_folded_duplicates_survive_until_their_last_owner_goes(dedup_on):
+    s = Session()
+    a = index_document(s, ALPHA, {"type": "doc"})
+    b = index_document(s, ALPHA, {"type": "doc"})
+    shared = set(s.index.source_chunks[a]) & set(s.index.source_chunks[b])
+    assert shared
+    remove_document(s, a)
+    assert not shared & s.index.tombstones
+    for cid in shared:
+        ch = s.index.chunks[s.index.chunk_positions()[cid]]
+        assert ch["source_id"] == b
+        assert all(r["source_id"] == b for r in ch.get("sources", ()))
+    remove_document(s, b)
+    assert shared <= s.index.tombstones
+
+
+class _Watched(dict):
+    reads = 0
+
+    def __getitem__(self, key):
+        _Watched.reads += 1
+        return super().__getitem__(key)
+
+
+@pytest.mark.parametrize("folded", [False, True])
+def test_delete_only_visits_the_documents_chunks(monkeypatch, folded):
+    monkeypatch.setattr(settings, "dedup_enabled", folded)
+    s = Session()
+    for _ in range(20):
+        index_document(s, OMEGA, {"type": "doc"})
+    a = index_document(s, ALPHA, {"type": "doc"})
+    b = index_document(s, ALPHA if folded else OMEGA, {"type": "doc"})
+    idx = s.index
+    s.index = SessionIndex(idx.version, idx.docs, tuple(_Watched(ch) for ch in idx.chunks), idx.embeddings,
+                           idx.source_chunks, idx.tombstones, idx.chunk_positions())
+    _Watched.reads = 0
+    remove_document(s, a)
+    assert _Watched.reads <= 4 * len(idx.source_chunks[a])
+    assert b in s.index.source_chunks and a not in s.index.source_chunks
+
+
+def test_streamed_uploads_keep_their_full_text(tmp_path):
+    import io
+
+    from app.services.ingest import index_stream
+    from app.services.snapshot import load_session, export_session
+
+    header = "id,name,notes"
+    body = header + "\n" + "\n".join(f"{i},item {i},some notes about item {i}" for i in range(2000)) + "\n"
+    s = Session()
+    sid, meta = index_stream(s, io.BytesIO(body.encode()), "items.csv", "text/csv", "csv")
+    assert s.index.docs[sid]["text"] == body
+    assert meta["chars"] == len(body) and meta["rows"] == 2000
+    assert len(s.index.source_chunks[sid]) > 1
+    snap = io.BytesIO(b"".join(export_session(s)))
+    assert load_session(snap, str(tmp_path)).index.docs[sid]["text"] == body
@@ -0,0 +1,17 @@
+import math
+import random
+
+import pytest
+
+from app.services.quantize import MODES, dequantize, dot, quantize
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_dot_scores_the_stored_form(mode):
+    rng = random.Random(7)
+    v = [rng.uniform(-1, 1) for _ in range(64)]
+    q = [rng.uniform(-1, 1) for _ in range(64)]
+    stored = quantize(v, mode)
+    exact = sum(a * b for a, b in zip(q, v))
+    assert math.isclose(dot(q, stored), sum(a * b for a, b in zip(q, dequantize(stored))), rel_tol=1e-9, abs_tol=1e-9)
+    assert abs(dot(q, stored) - exact) < 0.05
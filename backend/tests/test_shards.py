@@ -0,0 +1,106 @@
+import types
+
+import pytest
+
+from app.config import settings
+from app.services import shards
+from app.services.embed import embed_text
+from app.services.ingest import index_document, remove_document
+from app.services.retrieve import top_k
+from app.services.shards import SHARDS, build_shards
+from bench.corpus import Corpus
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return Corpus()
+
+
+@pytest.fixture(scope="module")
+def session(corpus):
+    return corpus.session(5000)
+
+
+def _ids(hits):
+    return [h["id"] for h in hits]
+
+
+def test_workers_keep_blocks_attached_until_retired(session, corpus):
+    q = corpus.queries(1)[0]
+    a, b = build_shards(session.index, 2), build_shards(session.index, 2)
+    try:
+        args = ([q.lower().split()], [embed_text(q)], 8, None)
+        first = shards._score_shard(a.names[0], *args)
+        assert a.names[0] in shards._mapped
+        assert shards._score_shard(a.names[0], *args) == first
+        shards._score_shard(b.names[0], *args, retired=a.names)
+        assert a.names[0] not in shards._mapped and b.names[0] in shards._mapped
+    finally:
+        for name in list(shards._mapped):
+            shards._mapped.pop(name).close()
+        a.close()
+        b.close()
+    assert set(a.names) <= set(shards._retired)
+
+
+def _in_process(session, queries, k=8):
+    # Switch sharding off without dropping the session's shards
+    min_chunks, SHARDS.min_chunks = SHARDS.min_chunks, 0
+    try:
+        return [_ids(top_k(q, session, k)) for q in queries]
+    finally:
+        SHARDS.min_chunks = min_chunks
+
+
+def test_sharded_search_matches_the_in_process_scan(session, corpus):
+    queries = corpus.queries(3)
+    SHARDS.configure(2, 2, 1000)
+    expected = _in_process(session, queries)
+    try:
+        SHARDS.build(session, session.index)
+        assert [_ids(top_k(q, session)) for q in queries] == expected
+        # A new version gets new blocks; workers drop the old ones and still agree
+        index_document(session, corpus.document(4000), {"type": "doc"})
+        expected = _in_process(session, queries)
+        SHARDS.build(session, session.index)
+        assert [_ids(top_k(q, session)) for q in queries] == expected
+        stats = SHARDS.stats()
+        assert stats["builds"] >= 2 and stats["pool_errors"] == 0
+    finally:
+        SHARDS.close()
+        SHARDS.configure(settings.retrieve_workers, settings.retrieve_shards, settings.retrieve_shard_min_chunks)
+
+
+def test_new_versions_are_served_from_the_old_shards_until_rebuilt(corpus, monkeypatch):
+    session = corpus.session(5000)
+    queries = corpus.queries(3)
+    SHARDS.configure(2, 2, 1000)
+    try:
+        old = SHARDS.build(session, session.index)
+        # Queries never build in the caller; the build is left to the background thread
+        monkeypatch.setattr(SHARDS, "_builder", types.SimpleNamespace(submit=lambda *a: None, shutdown=lambda **kw: None))
+        source_id = index_document(session, corpus.document(4000), {"type": "doc"})
+        # The whole ranking, so the appended chunks have to come in from the in-process tail
+        k = len(session.index.chunks)
+        expected = _in_process(session, queries, k)
+        assert [_ids(top_k(q, session, k)) for q in queries] == expected
+        remove_document(session, source_id)
+        remove_document(session, next(iter(session.index.docs)))
+        expected = _in_process(session, queries, k)
+        assert [_ids(top_k(q, session, k)) for q in queries] == expected
+        assert SHARDS._sets[session] is old and SHARDS.stats()["stale"] >= 6
+    finally:
+        SHARDS.close()
+        SHARDS.configure(settings.retrieve_workers, settings.retrieve_shards, settings.retrieve_shard_min_chunks)
+
+
+def test_first_query_queues_a_build_and_scans_in_process(corpus):
+    session = corpus.session(5000)
+    SHARDS.configure(2, 2, 1000)
+    try:
+        assert SHARDS.search(session, session.index, [["alpha"]], None, 8) is None
+        SHARDS._builder.submit(lambda: None).result(timeout=60)
+        assert SHARDS._sets[session].index is session.index
+    finally:
+        SHARDS.close()
+        SHARDS.configure(settings.retrieve_workers, settings.retrieve_shards, settings.retrieve_shard_min_chunks)
@@ -0,0 +1,70 @@
+import gc
+import threading
+import time
+
+import app.services.admission as admission
+from app.services.admission import AdmissionController, INTERACTIVE
+from app.services.singleflight import SingleFlight
+
+
+def _blocking_producer(release: threading.Event, produced: list):
+    def produce():
+        for i in range(1000):
+            release.wait()
+            produced.append(i)
+            yield f"t{i} "
+            time.sleep(0.001)
+    return produce
+
+
+def test_followers_replay_the_leaders_tokens(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_ADMISSION", AdmissionController(limit=2, queue_size=0, queue_wait=0.1))
+    flights = SingleFlight("test")
+    go = threading.Event()
+    leader = flights.stream("k", lambda: iter(go.wait() and ["a ", "b "]), INTERACTIVE)
+    follower = flights.stream("k", lambda: iter(["never "]), INTERACTIVE)
+    go.set()
+    assert list(leader) == list(follower) == ["a ", "b "]
+    assert flights.stats()["started"] == 1 and flights.stats()["joined"] == 1
+
+
+def test_unstarted_subscribers_do_not_keep_the_flight_alive(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_ADMISSION", AdmissionController(limit=2, queue_size=0, queue_wait=0.1))
+    flights = SingleFlight("test")
+    go, produced = threading.Event(), []
+    leader = flights.stream("k", _blocking_producer(go, produced), INTERACTIVE)
+    follower = flights.stream("k", lambda: iter([]), INTERACTIVE)
+    flight = next(iter(flights._flights.values()))
+    assert flight.interest == 2
+
+    # Neither generator is ever started: the clients disconnected before the first frame
+    del leader, follower
+    gc.collect()
+    assert flight.interest == 0
+
+    go.set()
+    for _ in range(100):
+        if flight.done:
+            break
+        time.sleep(0.01)
+    assert flight.done and flights.stats()["cancelled"] == 1
+    assert len(produced) < 1000
+    assert admission.LLM_ADMISSION.snapshot()["in_flight"] == 0
+
+
+def test_started_subscriber_leaves_once(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_ADMISSION", AdmissionController(limit=2, queue_size=0, queue_wait=0.1))
+    flights = SingleFlight("test")
+    go, produced = threading.Event(), []
+    go.set()
+    a = flights.stream("k", _blocking_producer(go, produced), INTERACTIVE)
+    b = flights.stream("k", lambda: iter([]), INTERACTIVE)
+    flight = next(iter(flights._flights.values()))
+    next(a)
+    a.close()
+    del a
+    gc.collect()
+    assert flight.interest == 1
+    del b
+    gc.collect()
+    assert flight.interest == 0
@@ -0,0 +1,74 @@
+import io
+import json
+import struct
+
+import pytest
+
+from app.memory import Session
+from app.services.ingest import index_document, remove_document
+from app.services.snapshot import MAGIC, export_session, load_session, session_from_buffer
+
+
+def _session() -> Session:
+    s = Session()
+    index_document(s, "alpha beta gamma. " * 200, {"type": "doc", "filename": "a.txt"})
+    gone = index_document(s, "delta epsilon zeta. " * 200, {"type": "doc", "filename": "b.txt"})
+    index_document(s, "eta theta iota. " * 200, {"type": "doc", "filename": "c.txt"})
+    remove_document(s, gone)
+    return s
+
+
+def _snapshot(s: Session) -> bytes:
+    return b"".join(export_session(s))
+
+
+def test_round_trip(tmp_path):
+    s = _session()
+    restored = load_session(io.BytesIO(_snapshot(s)), str(tmp_path))
+    live = [ch for ch in s.index.chunks if ch["id"] not in s.index.tombstones]
+    assert [ch["id"] for ch in restored.index.chunks] == [ch["id"] for ch in live]
+    assert [ch["text"] for ch in restored.index.chunks] == [ch["text"] for ch in live]
+    assert set(restored.index.docs) == set(s.index.docs)
+    for ch in live:
+        assert list(restored.index.embeddings[ch["id"]]) == pytest.approx(list(s.index.embeddings[ch["id"]]), abs=1e-6)
+
+
+@pytest.mark.parametrize("cut", [0, 5, 12, 40, -1, -4, -200])
+def test_truncated_snapshot_is_rejected(cut):
+    data = _snapshot(_session())
+    with pytest.raises(ValueError):
+        session_from_buffer(data[:cut])
+
+
+def _with_header(data: bytes, edit) -> bytes:
+    (hdr_len,) = struct.unpack_from("<Q", data, len(MAGIC))
+    start = len(MAGIC) + 8
+    header = json.loads(data[start:start + hdr_len])
+    edit(header)
+    hdr = json.dumps(header, separators=(",", ":")).encode().ljust(hdr_len)
+    assert len(hdr) == hdr_len
+    return data[:start] + hdr + data[start + hdr_len:]
+
+
+@pytest.mark.parametrize("edit", [
+    lambda h: h["chunks"][0].update(text=[10 ** 9, 5]),
+    lambda h: h["chunks"][0].update(text="nope"),
+    lambda h: h.update(dim=h["dim"] + 1),
+    lambda h: h.update(text_offset=-1),
+    lambda h: h.update(emb_offset=10 ** 12),
+    lambda h: h["chunks"].pop(),
+    lambda h: h["chunks"][0].pop("id"),
+    lambda h: h.update(docs=[]),
+])
+def test_corrupt_header_is_rejected(edit):
+    with pytest.raises(ValueError):
+        session_from_buffer(_with_header(_snapshot(_session()), edit))
+
+
+def test_corrupt_import_returns_400():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    data = _snapshot(_session())
+    r = TestClient(app).post("/session/import", files={"file": ("s.snap", data[:-7], "application/octet-stream")})
+    assert r.status_code == 400
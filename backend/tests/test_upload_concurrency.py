@@ -0,0 +1,30 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import app.routers.upload as upload_router
+from app.main import app
+
+
+def test_slow_upload_does_not_block_other_requests(monkeypatch):
+    def slow_extract(b, name, mime):
+        time.sleep(1.0)
+        return "some transcribed words " * 20, {"type": "av"}
+
+    monkeypatch.setattr(upload_router, "extract", slow_extract)
+    with TestClient(app) as c:
+        sid = c.post("/session/new").json()["session_id"]
+        done = {}
+
+        def upload():
+            done["r"] = c.post(f"/session/{sid}/upload", files={"files": ("talk.mp3", b"\0" * 64, "audio/mpeg")})
+
+        t = threading.Thread(target=upload)
+        t.start()
+        time.sleep(0.2)
+        t0 = time.perf_counter()
+        assert c.get("/healthz").status_code == 200
+        assert time.perf_counter() - t0 < 0.5
+        t.join()
+        assert done["r"].status_code == 200
@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services import whisper_pool
+from app.services.whisper_pool import WhisperPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(whisper_pool.settings, "whisper_timeout", 0.05)
+    monkeypatch.setattr(whisper_pool.settings, "whisper_queue_wait", 0.05)
+    p = WhisperPool("base", workers=1, queue_size=1)
+    # Threads instead of spawned processes; _run_job is replaced per test
+    p._executor = ThreadPoolExecutor(max_workers=1)
+    yield p
+    p.shutdown()
+
+
+def test_timed_out_jobs_keep_their_slot_until_they_finish(pool, monkeypatch):
+    release = threading.Event()
+
+    def stuck(*args):
+        release.wait(5)
+        return {"text": "late"}
+
+    # Both slots' jobs start running, so neither can be cancelled
+    pool._executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(whisper_pool, "_run_job", stuck)
+    assert pool.transcribe(b"a", "a.mp3") == {"error": "whisper_timeout"}
+    assert pool.transcribe(b"b", "b.mp3") == {"error": "whisper_timeout"}
+    assert pool.transcribe(b"c", "c.mp3") == {"error": "whisper_queue_full"}
+    monkeypatch.setattr(whisper_pool, "_run_job", lambda *args: {"text": "ok"})
+    release.set()
+    assert pool.transcribe(b"d", "d.mp3") == {"text": "ok"}
+
+
+def test_timed_out_queued_jobs_are_dropped(pool, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def stuck(*args):
+        calls.append(args[0])
+        release.wait(5)
+        return {"text": "late"}
+
+    monkeypatch.setattr(whisper_pool, "_run_job", stuck)
+    assert pool.transcribe(b"a", "a.mp3") == {"error": "whisper_timeout"}
+    # Queued behind the stuck job: cancelled on timeout, which frees its slot
+    assert pool.transcribe(b"b", "b.mp3") == {"error": "whisper_timeout"}
+    assert pool.transcribe(b"c", "c.mp3") == {"error": "whisper_timeout"}
+    release.set()
+    pool._executor.shutdown(wait=True)
+    assert calls == [b"a"]
+
+
+def test_only_a_broken_pool_is_torn_down(pool, monkeypatch):
+    def failing(*args):
+        raise ValueError("bad audio")
+
+    monkeypatch.setattr(whisper_pool, "_run_job", failing)
+    executor = pool._executor
+    assert pool.transcribe(b"a", "a.mp3") == {"error": "bad audio"}
+    assert pool._executor is executor
+
+    def broken(*args):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(whisper_pool, "_run_job", broken)
+    assert pool.transcribe(b"a", "a.mp3") == {"error": "worker died"}
+    assert pool._executor is None
@@ -46,7 +46,7 @@ export default function ChatPanel() {
         "/chat/conversational",
         { session_id: sessionId, message: trimmed, k: 8, max_ctx: 6000 },
         ({ event, data }) => {
-          if (event === "meta") return
+          if (event && event !== "done") return
           if (event === "done") {
             setMessages((prev) =>
               prev.map((m) => (m.id === replyId ? { ...m, isStreaming: false } : m)),
@@ -68,7 +68,7 @@ export default function ChatPanel() {
             "/chat/conversational",
             { session_id: newId, message: trimmed, k: 8, max_ctx: 6000 },
             ({ event, data }) => {
-              if (event === "meta") return
+              if (event && event !== "done") return
               if (event === "done") {
                 setMessages((prev) =>
                   prev.map((m) => (m.id === replyId ? { ...m, isStreaming: false } : m)),
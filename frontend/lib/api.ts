@@ -88,7 +88,8 @@ export async function streamSSE(path: string, payload: unknown, onMessage: SseHa
       const ev: { event?: string; data?: string } = {}
       for (const line of lines) {
         if (line.startsWith('event:')) ev.event = line.slice(6).trim()
-        else if (line.startsWith('data:')) ev.data = (ev.data || '') + line.slice(5)
+        // Multi-line payloads arrive as several data: lines joined by newlines
+        else if (line.startsWith('data:')) ev.data = ev.data === undefined ? line.slice(5) : ev.data + '\n' + line.slice(5)
       }
       onMessage(ev)
     }